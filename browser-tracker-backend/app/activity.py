@@ -0,0 +1,281 @@
+# app/activity.py
+"""
+Sessionisierung: aus den Events eines Nutzers werden Aktivitätsspannen
+(aufeinanderfolgende Events mit höchstens ACTIVITY_IDLE_GAP Sekunden
+Abstand). Die Zeit zwischen zwei Events einer Spanne zählt als aktive Zeit
+und wird der Page und dem Tag des früheren Events zugerechnet
+(``activity_daily``).
+
+Beim Ingest wird nur die offene, letzte Spanne je Nutzer fortgeschrieben.
+Kommen Events, die vor deren Ende liegen (Nachzügler), wird ab der
+betroffenen Spanne aus den Rohdaten neu gerechnet. Gerechnet wird in beiden
+Fällen vektorisiert über sortierte Zeitstempel-Arrays.
+
+    python -m app.activity rebuild
+"""
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from . import archive, config, models, partitions
+from .database import SessionLocal, upsert_insert
+
+NO_PAGE = 0   # wie in den Rollups
+
+
+@dataclass
+class Sessionized:
+    """Ergebnis von ``sessionize``: Spannen und aktive Sekunden als Arrays."""
+    span_start: np.ndarray    # Index des ersten Events je Spanne
+    span_end: np.ndarray      # Index des letzten Events je Spanne
+    days: np.ndarray          # datetime64[D]  } aktive Sekunden je
+    users: np.ndarray         # int64          } (Tag, User, Page)
+    pages: np.ndarray         # int64          }
+    seconds: np.ndarray       # float64
+
+
+def sessionize(users: np.ndarray, ts: np.ndarray, pages: np.ndarray,
+               idle_gap: float = config.ACTIVITY_IDLE_GAP) -> Sessionized:
+    """
+    Zerlegt nach (user, timestamp) sortierte Events in Spannen. ``ts`` ist
+    ``datetime64[us]``, ``users``/``pages`` int64 (Page 0 = ohne).
+    """
+    n = len(ts)
+    micros = ts.astype(np.int64)
+    gaps = np.diff(micros)
+    joined = (users[1:] == users[:-1]) & (gaps <= idle_gap * 1_000_000)
+
+    span_start = np.r_[0, np.flatnonzero(~joined) + 1] if n else np.zeros(0, np.int64)
+    span_end = np.r_[span_start[1:], n] - 1 if n else np.zeros(0, np.int64)
+
+    # Lücke i (zwischen Event i und i+1) gehört zu Event i
+    inner = np.flatnonzero(joined)
+    keys = np.stack([
+        ts[inner].astype("datetime64[D]").astype(np.int64), users[inner], pages[inner]
+    ], axis=1)
+    if len(inner):
+        groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        seconds = np.bincount(
+            inverse.reshape(-1), weights=gaps[inner] / 1_000_000, minlength=len(groups)
+        )
+    else:
+        groups, seconds = keys, np.zeros(0)
+
+    return Sessionized(
+        span_start=span_start, span_end=span_end,
+        days=groups[:, 0].astype("datetime64[D]"), users=groups[:, 1],
+        pages=groups[:, 2], seconds=seconds,
+    )
+
+
+def _add_seconds(db: Session, result: Sessionized, sign: float = 1.0):
+    if not len(result.seconds):
+        return
+    A = models.ActivityDaily
+    stmt = upsert_insert(db, A)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[A.day, A.user_id, A.bc_page_id],
+        set_={"active_seconds": A.active_seconds + stmt.excluded.active_seconds},
+    )
+    db.execute(stmt, [
+        {"day": day, "user_id": user, "bc_page_id": page, "active_seconds": sign * sec}
+        for day, user, page, sec in zip(
+            result.days.tolist(), result.users.tolist(),
+            result.pages.tolist(), result.seconds.tolist(),
+        )
+    ])
+
+
+def _insert_spans(db: Session, users, ts, pages, result: Sessionized, skip=None):
+    spans = [
+        {
+            "user_id": int(users[first]),
+            "start_at": ts[first].item(),
+            "end_at": ts[last].item(),
+            "event_count": int(last - first + 1),
+            "last_page_id": int(pages[last]),
+        }
+        for first, last in zip(result.span_start.tolist(), result.span_end.tolist())
+        if skip is None or not skip[first]
+    ]
+    if spans:
+        db.execute(models.ActivitySpan.__table__.insert(), spans)
+
+
+def _sorted(users, ts, pages, *extra):
+    order = np.lexsort((ts, users))
+    return (users[order], ts[order], pages[order]) + tuple(e[order] for e in extra)
+
+
+def _tails(db: Session, user_ids: list[int]) -> dict[int, models.ActivitySpan]:
+    """Letzte (offene) Spanne je User."""
+    A = models.ActivitySpan
+    latest = (
+        select(A.user_id, func.max(A.start_at).label("start_at"))
+        .where(A.user_id.in_(user_ids))
+        .group_by(A.user_id)
+        .subquery()
+    )
+    spans = db.execute(
+        select(A).join(latest, (A.user_id == latest.c.user_id)
+                       & (A.start_at == latest.c.start_at))
+    ).scalars()
+    return {span.user_id: span for span in spans}
+
+
+def _user_events(db: Session, user_id: int, since: datetime):
+    """(timestamp, page, id) eines Users ab ``since`` aus Partitionen und Archiv."""
+    ts, pages, ids = [], [], []
+    for E in partitions.for_range(db, since):
+        rows = db.execute(
+            select(E.c.timestamp, E.c.bc_page_id, E.c.id)
+            .where(E.c.user_id == user_id, E.c.timestamp >= since)
+        ).all()
+        ts += [r[0] for r in rows]
+        pages += [r[1] or NO_PAGE for r in rows]
+        ids += [r[2] for r in rows]
+
+    columns = [np.array(ts, dtype="datetime64[us]"), np.array(pages, dtype=np.int64),
+               np.array(ids, dtype=np.int64)]
+    for month in archive.months(since):
+        with month.open() as reader:
+            mask = (reader.column("user_id") == user_id) & reader.time_mask(since)
+            columns[0] = np.r_[columns[0], reader.column("timestamp")[mask]]
+            columns[1] = np.r_[columns[1], reader.column("bc_page_id")[mask]]
+            columns[2] = np.r_[columns[2], reader.column("id")[mask]]
+    return columns
+
+
+def _recompute_user(db: Session, user_id: int, since: datetime, new_ids: np.ndarray):
+    """Rechnet einen User ab der Spanne, die bei ``since`` beginnt, neu."""
+    A = models.ActivitySpan
+    db.execute(delete(A).where(A.user_id == user_id, A.start_at >= since))
+
+    ts, pages, ids = _user_events(db, user_id, since)
+    users = np.full(len(ts), user_id, dtype=np.int64)
+    users, ts, pages, ids = _sorted(users, ts, pages, ids)
+
+    # alter Stand (ohne die neuen Events) wieder abziehen
+    old = ~np.isin(ids, new_ids)
+    _add_seconds(db, sessionize(users[old], ts[old], pages[old]), sign=-1.0)
+
+    result = sessionize(users, ts, pages)
+    _add_seconds(db, result)
+    _insert_spans(db, users, ts, pages, result)
+
+
+def apply_rows(db: Session, rows: list[dict]):
+    """Schreibt Spannen und aktive Zeit für frisch eingefügte Events fort."""
+    rows = [r for r in rows if r["user_id"] is not None and r["timestamp"] is not None]
+    if not rows:
+        return
+
+    users = np.array([r["user_id"] for r in rows], dtype=np.int64)
+    ts = np.array([archive.as_datetime64(r["timestamp"]) for r in rows])
+    pages = np.array([r["bc_page_id"] or NO_PAGE for r in rows], dtype=np.int64)
+    ids = np.array([r["id"] for r in rows], dtype=np.int64)
+
+    tails = _tails(db, np.unique(users).tolist())
+
+    # Nachzügler vor dem Ende der offenen Spanne: User neu rechnen
+    late = set()
+    for user_id, span in tails.items():
+        first = ts[users == user_id].min()
+        if first < np.datetime64(span.end_at, "us"):
+            late.add(user_id)
+            A = models.ActivitySpan
+            since = db.execute(
+                select(func.max(A.start_at))
+                .where(A.user_id == user_id, A.start_at <= first.item())
+            ).scalar() or first.item()
+            _recompute_user(db, user_id, since, ids)
+
+    # Normalfall: das Ende der offenen Spanne als Vorgänger-Event voranstellen
+    keep = ~np.isin(users, list(late))
+    users, ts, pages = users[keep], ts[keep], pages[keep]
+    fresh = [s for u, s in tails.items() if u not in late]
+    prefix = np.r_[np.zeros(len(users), bool), np.ones(len(fresh), bool)]
+    users = np.r_[users, np.array([s.user_id for s in fresh], dtype=np.int64)]
+    ts = np.r_[ts, np.array([s.end_at for s in fresh], dtype="datetime64[us]")]
+    pages = np.r_[pages, np.array([s.last_page_id for s in fresh], dtype=np.int64)]
+    # bei gleichem Zeitstempel steht das Vorgänger-Event vorn
+    order = np.lexsort((~prefix, ts, users))
+    users, ts, pages, prefix = users[order], ts[order], pages[order], prefix[order]
+
+    result = sessionize(users, ts, pages)
+    _add_seconds(db, result)
+
+    for first, last in zip(result.span_start.tolist(), result.span_end.tolist()):
+        if prefix[first]:
+            span = tails[int(users[first])]
+            span.end_at = ts[last].item()
+            span.event_count += last - first
+            span.last_page_id = int(pages[last])
+    _insert_spans(db, users, ts, pages, result, skip=prefix)
+    db.flush()
+
+
+def rebuild(db: Session):
+    """Alle Spannen und die aktive Zeit komplett neu berechnen. Committet nicht."""
+    db.execute(delete(models.ActivitySpan))
+    db.execute(delete(models.ActivityDaily))
+
+    users, ts, pages = [], [], []
+    for E in partitions.for_range(db):
+        rows = db.execute(
+            select(E.c.user_id, E.c.timestamp, E.c.bc_page_id)
+            .where(E.c.user_id.isnot(None), E.c.timestamp.isnot(None))
+        ).all()
+        users.append(np.array([r[0] for r in rows], dtype=np.int64))
+        ts.append(np.array([r[1] for r in rows], dtype="datetime64[us]"))
+        pages.append(np.array([r[2] or NO_PAGE for r in rows], dtype=np.int64))
+    for month in archive.months():
+        with month.open() as reader:
+            mask = (reader.column("user_id") != 0) & reader.time_mask()
+            users.append(reader.column("user_id")[mask])
+            ts.append(reader.column("timestamp")[mask])
+            pages.append(reader.column("bc_page_id")[mask])
+
+    if not users:
+        return
+    users, ts, pages = _sorted(
+        np.concatenate(users), np.concatenate(ts).astype("datetime64[us]"),
+        np.concatenate(pages),
+    )
+    result = sessionize(users, ts, pages)
+    _add_seconds(db, result)
+    _insert_spans(db, users, ts, pages, result)
+
+
+def format_duration(seconds: float | None) -> str:
+    """Sekunden als "3 h 05 min" bzw. "12 min"."""
+    minutes = int((seconds or 0) // 60)
+    if minutes < 60:
+        return f"{minutes} min"
+    return f"{minutes // 60} h {minutes % 60:02d} min"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.activity")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="Aktivitätsspannen und aktive Zeit neu berechnen")
+    parser.parse_args(argv)
+
+    from .migrations import upgrade
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+    print("[ACTIVITY] Neu berechnet")
+
+
+if __name__ == "__main__":
+    main()
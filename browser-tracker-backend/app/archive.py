@@ -0,0 +1,443 @@
+# app/archive.py
+"""
+Spaltenorientiertes Archiv für abgeschlossene Monate.
+
+``compact`` schreibt jede Monatspartition, die älter als die "heißen" Monate
+ist (ARCHIVE_HOT_MONTHS), als komprimierte NumPy-Datei
+``<ARCHIVE_DIR>/browser_events_YYYYMM.npz`` weg und löscht danach die
+Partition. Pro Spalte gibt es ein Array; Texte sind dictionary-kodiert
+(``<spalte>`` = int32-Codes, -1 = NULL). Das Dictionary liegt als UTF-8-
+Puffer ``<spalte>.dict`` (uint8, alle Werte hintereinander) mit
+``<spalte>.offsets`` (int64, Anfang jedes Werts plus Ende) – ein Array fester
+Breite ``<U{maxlen}`` wäre bei Freitext-Spalten (new_value, meta, …) so groß
+wie der längste Wert mal Anzahl. Ältere Archive mit ``<U``-Dictionary werden
+weiter gelesen. Integer-Spalten nutzen 0 für NULL (IDs beginnen bei 1),
+Zeitstempel sind ``datetime64[us]``. ``manifest.json`` listet die archivierten
+Monate.
+
+Gelesen wird spaltenweise über ``MonthReader``: eine Auswertung dekomprimiert
+nur die Spalten, die sie anfasst (Zählen nach Tag braucht z.B. nur
+``timestamp``), und rechnet vektorisiert mit NumPy.
+
+    python -m app.archive list
+    python -m app.archive compact [--hot-months 3]
+"""
+import argparse
+import json
+import os
+from collections import namedtuple
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import config, models, partitions
+
+MANIFEST = "manifest.json"
+
+COLUMNS = [c.name for c in models.BrowserEvent.__table__.columns]
+INT_COLUMNS = {"id", "session_id", "user_id", "bc_page_id"}
+TIME_COLUMNS = {"timestamp"}
+STRING_COLUMNS = [c for c in COLUMNS if c not in INT_COLUMNS | TIME_COLUMNS]
+
+# Zeile aus dem Archiv mit denselben Attributen wie eine Partitionszeile
+EventRow = namedtuple("EventRow", COLUMNS)
+
+
+def as_datetime64(value: datetime) -> np.datetime64:
+    # gespeichert wird naives UTC (wie in SQLite)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, "us")
+
+
+@dataclass
+class ArchivedMonth:
+    name: str
+    month_start: date
+    month_end: date
+    file: str
+    rows: int
+    min_id: int
+    max_id: int
+
+    @property
+    def path(self) -> str:
+        return os.path.join(config.ARCHIVE_DIR, self.file)
+
+    def open(self) -> "MonthReader":
+        return MonthReader(self.path)
+
+
+class MonthReader:
+    """Lesezugriff auf einen archivierten Monat (als Context-Manager)."""
+
+    def __init__(self, path: str):
+        self._npz = np.load(path, allow_pickle=False)
+        self._columns: dict[str, np.ndarray] = {}
+        self._dictionaries: dict[str, np.ndarray] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._npz.close()
+
+    def __len__(self) -> int:
+        return len(self.column("id"))
+
+    def column(self, name: str) -> np.ndarray:
+        """Rohes Spalten-Array (bei Texten die Codes), wird nur einmal entpackt."""
+        array = self._columns.get(name)
+        if array is None:
+            array = self._columns[name] = self._npz[name]
+        return array
+
+    def dictionary(self, name: str) -> np.ndarray:
+        """Werte einer Textspalte als Objekt-Array (Index = Code), einmal dekodiert."""
+        words = self._dictionaries.get(name)
+        if words is None:
+            if name + ".offsets" in self._npz.files:
+                words = _unpack_strings(self._npz[name + ".dict"], self._npz[name + ".offsets"])
+            else:
+                words = self._npz[name + ".dict"].astype(object)   # altes <U-Format
+            self._dictionaries[name] = words
+        return words
+
+    def decode(self, name: str, codes: np.ndarray) -> list:
+        """Codes einer Textspalte als Python-Werte, -1 als None."""
+        decoded = np.full(len(codes), None, dtype=object)
+        valid = codes >= 0
+        decoded[valid] = self.dictionary(name)[codes[valid]]
+        return decoded.tolist()
+
+    def values(self, name: str, index=slice(None)) -> list:
+        """Dekodierte Python-Werte einer Spalte (optional nur für ``index``)."""
+        array = self.column(name)[index]
+        if name in TIME_COLUMNS:
+            return [None if np.isnat(v) else v.item() for v in array]
+        if name in INT_COLUMNS:
+            return [int(v) or None for v in array]
+        decoded = self.decode(name, array)
+        if name == "meta":
+            decoded = [None if v is None else json.loads(v) for v in decoded]
+        return decoded
+
+    def time_mask(self, start: datetime | None = None,
+                  end: datetime | None = None) -> np.ndarray:
+        """Maske ``start <= timestamp < end`` (ohne NULL-Zeitstempel)."""
+        ts = self.column("timestamp")
+        mask = ~np.isnat(ts)
+        if start is not None:
+            mask &= ts >= as_datetime64(start)
+        if end is not None:
+            mask &= ts < as_datetime64(end)
+        return mask
+
+    def before(self, timestamp: datetime, event_id: int) -> np.ndarray:
+        """Maske ``(timestamp, id) < (timestamp, event_id)`` (Keyset-Paging)."""
+        ts = self.column("timestamp")
+        limit = as_datetime64(timestamp)
+        return (ts < limit) | ((ts == limit) & (self.column("id") < event_id))
+
+    def count_between(self, start: datetime, end: datetime) -> int:
+        return int(np.count_nonzero(self.time_mask(start, end)))
+
+    def matches(self, name: str, value) -> np.ndarray:
+        """Maske ``spalte == value`` (bei Texten über das Dictionary)."""
+        if name in INT_COLUMNS:
+            return self.column(name) == value
+        hits = np.flatnonzero(self.dictionary(name) == value)
+        if not len(hits):
+            return np.zeros(len(self), dtype=bool)
+        return self.column(name) == hits[0]
+
+    def _ordered(self, mask: np.ndarray | None, newest_first: bool) -> np.ndarray:
+        index = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        order = np.lexsort((self.column("id")[index], self.column("timestamp")[index]))
+        if newest_first:
+            order = order[::-1]
+        return index[order]
+
+    def rows(self, mask: np.ndarray | None = None, limit: int | None = None,
+             newest_first: bool = False) -> list[EventRow]:
+        """Zeilen (nach timestamp, id sortiert) – nur ``mask``-Treffer."""
+        return self._decode(self._ordered(mask, newest_first)[:limit])
+
+    def records(self, columns: list[str], mask: np.ndarray | None = None,
+                limit: int | None = None, newest_first: bool = False) -> list[dict]:
+        """Wie ``rows``, aber nur die Spalten ``columns`` als dicts."""
+        index = self._ordered(mask, newest_first)[:limit]
+        decoded = [self.values(name, index) for name in columns]
+        return [dict(zip(columns, values)) for values in zip(*decoded)]
+
+    def iter_rows(self, mask: np.ndarray | None = None, batch_size: int = 5000):
+        """Wie ``rows``, aber in Blöcken dekodiert (konstanter Speicher je Block)."""
+        index = self._ordered(mask, newest_first=False)
+        for offset in range(0, len(index), batch_size):
+            yield from self._decode(index[offset:offset + batch_size])
+
+    def _decode(self, index: np.ndarray) -> list[EventRow]:
+        columns = [self.values(name, index) for name in COLUMNS]
+        return [EventRow(*values) for values in zip(*columns)]
+
+    def group_count(self, dims: list[str], unit: str, since: datetime | None = None):
+        """
+        Zählt Events je Zeiteinheit (``unit`` = "h" oder "D") und Dimensionen,
+        vektorisiert. Liefert Tupel (bucket, *dims, count, first_ts, last_ts);
+        Texte dekodiert, NULL als None bzw. 0.
+        """
+        mask = self.time_mask(since)
+        ts = self.column("timestamp")[mask]
+        if not len(ts):
+            return []
+
+        keys = [ts.astype(f"datetime64[{unit}]").astype(np.int64)]
+        keys += [self.column(d)[mask].astype(np.int64) for d in dims]
+        groups, inverse, counts = np.unique(
+            np.stack(keys, axis=1), axis=0, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.reshape(-1)
+        micros = ts.astype(np.int64)
+        first = np.full(len(groups), np.iinfo(np.int64).max)
+        last = np.full(len(groups), np.iinfo(np.int64).min)
+        np.minimum.at(first, inverse, micros)
+        np.maximum.at(last, inverse, micros)
+
+        columns = [groups[:, 0].astype(f"datetime64[{unit}]").tolist()]
+        for i, name in enumerate(dims, start=1):
+            codes = groups[:, i]
+            if name in INT_COLUMNS:
+                columns.append(codes.tolist())
+            else:
+                columns.append(self.decode(name, codes))
+        columns.append(counts.tolist())
+        columns.append(first.astype("datetime64[us]").tolist())
+        columns.append(last.astype("datetime64[us]").tolist())
+        return list(zip(*columns))
+
+
+# ------------------------------------------------------------
+# Manifest
+# ------------------------------------------------------------
+
+_manifest_cache: tuple[float, list[ArchivedMonth]] | None = None
+
+
+def _manifest_path() -> str:
+    return os.path.join(config.ARCHIVE_DIR, MANIFEST)
+
+
+def _load_manifest() -> list[ArchivedMonth]:
+    global _manifest_cache
+    path = _manifest_path()
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return []
+    if _manifest_cache is None or _manifest_cache[0] != mtime:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)["months"]
+        _manifest_cache = (mtime, [
+            ArchivedMonth(
+                name=e["name"],
+                month_start=date.fromisoformat(e["month_start"]),
+                month_end=date.fromisoformat(e["month_end"]),
+                file=e["file"], rows=e["rows"], min_id=e["min_id"], max_id=e["max_id"],
+            )
+            for e in entries
+        ])
+    return _manifest_cache[1]
+
+
+def _write_atomic(path: str, write):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _save_manifest(entries: list[ArchivedMonth]):
+    data = {"months": [
+        {
+            "name": m.name, "month_start": m.month_start.isoformat(),
+            "month_end": m.month_end.isoformat(), "file": m.file, "rows": m.rows,
+            "min_id": m.min_id, "max_id": m.max_id,
+        }
+        for m in sorted(entries, key=lambda m: m.month_start)
+    ]}
+    payload = json.dumps(data, indent=2).encode("utf-8")
+    _write_atomic(_manifest_path(), lambda f: f.write(payload))
+
+
+def months(start: datetime | date | None = None, end: datetime | date | None = None,
+           newest_first: bool = False) -> list[ArchivedMonth]:
+    """Archivierte Monate, die sich mit [start, end) überschneiden."""
+    start, end = partitions.day_bounds(start, end)
+    selected = [
+        m for m in _load_manifest()
+        if (start is None or m.month_end > start) and (end is None or m.month_start < end)
+    ]
+    return sorted(selected, key=lambda m: m.month_start, reverse=newest_first)
+
+
+# ------------------------------------------------------------
+# Kompaktierung
+# ------------------------------------------------------------
+
+COMPACT_BATCH_SIZE = 5000
+
+
+def _dtype(name: str):
+    if name in INT_COLUMNS:
+        return np.int64
+    if name in TIME_COLUMNS:
+        return "datetime64[us]"
+    return np.int32
+
+
+def _encode_strings(values, lookup: dict[str, int]) -> np.ndarray:
+    """Codes zu ``values``; neue Texte bekommen den nächsten Code in ``lookup``."""
+    return np.fromiter(
+        (-1 if v is None else lookup.setdefault(v, len(lookup)) for v in values),
+        dtype=np.int32, count=len(values),
+    )
+
+
+def _pack_strings(words) -> tuple[np.ndarray, np.ndarray]:
+    """Dictionary als UTF-8-Puffer und Offsets (``offsets[i]:offsets[i+1]``)."""
+    encoded = [w.encode("utf-8") for w in words]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)),
+              out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(buffer: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    data = buffer.tobytes()
+    bounds = offsets.tolist()
+    words = np.empty(len(bounds) - 1, dtype=object)
+    words[:] = [data[a:b].decode("utf-8") for a, b in zip(bounds, bounds[1:])]
+    return words
+
+
+def _batch_arrays(rows, lookups: dict[str, dict]) -> dict[str, np.ndarray]:
+    """Ein Block Partitionszeilen als typisierte Arrays je Spalte."""
+    arrays = {}
+    for name, values in zip(COLUMNS, zip(*rows)):
+        if name in INT_COLUMNS:
+            arrays[name] = np.fromiter((v or 0 for v in values), dtype=np.int64,
+                                       count=len(values))
+        elif name in TIME_COLUMNS:
+            arrays[name] = np.array(values, dtype="datetime64[us]")
+        else:
+            if name == "meta":
+                values = [None if v is None else json.dumps(v) for v in values]
+            arrays[name] = _encode_strings(values, lookups[name])
+    return arrays
+
+
+def compact_partition(db: Session, table, month: date) -> ArchivedMonth:
+    """
+    Schreibt eine Partition ins Archiv (zusammen mit einem evtl. schon
+    archivierten Stand des Monats) und löscht sie. Committet.
+
+    Die Zeilen kommen blockweise aus der Partition und werden sofort zu
+    NumPy-Arrays; Python-Objekte gibt es nur für einen Block.
+    """
+    entries = {m.name: m for m in _load_manifest()}
+    previous = entries.get(table.name)
+    lookups: dict[str, dict[str, int]] = {name: {} for name in STRING_COLUMNS}
+    old = None
+    if previous is not None:
+        with previous.open() as reader:
+            old = {name: reader.column(name) for name in COLUMNS}
+            # Codes des alten Stands bleiben gültig, neue Texte kommen dahinter
+            for name in STRING_COLUMNS:
+                words = reader.dictionary(name).tolist()
+                lookups[name] = dict(zip(words, range(len(words))))
+
+    batches = {name: [np.empty(0, dtype=_dtype(name))] for name in COLUMNS}
+    stmt = partitions.select_events(table).order_by(table.c.id)
+    for rows in db.execute(stmt).yield_per(COMPACT_BATCH_SIZE).partitions():
+        for name, array in _batch_arrays(rows, lookups).items():
+            batches[name].append(array)
+    arrays = {name: np.concatenate(parts) for name, parts in batches.items()}
+
+    if old is not None:
+        # Nachzügler für einen schon archivierten Monat: zusammenführen. IDs,
+        # die es in beiden gibt (Abbruch zwischen Schreiben und DROP), zählen
+        # nur einmal.
+        keep = ~np.isin(old["id"], arrays["id"])
+        for name in COLUMNS:
+            arrays[name] = np.concatenate([old[name][keep], arrays[name]])
+    for name in STRING_COLUMNS:
+        arrays[name + ".dict"], arrays[name + ".offsets"] = _pack_strings(lookups[name])
+
+    ids = arrays["id"]
+    archived = ArchivedMonth(
+        name=table.name, month_start=month, month_end=partitions.next_month(month),
+        file=table.name + ".npz", rows=len(ids),
+        min_id=int(ids.min()) if len(ids) else 0, max_id=int(ids.max()) if len(ids) else 0,
+    )
+
+    os.makedirs(config.ARCHIVE_DIR, exist_ok=True)
+    _write_atomic(archived.path, lambda f: np.savez_compressed(f, **arrays))
+    entries[archived.name] = archived
+    _save_manifest(list(entries.values()))
+
+    partitions.drop_partition(db, table.name)
+    db.commit()
+    return archived
+
+
+def compact(db: Session, hot_months: int = config.ARCHIVE_HOT_MONTHS,
+            today: date | None = None) -> list[ArchivedMonth]:
+    """Archiviert alle Partitionen vor den letzten ``hot_months`` Monaten."""
+    cutoff = partitions.month_start(today or datetime.now(timezone.utc).date())
+    for _ in range(max(hot_months, 1) - 1):
+        cutoff = partitions.month_start(date.fromordinal(cutoff.toordinal() - 1))
+
+    done = []
+    for table in partitions.for_range(db, end=cutoff):
+        month = partitions.month_of(table.name)
+        if partitions.next_month(month) <= cutoff:
+            done.append(compact_partition(db, table, month))
+    return done
+
+
+def main(argv=None):
+    from .database import SessionLocal
+    from .migrations import upgrade
+
+    parser = argparse.ArgumentParser(prog="python -m app.archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="archivierte Monate anzeigen")
+    p_compact = sub.add_parser("compact", help="alte Partitionen ins Archiv verschieben")
+    p_compact.add_argument("--hot-months", type=int, default=config.ARCHIVE_HOT_MONTHS,
+                           help="so viele Monate (inkl. aktuellem) bleiben in SQLite")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for m in months():
+            size = os.path.getsize(m.path) if os.path.exists(m.path) else 0
+            print(f"{m.name}\t{m.rows}\t{size // 1024} KiB")
+        return
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        for m in compact(db, hot_months=args.hot_months):
+            print(f"[ARCHIVE] {m.name} archiviert ({m.rows} Events)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
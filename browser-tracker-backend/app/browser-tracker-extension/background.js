@@ -1,7 +1,9 @@
 // background.js
 
+importScripts("wire.js");
+
 // Backend URL – identisch zur content-script-Konfiguration
-const BACKEND_EVENTS_URL = "http://127.0.0.1:8000/api/events/batch";
+const BACKEND_EVENTS_URL = "http://127.0.0.1:8000/api/events/v2/batch";
 
 // simple Queue, falls mehrere Tabs senden
 let sending = false;
@@ -30,13 +32,7 @@ function processQueue() {
 
   console.log("[LAT-BG] Sende an Backend:", BACKEND_EVENTS_URL, "Events:", toSend.length);
 
-  fetch(BACKEND_EVENTS_URL, {
-    method: "POST",
-    headers: {
-      "Content-Type": "application/json"
-    },
-    body: JSON.stringify(toSend)
-  })
+  latPostBatchV2(BACKEND_EVENTS_URL, toSend)
     .then((res) => {
       console.log("[LAT-BG] Antwort vom Backend:", res.status, res.statusText);
       if (!res.ok) {
@@ -4,7 +4,7 @@
 // Konfiguration
 // =========================
 
-const BACKEND_EVENTS_URL = "http://127.0.0.1:8000/api/events/batch";
+const BACKEND_EVENTS_URL = "http://127.0.0.1:8000/api/events/v2/batch";  // Spaltenformat, siehe wire.js
 const EVENT_BATCH_MAX = 20;
 const EVENT_BATCH_INTERVAL = 3000;
 
@@ -218,13 +218,7 @@ function flushEventBuffer() {
 
   console.log("[LAT] Sende Batch an Backend:", batch.length, "Events");
 
-  fetch(BACKEND_EVENTS_URL, {
-    method: "POST",
-    headers: {
-      "Content-Type": "application/json"
-    },
-    body: JSON.stringify(batch)
-  })
+  latPostBatchV2(BACKEND_EVENTS_URL, batch)
     .then((res) => {
       console.log("[LAT] Antwort vom Backend:", res.status, res.statusText);
       if (!res.ok) {
@@ -0,0 +1,72 @@
+// wire.js
+
+// Spaltenformat v2 für Event-Batches (Gegenstück: app/wire.py im Backend).
+// Felder, die im ganzen Batch gleich sind, gehen einmal unter "shared" raus,
+// alle anderen als ein Array je Feld unter "columns"; Texte mit vielen
+// Wiederholungen dictionary-kodiert. Der Body wird gzip-komprimiert.
+
+const LAT_WIRE_FIELDS = [
+  "timestamp", "user_external_id", "session_key",
+  "page_url", "page_title", "bc_page_id", "bc_company",
+  "element_type", "element_role", "element_label", "element_name",
+  "element_id", "element_path", "action_type", "old_value", "new_value",
+  "meta"
+];
+
+function latEncodeColumn(values) {
+  if (typeof values.find((v) => v !== null) !== "string") return values;
+
+  const dict = [];
+  const index = new Map();
+  const idx = values.map((v) => {
+    if (v === null) return -1;
+    if (!index.has(v)) {
+      index.set(v, dict.length);
+      dict.push(v);
+    }
+    return index.get(v);
+  });
+  // lohnt sich nur, wenn Werte mehrfach vorkommen
+  return dict.length * 2 <= values.length ? { dict, idx } : values;
+}
+
+function latEncodeBatchV2(events) {
+  const shared = {};
+  const columns = {};
+
+  for (const field of LAT_WIRE_FIELDS) {
+    let values = events.map((e) => (e[field] === undefined ? null : e[field]));
+    if (field === "timestamp") {
+      values = values.map((t) => (t === null ? null : Date.parse(t)));
+    }
+    if (values.every((v) => v === null)) continue;
+
+    const first = JSON.stringify(values[0]);
+    if (values.every((v) => JSON.stringify(v) === first)) {
+      shared[field] = values[0];
+    } else {
+      columns[field] = latEncodeColumn(values);
+    }
+  }
+
+  return { v: 2, n: events.length, shared, columns };
+}
+
+// batchId: bei Wiederholungen dieselbe ID mitgeben, dann speichert das
+// Backend den Batch nur einmal
+async function latPostBatchV2(url, events, batchId) {
+  const json = JSON.stringify(latEncodeBatchV2(events));
+  const headers = {
+    "Content-Type": "application/json",
+    "X-Batch-Id": batchId || crypto.randomUUID()
+  };
+  let body = json;
+
+  if (typeof CompressionStream !== "undefined") {
+    const stream = new Blob([json]).stream().pipeThrough(new CompressionStream("gzip"));
+    body = await new Response(stream).arrayBuffer();
+    headers["Content-Encoding"] = "gzip";
+  }
+
+  return fetch(url, { method: "POST", headers, body });
+}
@@ -0,0 +1,204 @@
+# app/cache.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import config
+
+# Während einer Transaktion geänderte User; nach dem Commit wird die
+# Cache-Generation hochgezählt (siehe ViewCache.mark_changed).
+CHANGED_KEY = "view_cache_changed"
+
+# Für den laufenden Request am Cache vorbei rechnen (Profiling, siehe
+# app/profiling.py), damit die Abfragen auch wirklich laufen
+BYPASS: ContextVar[bool] = ContextVar("view_cache_bypass", default=False)
+
+# Pro Prozessstart neu, damit ETags nach einem Neustart (Generation wieder 0)
+# nicht mit alten kollidieren
+_BOOT_ID = os.urandom(4).hex()
+
+
+class TTLCache:
+    """Kleiner LRU-Cache mit Ablaufzeit pro Eintrag (thread-sicher)."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+@dataclass
+class Validator:
+    """ETag/Last-Modified eines View-Zustands."""
+    key: tuple
+    etag: str
+    last_modified: datetime
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "ETag": self.etag,
+            "Last-Modified": format_datetime(self.last_modified, usegmt=True),
+            # Browser sollen immer nachfragen – die Antwort ist dann meist 304
+            "Cache-Control": "no-cache",
+        }
+
+    def matches(self, request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [t.strip() for t in if_none_match.split(",")]
+            return self.etag in tags or "*" in tags
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return self.last_modified.replace(microsecond=0) <= since
+        return False
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers)
+
+
+class ViewCache:
+    """
+    Ergebnis-Cache für Dashboard- und Nutzer-Ansichten.
+
+    Einträge sind über (View, Parameter, Generation, Zeitfenster) adressiert.
+    Die Generation zählt bei jedem Ingest-Commit hoch – global für alle
+    Ansichten und zusätzlich pro betroffenem User, damit die Detailansicht
+    eines Users nur veraltet, wenn sich *seine* Daten ändern. Das Zeitfenster
+    (``ttl``) begrenzt die Laufzeit trotzdem, weil Werte wie "letzte 24h"
+    auch ohne neue Events wandern.
+
+    Die Generationen pro User bleiben klein: wer seit dem vorigen
+    Zeitfenster nichts geändert hat, braucht keinen eigenen Eintrag mehr
+    (alle Cache-Einträge mit seiner Generation sind abgelaufen), und über
+    ``max_users`` hinaus fallen die am längsten unveränderten User heraus.
+    User ohne Eintrag bekommen den Grundstand ``_floor`` – die Generation
+    des zuletzt verdrängten Users, damit kein Eintrag von vor dessen
+    Änderung wieder passt.
+    """
+
+    def __init__(self, maxsize: int = config.VIEW_CACHE_SIZE,
+                 ttl: float = config.VIEW_CACHE_TTL,
+                 max_users: int = config.VIEW_CACHE_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.entries = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        now = datetime.now(timezone.utc)
+        self.generation = 0
+        self.changed_at = now
+        # User → (Generation, Zeitpunkt) der letzten Änderung, älteste zuerst
+        self._users: OrderedDict[int, tuple[int, datetime]] = OrderedDict()
+        self._floor = (0, datetime.min.replace(tzinfo=timezone.utc))
+
+    def bump(self, user_ids=()):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self.generation += 1
+            self.changed_at = now
+            for user_id in user_ids:
+                if user_id is not None:
+                    self._users.pop(user_id, None)
+                    self._users[user_id] = (self.generation, now)
+            self._prune(now)
+
+    def _prune(self, now: datetime):
+        if self.ttl:
+            # vor dem vorigen Fenster: ein Request, der die Zeit noch kurz vor
+            # der Fenstergrenze gelesen hat, sieht den Eintrag so noch
+            epoch = int(now.timestamp() // self.ttl) - 1
+            expired = datetime.fromtimestamp(epoch * self.ttl, timezone.utc)
+            while self._users and next(iter(self._users.values()))[1] < expired:
+                self._users.popitem(last=False)
+        while len(self._users) > self.max_users:
+            _, self._floor = self._users.popitem(last=False)
+
+    def mark_changed(self, db: Session, user_ids):
+        """Merkt betroffene User vor; die Generation steigt erst beim Commit."""
+        db.info.setdefault(CHANGED_KEY, set()).update(user_ids)
+
+    def validator(self, view: str, params: tuple = (), user_id: int | None = None
+                  ) -> Validator:
+        epoch = int(time.time() // self.ttl) if self.ttl else 0
+        epoch_start = datetime.fromtimestamp(epoch * self.ttl, timezone.utc)
+
+        if user_id is None:
+            generation, changed_at = self.generation, self.changed_at
+        else:
+            generation, changed_at = self._users.get(user_id, self._floor)
+
+        key = (view, params, generation, epoch)
+        digest = hashlib.sha1(f"{_BOOT_ID}{key!r}".encode()).hexdigest()[:16]
+        return Validator(
+            key=key,
+            etag=f'W/"{view}-{digest}"',
+            last_modified=max(changed_at, epoch_start),
+        )
+
+    def get_or_compute(self, validator: Validator, compute):
+        if BYPASS.get():
+            return compute()
+        value = self.entries.get(validator.key)
+        if value is None:
+            value = compute()
+            self.entries.set(validator.key, value)
+        return value
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(db: Session):
+    changed = db.info.pop(CHANGED_KEY, None)
+    if changed is not None:
+        view_cache.bump(changed)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes(db: Session, previous_transaction):
+    db.info.pop(CHANGED_KEY, None)
+
+
+view_cache = ViewCache()
@@ -0,0 +1,206 @@
+# app/dedup.py
+"""
+Erkennt doppelt gesendete Batches und Events, bevor sie geschrieben werden.
+
+- Batches tragen optional eine ID (Header ``X-Batch-Id``); ein zweiter
+  Batch mit derselben ID wird komplett übersprungen.
+- Jedes Event bekommt einen Fingerabdruck (64 Bit BLAKE2b über alle
+  Inhaltsfelder inkl. User und Session-Key, Zeitstempel normalisiert auf UTC).
+
+Beides wird zuerst gegen einen rotierenden Bloom-Filter im Speicher geprüft.
+Sagt der "neu", ist es neu – Normalfall, ohne Lesezugriff. Nur Treffer
+werden gegen den Primärschlüssel von ``event_fingerprints`` bzw.
+``ingest_batches`` bestätigt (Bloom-Filter haben falsch-positive Treffer).
+Neue Abdrücke werden per ``INSERT ... ON CONFLICT DO NOTHING RETURNING``
+eingetragen: was nicht zurückkommt, hat ein anderer Prozess gerade
+geschrieben und zählt ebenfalls als Duplikat.
+
+Erkannt wird innerhalb von DEDUP_WINDOW_HOURS; ältere Abdrücke werden beim
+Rotieren des Filters aus der Datenbank gelöscht. Nach einem Neustart wird
+der Filter beim ersten Batch aus der Datenbank vorgeladen.
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from . import config, models
+from .database import upsert_insert
+from .wire import FIELDS
+
+# Parameter je Statement (SQLite erlaubt 32766 Variablen)
+CHUNK = 1000
+
+_CONTENT_FIELDS = tuple(name for name in FIELDS if name != "timestamp")
+
+
+def _int64(digest: bytes) -> int:
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def fingerprint(ev) -> int:
+    """64-Bit-Abdruck eines Events (schemas.BrowserEventCreate bzw. wire.WireEvent)."""
+    ts = ev.timestamp
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    values = [ts.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")]
+    values += [getattr(ev, name) for name in _CONTENT_FIELDS]
+    data = json.dumps(values, separators=(",", ":"), sort_keys=True, default=str)
+    return _int64(hashlib.blake2b(data.encode(), digest_size=8).digest())
+
+
+def batch_key(batch_id: str) -> int:
+    """Batch-IDs liegen im selben Filter, aber in eigenem Namensraum."""
+    return _int64(hashlib.blake2b(batch_id.encode(), digest_size=8, person=b"batch").digest())
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: int):
+        # Double Hashing aus den beiden Hälften des (schon gleichverteilten) Abdrucks
+        h1, h2 = key & 0xFFFFFFFF, (key >> 32) & 0xFFFFFFFF | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, key: int):
+        for pos in self._positions(key):
+            self.array[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: int) -> bool:
+        return all(self.array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RotatingBloom:
+    """
+    Zwei Generationen: neue Schlüssel landen in der aktuellen, geprüft wird
+    in beiden. Ist die aktuelle voll oder älter als das halbe Fenster, wird
+    sie zur vorherigen und die alte verworfen.
+    """
+
+    def __init__(self, capacity: int = config.DEDUP_BLOOM_CAPACITY,
+                 error_rate: float = config.DEDUP_BLOOM_ERROR,
+                 window_hours: float = config.DEDUP_WINDOW_HOURS):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_age = window_hours * 3600 / 2
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous: BloomFilter | None = None
+        self.started = time.monotonic()
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.current or (self.previous is not None and key in self.previous)
+
+    def add(self, key: int):
+        self.current.add(key)
+
+    def due(self) -> bool:
+        return (self.current.count >= self.capacity
+                or time.monotonic() - self.started >= self.max_age)
+
+    def rotate(self):
+        self.previous = self.current
+        self.current = BloomFilter(self.capacity, self.error_rate)
+        self.started = time.monotonic()
+
+
+class Deduplicator:
+    def __init__(self, window_hours: float = config.DEDUP_WINDOW_HOURS):
+        self.window = timedelta(hours=window_hours)
+        self.bloom = RotatingBloom(window_hours=window_hours)
+        self.loaded = False
+        self.confirmed = 0          # per Datenbank bestätigte Duplikate
+        self.false_positives = 0    # Filter-Treffer, die doch neu waren
+        self._lock = threading.Lock()
+
+    def _warm(self, db: Session):
+        """Filter nach einem Neustart mit den Abdrücken im Fenster füllen."""
+        since = datetime.now(timezone.utc) - self.window
+        for model, column in ((models.EventFingerprint, models.EventFingerprint.fingerprint),
+                              (models.IngestBatchId, models.IngestBatchId.batch_key)):
+            for key in db.execute(select(column).where(model.seen_at >= since)).scalars():
+                self.bloom.add(key)
+        self.loaded = True
+
+    def _rotate(self, db: Session):
+        self.bloom.rotate()
+        cutoff = datetime.now(timezone.utc) - self.window
+        db.execute(delete(models.EventFingerprint)
+                   .where(models.EventFingerprint.seen_at < cutoff))
+        db.execute(delete(models.IngestBatchId).where(models.IngestBatchId.seen_at < cutoff))
+
+    def fresh_events(self, db: Session, events: list, batch_id: str | None = None) -> list[bool]:
+        """
+        Je Event True, wenn es neu ist, und trägt die neuen Abdrücke ein
+        (in der Transaktion des Aufrufers). Ist der Batch schon bekannt,
+        sind alle False.
+        """
+        with self._lock:
+            if not self.loaded:
+                self._warm(db)
+            if self.bloom.due():
+                self._rotate(db)
+
+            now = datetime.now(timezone.utc)
+            if batch_id is not None:
+                key = batch_key(batch_id)
+                if not self._claim(db, models.IngestBatchId, models.IngestBatchId.batch_key,
+                                   [key], now):
+                    return [False] * len(events)
+
+            prints = [fingerprint(ev) for ev in events]
+            # Duplikate innerhalb des Batches: nur das erste Vorkommen zählt
+            first = {}
+            for i, fp in enumerate(prints):
+                first.setdefault(fp, i)
+            claimed = self._claim(db, models.EventFingerprint,
+                                  models.EventFingerprint.fingerprint, list(first), now)
+            return [first[fp] == i and fp in claimed for i, fp in enumerate(prints)]
+
+    def _claim(self, db: Session, model, column, keys: list[int], now) -> set[int]:
+        """Trägt ``keys`` ein; liefert die, die vorher noch nicht da waren."""
+        maybe = [k for k in keys if k in self.bloom]
+        seen = set()
+        for i in range(0, len(maybe), CHUNK):
+            seen.update(db.execute(
+                select(column).where(column.in_(maybe[i:i + CHUNK]))
+            ).scalars())
+        self.confirmed += len(seen)
+        self.false_positives += len(maybe) - len(seen)
+
+        new = [k for k in keys if k not in seen]
+        name = column.key
+        claimed = set()
+        stmt = upsert_insert(db, model)
+        for i in range(0, len(new), CHUNK):
+            rows = [{name: k, "seen_at": now} for k in new[i:i + CHUNK]]
+            if stmt is not None:
+                claimed.update(db.execute(
+                    stmt.on_conflict_do_nothing().returning(column), rows
+                ).scalars())
+            else:
+                db.execute(insert(model), rows)
+                claimed.update(k for k in new[i:i + CHUNK])
+        for k in keys:
+            self.bloom.add(k)
+        return claimed
+
+    def as_dict(self) -> dict:
+        return {
+            "confirmed_duplicates": self.confirmed,
+            "bloom_false_positives": self.false_positives,
+            "bloom_current": self.bloom.current.count,
+            "bloom_previous": self.bloom.previous.count if self.bloom.previous else 0,
+        }
+
+
+deduplicator = Deduplicator()
@@ -1,9 +1,19 @@
 # app/deps.py
 from typing import Generator
-from .database import SessionLocal
+from .database import ReadSessionLocal, SessionLocal
 
 
 def get_db() -> Generator:
+    """Lesende Session aus dem Reader-Pool (Dashboard, Nutzer-Ansichten)."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_write_db() -> Generator:
+    """Session auf der einen, serialisierten Schreib-Verbindung (Ingest)."""
     db = SessionLocal()
     try:
         yield db
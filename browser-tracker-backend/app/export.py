@@ -0,0 +1,161 @@
+# app/export.py
+"""
+Export der Roh-Events (GET /api/events/export) als NDJSON oder CSV.
+
+Alles läuft als Generator: Partitionen werden mit ``yield_per`` blockweise
+gelesen, archivierte Monate blockweise dekodiert, und die Ausgabe geht in
+Stücken von etwa EXPORT_CHUNK_BYTES raus – der Speicherbedarf hängt also
+nicht von der Anzahl der Treffer ab.
+"""
+import csv
+import io
+import json
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+
+from sqlalchemy.orm import Session
+
+from . import archive, config, partitions
+from .database import ReadSessionLocal
+
+COLUMNS = archive.COLUMNS
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+@dataclass
+class EventFilter:
+    start: datetime | None = None
+    end: datetime | None = None
+    user_id: int | None = None
+    bc_company: str | None = None
+    bc_page_id: int | None = None
+    action_type: str | None = None
+
+    def __post_init__(self):
+        # gespeichert wird UTC; Angaben ohne Zeitzone gelten als UTC
+        for name in ("start", "end"):
+            value = getattr(self, name)
+            if value is not None and value.tzinfo is not None:
+                setattr(self, name, value.astimezone(timezone.utc).replace(tzinfo=None))
+
+    def equals(self) -> dict:
+        """Gleichheits-Filter als spalte -> wert (nur gesetzte)."""
+        values = {
+            "user_id": self.user_id,
+            "bc_company": self.bc_company,
+            "bc_page_id": self.bc_page_id,
+            "action_type": self.action_type,
+        }
+        return {k: v for k, v in values.items() if v is not None}
+
+
+def _partition_rows(db: Session, table, flt: EventFilter) -> Iterator:
+    where = [table.c[name] == value for name, value in flt.equals().items()]
+    if flt.start is not None:
+        where.append(table.c.timestamp >= flt.start)
+    if flt.end is not None:
+        where.append(table.c.timestamp < flt.end)
+    stmt = (
+        partitions.select_events(table)
+        .where(*where)
+        .order_by(table.c.timestamp, table.c.id)
+        .execution_options(yield_per=config.EXPORT_BATCH_SIZE)
+    )
+    yield from db.execute(stmt)
+
+
+def _archived_rows(month: "archive.ArchivedMonth", flt: EventFilter) -> Iterator:
+    with month.open() as reader:
+        mask = reader.time_mask(flt.start, flt.end)
+        for name, value in flt.equals().items():
+            mask &= reader.matches(name, value)
+        yield from reader.iter_rows(mask, batch_size=config.EXPORT_BATCH_SIZE)
+
+
+def iter_events(db: Session, flt: EventFilter) -> Iterator:
+    """Alle passenden Events, Monat für Monat in Zeitreihenfolge."""
+    sources = [
+        (month.month_start, 0, lambda m=month: _archived_rows(m, flt))
+        for month in archive.months(flt.start, flt.end)
+    ]
+    for table in partitions.for_range(db, flt.start, flt.end):
+        month = partitions.month_of(table.name)
+        sources.append((month, 1, lambda t=table: _partition_rows(db, t, flt)))
+
+    for _, _, rows in sorted(sources, key=lambda s: s[:2]):
+        yield from rows()
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _chunked(lines: Iterable[str]) -> Iterator[bytes]:
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= config.EXPORT_CHUNK_BYTES:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def ndjson_lines(rows: Iterable) -> Iterator[str]:
+    for row in rows:
+        record = {name: _value(getattr(row, name)) for name in COLUMNS}
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def csv_lines(rows: Iterable) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def flush() -> str:
+        line = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return line
+
+    writer.writerow(COLUMNS)
+    yield flush()
+    for row in rows:
+        values = [_value(getattr(row, name)) for name in COLUMNS]
+        meta = values[COLUMNS.index("meta")]
+        if meta is not None:
+            values[COLUMNS.index("meta")] = json.dumps(meta, ensure_ascii=False)
+        writer.writerow(values)
+        yield flush()
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Komprimiert einen Byte-Stream on the fly (gzip-Container)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(flt: EventFilter, fmt: str, gzip: bool) -> Iterator[bytes]:
+    """
+    Body für die StreamingResponse. Öffnet eine eigene Lese-Session, weil der
+    Generator erst nach dem Request-Handler abgearbeitet wird.
+    """
+    db = ReadSessionLocal()
+    try:
+        lines = ndjson_lines if fmt == "ndjson" else csv_lines
+        chunks = _chunked(lines(iter_events(db, flt)))
+        yield from gzip_chunks(chunks) if gzip else chunks
+    finally:
+        db.close()
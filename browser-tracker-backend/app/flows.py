@@ -0,0 +1,304 @@
+# app/flows.py
+"""
+Seitenübergänge (Process Mining): pro Session wird die Folge der besuchten
+BC-Seiten mitgeschrieben. Ein *Besuch* ist eine Folge von Events auf
+derselben Page; wechselt die Page, entsteht ein Übergang
+"von -> nach" mit der Verweildauer auf der Vorgänger-Seite. Eine Pause über
+ACTIVITY_IDLE_GAP trennt die Kette (kein Übergang über die Pause hinweg).
+
+Fortgeschrieben werden je Tag (UTC, Tag des Übergangs), Company (der Ziel-
+Seite) und User:
+
+- ``flow_edges_daily``: Anzahl Übergänge und Summe der Verweildauer
+- ``flow_paths_daily``: Anzahl der Pfade aus drei Seiten (A -> B -> C)
+
+Der Stand je Session (aktuelle/vorige Seite, letztes Event) liegt in
+``flow_sessions``; ein neuer Batch wird daran angehängt, ohne Rohdaten zu
+lesen. Events, die älter sind als das letzte bereits verarbeitete Event
+ihrer Session, werden für die Übergänge ignoriert.
+
+    python -m app.flows rebuild
+"""
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from . import archive, config, models, partitions
+from .database import SessionLocal, upsert_insert
+
+NO_USER = 0        # wie in den Rollups
+NO_COMPANY = ""
+
+
+@dataclass
+class Stream:
+    """Page-Events als Arrays (eine Zeile je Event oder Zustands-Zeile)."""
+    sessions: np.ndarray      # int64
+    ts: np.ndarray            # datetime64[us], für Reihenfolge und Pausen
+    entered: np.ndarray       # datetime64[us], Beginn des Besuchs
+    pages: np.ndarray         # int64
+    companies: np.ndarray     # int64 (Code in ``names``)
+    users: np.ndarray         # int64
+    state: np.ndarray         # bool: Zeile stammt aus flow_sessions
+    names: list               # Company-Codes -> Namen
+
+    def sorted(self) -> "Stream":
+        # Zustands-Zeilen vor neuen Events mit gleichem Zeitstempel
+        order = np.lexsort((~self.state, self.ts, self.sessions))
+        return Stream(
+            self.sessions[order], self.ts[order], self.entered[order],
+            self.pages[order], self.companies[order], self.users[order],
+            self.state[order], self.names,
+        )
+
+
+def _stream(rows: list[tuple], state: list[bool], names: dict) -> Stream:
+    """rows: (session_id, ts, entered, page, company, user)."""
+    codes = [names.setdefault(r[4] or NO_COMPANY, len(names)) for r in rows]
+    return Stream(
+        sessions=np.array([r[0] for r in rows], dtype=np.int64),
+        ts=np.array([r[1] for r in rows], dtype="datetime64[us]"),
+        entered=np.array([r[2] for r in rows], dtype="datetime64[us]"),
+        pages=np.array([r[3] for r in rows], dtype=np.int64),
+        companies=np.array(codes, dtype=np.int64),
+        users=np.array([r[5] or NO_USER for r in rows], dtype=np.int64),
+        state=np.array(state, dtype=bool),
+        names=list(names),
+    )
+
+
+@dataclass
+class Replay:
+    edges: list[dict]
+    paths: list[dict]
+    sessions: list[dict]
+
+
+def _aggregate(keys: list[np.ndarray], values: list[np.ndarray]):
+    if not len(keys[0]):
+        return np.zeros((0, len(keys)), np.int64), [np.zeros(0) for _ in values]
+    groups, inverse = np.unique(np.stack(keys, axis=1), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    return groups, [np.bincount(inverse, weights=v, minlength=len(groups)) for v in values]
+
+
+def replay(s: Stream, gap: float = config.ACTIVITY_IDLE_GAP) -> Replay:
+    """Besuche, Übergänge, Pfade und End-Zustand je Session, vektorisiert."""
+    n = len(s.ts)
+    if not n:
+        return Replay([], [], [])
+    micros = s.ts.astype(np.int64)
+    new_chain = np.ones(n, bool)
+    new_chain[1:] = (s.sessions[1:] != s.sessions[:-1]) | (
+        np.diff(micros) > gap * 1_000_000
+    )
+    new_visit = new_chain.copy()
+    new_visit[1:] |= s.pages[1:] != s.pages[:-1]
+
+    v = np.flatnonzero(new_visit)                 # erste Zeile je Besuch
+    chain = np.cumsum(new_chain)[v]
+    enter = s.entered[v]
+    # neu ist ein Besuch, wenn er mit einem echten Event beginnt
+    fresh = ~s.state[v]
+
+    # Übergänge: Besuch k -> k+1 in derselben Kette, Ziel neu
+    e = np.flatnonzero((chain[1:] == chain[:-1]) & fresh[1:])
+    to = v[e + 1]
+    dwell = (enter[e + 1] - enter[e]).astype("timedelta64[us]").astype(np.int64) / 1e6
+    groups, (counts, dwell_sum) = _aggregate(
+        [s.ts[to].astype("datetime64[D]").astype(np.int64), s.companies[to],
+         s.pages[v[e]], s.pages[to], s.users[to]],
+        [np.ones(len(e)), dwell],
+    )
+    edges = [
+        {
+            "day": np.datetime64(g[0], "D").item(), "bc_company": s.names[g[1]],
+            "from_page": int(g[2]), "to_page": int(g[3]), "user_id": int(g[4]),
+            "transitions": int(c), "dwell_seconds": float(d),
+        }
+        for g, c, d in zip(groups.tolist(), counts.tolist(), dwell_sum.tolist())
+    ]
+
+    # Pfade: Besuche k, k+1, k+2 in derselben Kette, letzter neu
+    p = np.flatnonzero((chain[2:] == chain[:-2]) & fresh[2:])
+    last = v[p + 2]
+    groups, (counts,) = _aggregate(
+        [s.ts[last].astype("datetime64[D]").astype(np.int64), s.companies[last],
+         s.pages[v[p]], s.pages[v[p + 1]], s.pages[last]],
+        [np.ones(len(p))],
+    )
+    paths = [
+        {
+            "day": np.datetime64(g[0], "D").item(), "bc_company": s.names[g[1]],
+            "page_a": int(g[2]), "page_b": int(g[3]), "page_c": int(g[4]),
+            "path_count": int(c),
+        }
+        for g, c in zip(groups.tolist(), counts.tolist())
+    ]
+
+    # End-Zustand: letzter Besuch je Session (+ Vorgänger in derselben Kette)
+    session_of_visit = s.sessions[v]
+    last_visit = np.flatnonzero(np.r_[session_of_visit[1:] != session_of_visit[:-1], True])
+    last_row = np.r_[v[1:], n][last_visit] - 1
+    has_prev = (last_visit > 0) & (np.r_[-1, chain][last_visit] == chain[last_visit])
+    prev_page = np.where(has_prev, s.pages[v[np.maximum(last_visit - 1, 0)]], 0)
+    sessions = [
+        {
+            "session_id": int(s.sessions[v[k]]),
+            "user_id": int(s.users[v[k]]),
+            "bc_company": s.names[s.companies[v[k]]],
+            "bc_page_id": int(s.pages[v[k]]),
+            "entered_at": enter[k].item(),
+            "prev_page_id": int(prev),
+            "last_event_at": s.ts[row].item(),
+        }
+        for k, row, prev in zip(last_visit.tolist(), last_row.tolist(), prev_page.tolist())
+    ]
+    return Replay(edges, paths, sessions)
+
+
+def _write(db: Session, result: Replay):
+    E = models.FlowEdgeDaily
+    if result.edges:
+        stmt = upsert_insert(db, E)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[E.day, E.bc_company, E.from_page, E.to_page, E.user_id],
+            set_={
+                "transitions": E.transitions + stmt.excluded.transitions,
+                "dwell_seconds": E.dwell_seconds + stmt.excluded.dwell_seconds,
+            },
+        )
+        db.execute(stmt, result.edges)
+
+    P = models.FlowPathDaily
+    if result.paths:
+        stmt = upsert_insert(db, P)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[P.day, P.bc_company, P.page_a, P.page_b, P.page_c],
+            set_={"path_count": P.path_count + stmt.excluded.path_count},
+        )
+        db.execute(stmt, result.paths)
+
+    S = models.FlowSession
+    if result.sessions:
+        stmt = upsert_insert(db, S)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[S.session_id],
+            set_={
+                name: getattr(stmt.excluded, name)
+                for name in ("user_id", "bc_company", "bc_page_id", "entered_at",
+                             "prev_page_id", "last_event_at")
+            },
+        )
+        db.execute(stmt, result.sessions)
+
+
+def apply_rows(db: Session, rows: list[dict]):
+    """Hängt frisch eingefügte Events an den Stand ihrer Sessions an."""
+    rows = [
+        r for r in rows
+        if r["bc_page_id"] and r["session_id"] is not None and r["timestamp"] is not None
+    ]
+    if not rows:
+        return
+
+    S = models.FlowSession
+    states = {
+        st.session_id: st
+        for st in db.execute(
+            select(S).where(S.session_id.in_({r["session_id"] for r in rows}))
+        ).scalars()
+    }
+
+    stream_rows, is_state = [], []
+    for st in states.values():
+        if st.prev_page_id:
+            stream_rows.append((st.session_id, st.last_event_at, st.entered_at,
+                                st.prev_page_id, st.bc_company, st.user_id))
+            is_state.append(True)
+        stream_rows.append((st.session_id, st.last_event_at, st.entered_at,
+                            st.bc_page_id, st.bc_company, st.user_id))
+        is_state.append(True)
+
+    for r in rows:
+        ts = archive.as_datetime64(r["timestamp"])
+        st = states.get(r["session_id"])
+        if st is not None and ts < np.datetime64(st.last_event_at, "us"):
+            continue    # Nachzügler: Reihenfolge der Session schon weiter
+        stream_rows.append((r["session_id"], ts, ts, r["bc_page_id"],
+                            r["bc_company"], r["user_id"]))
+        is_state.append(False)
+
+    if all(is_state):
+        return
+    _write(db, replay(_stream(stream_rows, is_state, {}).sorted()))
+
+
+def _all_events(db: Session) -> Stream:
+    names: dict = {}
+    parts = []
+    for E in partitions.for_range(db):
+        rows = [
+            (session_id, ts, ts, page, company, user)
+            for session_id, ts, page, company, user in db.execute(
+                select(E.c.session_id, E.c.timestamp, E.c.bc_page_id,
+                       E.c.bc_company, E.c.user_id)
+                .where(E.c.bc_page_id.isnot(None), E.c.session_id.isnot(None),
+                       E.c.timestamp.isnot(None))
+            )
+        ]
+        parts.append(_stream(rows, [False] * len(rows), names))
+    for month in archive.months():
+        with month.open() as reader:
+            mask = (
+                (reader.column("bc_page_id") != 0) & (reader.column("session_id") != 0)
+                & reader.time_mask()
+            )
+            ts = reader.values("timestamp", mask)
+            rows = list(zip(
+                reader.column("session_id")[mask].tolist(), ts, ts,
+                reader.column("bc_page_id")[mask].tolist(),
+                reader.values("bc_company", mask),
+                reader.column("user_id")[mask].tolist(),
+            ))
+        parts.append(_stream(rows, [False] * len(rows), names))
+
+    columns = ["sessions", "ts", "entered", "pages", "companies", "users", "state"]
+    return Stream(
+        *[np.concatenate([getattr(p, c) for p in parts]) for c in columns],
+        names=list(names),
+    )
+
+
+def rebuild(db: Session):
+    """Übergänge, Pfade und Session-Stände komplett neu aufbauen. Committet nicht."""
+    for model in (models.FlowEdgeDaily, models.FlowPathDaily, models.FlowSession):
+        db.execute(delete(model))
+    if not partitions.for_range(db) and not archive.months():
+        return
+    _write(db, replay(_all_events(db).sorted()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.flows")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="Seitenübergänge aus den Rohdaten neu aufbauen")
+    parser.parse_args(argv)
+
+    from .migrations import upgrade
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+    print("[FLOWS] Neu aufgebaut")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+# app/ingest.py
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import Session
+
+from . import activity, config, flows, live, metrics, partitions, rollups, schemas, search, sketches
+from .cache import view_cache
+from .database import SessionLocal
+from .dedup import deduplicator
+from .resolver import resolver
+
+logger = logging.getLogger(__name__)
+
+
+def event_row(ev: schemas.BrowserEventCreate, user_id: int | None,
+              session_id: int | None) -> dict:
+    """Spaltenwerte für ein Event, passend zu den Event-Partitionen."""
+    ts = ev.timestamp
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+
+    return {
+        "session_id": session_id,
+        "timestamp": ts.astimezone(timezone.utc),
+        "user_id": user_id,
+        "page_url": ev.page_url,
+        "page_title": ev.page_title,
+        "bc_page_id": ev.bc_page_id,
+        "bc_company": ev.bc_company,
+        "element_type": ev.element_type,
+        "element_role": ev.element_role,
+        "element_label": ev.element_label,
+        "element_name": ev.element_name,
+        "element_id": ev.element_id,
+        "element_path": ev.element_path,
+        "action_type": ev.action_type,
+        "old_value": ev.old_value,
+        "new_value": ev.new_value,
+        "meta": ev.meta,
+    }
+
+
+def insert_events(db: Session, rows: list[dict]) -> list[int]:
+    """
+    Schreibt alle Zeilen mit einem (multi-row/executemany) INSERT je
+    Monatspartition und liefert die neuen IDs in Eingabereihenfolge.
+    """
+    return partitions.insert_rows(db, rows)
+
+
+@dataclass
+class IngestBatch:
+    """Ein validierter Client-Batch, wie er in die Queue gelegt wird."""
+    events: list    # schemas.BrowserEventCreate bzw. wire.WireEvent (v2)
+    client_ip: str | None
+    user_agent: str | None
+    batch_id: str | None = None     # Header X-Batch-Id, für Wiederholungen
+
+
+def store_batch(db: Session, batch: IngestBatch) -> tuple[schemas.BatchAck, list[int | None]]:
+    """
+    Löst User/Session auf und schreibt die Events des Batches.
+    Committet nicht – das übernimmt der Aufrufer (ggf. für viele Batches).
+    Liefert die Quittung und die neuen Event-IDs in der Reihenfolge von
+    ``batch.events``; schon bekannte Events (siehe app/dedup.py) werden
+    übersprungen und haben die ID None.
+    """
+    session_ids: dict[tuple, int] = {}
+    user_ids: dict[int, int | None] = {}
+    rows = []
+
+    events = batch.events
+    fresh = None
+    if config.DEDUP_ENABLED:
+        fresh = deduplicator.fresh_events(db, events, batch.batch_id)
+        events = [ev for ev, new in zip(events, fresh) if new]
+
+    # Ein Batch darf Events mehrerer User/Sessions enthalten; jede
+    # Kombination wird einmal aufgelöst (im Normalfall aus dem Cache)
+    for ev in events:
+        identity = (ev.user_external_id, ev.session_key)
+        session_id = session_ids.get(identity)
+        if session_id is None:
+            user_id = resolver.user_id(db, ev.user_external_id)
+            session_id = resolver.session_id(
+                db, ev.session_key, user_id, batch.client_ip, batch.user_agent
+            )
+            session_ids[identity] = session_id
+            user_ids[session_id] = user_id
+        rows.append(event_row(ev, user_ids[session_id], session_id))
+
+    ids = []
+    if rows:
+        ids = insert_events(db, rows)
+        rollups.apply_rows(db, rows)
+        activity.apply_rows(db, rows)
+        flows.apply_rows(db, rows)
+        search.apply_rows(db, rows)
+        sketches.collect(db, rows)
+        view_cache.mark_changed(db, user_ids.values())
+        live.collect(db, rows)
+
+    distinct_sessions = list(dict.fromkeys(session_ids.values()))
+    ack = schemas.BatchAck(
+        count=len(rows),
+        duplicates=len(batch.events) - len(rows),
+        first_id=ids[0] if ids else None,
+        last_id=ids[-1] if ids else None,
+        session_id=distinct_sessions[0] if len(distinct_sessions) == 1 else None,
+        session_ids=distinct_sessions,
+    )
+    if fresh is not None and len(rows) < len(batch.events):
+        it = iter(ids)
+        ids = [next(it) if new else None for new in fresh]
+    return ack, ids
+
+
+class IngestStats:
+    """Einfache Zähler für Queue-Tiefe und Flush-Latenz."""
+
+    def __init__(self):
+        self.enqueued_batches = 0
+        self.enqueued_events = 0
+        self.rejected_batches = 0
+        self.flushes = 0
+        self.flushed_batches = 0
+        self.flushed_events = 0
+        self.failed_batches = 0
+        self.failed_events = 0
+        self.duplicate_events = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def as_dict(self) -> dict:
+        data = dict(vars(self))
+        data["avg_flush_ms"] = (
+            self.total_flush_ms / self.flushes if self.flushes else 0.0
+        )
+        return data
+
+
+class IngestQueue:
+    """
+    Begrenzte asyncio-Queue vor der Datenbank.
+
+    Requests legen validierte Batches ab und bekommen sofort eine Antwort.
+    Ein einzelner Writer-Task leert die Queue und schreibt viele Client-Batches
+    in einer Transaktion (Group Commit), sobald ``flush_events`` Events
+    zusammen sind oder ``flush_interval_ms`` abgelaufen ist.
+    """
+
+    def __init__(self, maxsize: int = config.INGEST_QUEUE_MAXSIZE,
+                 flush_events: int = config.INGEST_FLUSH_EVENTS,
+                 flush_interval_ms: int = config.INGEST_FLUSH_INTERVAL_MS,
+                 session_factory=SessionLocal):
+        self.maxsize = maxsize
+        self.flush_events = flush_events
+        self.flush_interval = flush_interval_ms / 1000
+        self.session_factory = session_factory
+        self.stats = IngestStats()
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.create_task(self._run(), name="ingest-writer")
+
+    async def stop(self):
+        """Nimmt keine neuen Batches mehr an und schreibt den Rest weg."""
+        if self._task is None:
+            return
+        self._closing = True
+        await self._queue.put(None)  # Sentinel nach allen offenen Batches
+        await self._task
+        self._task = None
+
+    async def enqueue(self, batch: IngestBatch,
+                      timeout: float = config.INGEST_ENQUEUE_TIMEOUT) -> bool:
+        """False, wenn die Queue geschlossen ist oder voll bleibt."""
+        if not self.running:
+            self.stats.rejected_batches += 1
+            return False
+        try:
+            self._queue.put_nowait(batch)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(batch), timeout)
+            except asyncio.TimeoutError:
+                self.stats.rejected_batches += 1
+                return False
+
+        self.stats.enqueued_batches += 1
+        self.stats.enqueued_events += len(batch.events)
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+
+            group = [first]
+            n_events = len(first.events)
+            deadline = loop.time() + self.flush_interval
+
+            while n_events < self.flush_events:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+                n_events += len(item.events)
+
+            try:
+                await asyncio.to_thread(self._flush, group)
+            except Exception:
+                # Der Writer darf nie sterben, sonst läuft die Queue voll
+                logger.exception("Ingest-Flush fehlgeschlagen")
+
+    def _flush(self, group: list[IngestBatch]):
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            try:
+                acks = [store_batch(db, batch)[0] for batch in group]
+                db.commit()
+                written = list(zip(group, acks))
+            except Exception:
+                db.rollback()
+                logger.exception(
+                    "Group Commit über %d Batches fehlgeschlagen, schreibe einzeln",
+                    len(group),
+                )
+                written = self._flush_one_by_one(db, group)
+        finally:
+            db.close()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stored = sum(ack.count for _, ack in written)
+        duplicates = sum(ack.duplicates for _, ack in written)
+        metrics.INGEST_FLUSH.observe(elapsed_ms / 1000)
+        metrics.INGEST_STORED.inc(stored)
+        metrics.INGEST_DUPLICATES.inc(duplicates)
+        metrics.INGEST_FAILED.inc(
+            sum(len(b.events) for b in group) - sum(len(b.events) for b, _ in written)
+        )
+        stats = self.stats
+        stats.flushes += 1
+        stats.flushed_batches += len(written)
+        stats.flushed_events += stored
+        stats.duplicate_events += duplicates
+        stats.last_flush_ms = elapsed_ms
+        stats.max_flush_ms = max(stats.max_flush_ms, elapsed_ms)
+        stats.total_flush_ms += elapsed_ms
+
+    def _flush_one_by_one(self, db: Session, group: list[IngestBatch]):
+        written = []
+        for batch in group:
+            try:
+                ack, _ = store_batch(db, batch)
+                db.commit()
+                written.append((batch, ack))
+            except Exception:
+                db.rollback()
+                self.stats.failed_batches += 1
+                self.stats.failed_events += len(batch.events)
+                logger.exception("Batch mit %d Events verworfen", len(batch.events))
+        return written
+
+
+ingest_queue = IngestQueue()
@@ -0,0 +1,280 @@
+# app/live.py
+"""
+Live-Updates für das Dashboard per Server-Sent Events (GET /api/live/dashboard).
+
+Beim Ingest sammelt ``collect`` je Transaktion die Deltas der frisch
+geschriebenen Events (Anzahl, je Tag, je Stunde, je User/Page); erst nach dem
+Commit gehen sie an den ``Broadcaster``. Der fasst alles, was innerhalb von
+LIVE_INTERVAL_MS ankommt, zu einer Nachricht zusammen, serialisiert sie
+einmal und verteilt dieselben Bytes an alle verbundenen Dashboards – die
+Datenbank sieht davon nichts. Nur die Top-Listen werden neu abgefragt,
+höchstens alle LIVE_TOP_INTERVAL Sekunden und nur, wenn jemand zuschaut und
+sich seitdem etwas geändert hat.
+
+Jede Nachricht trägt eine laufende Nummer (SSE ``id``). Das Dashboard kennt
+die Nummer seines Render-Stands und bekommt beim Verbinden (bzw. nach einem
+Reconnect über ``Last-Event-ID``) die verpassten Deltas aus einem Ringpuffer
+nachgereicht; ist der zu kurz oder kommt ein Client nicht hinterher, soll er
+neu laden (Event ``reload``).
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import config, offload, queries
+
+# Während einer Transaktion gesammelte Deltas (siehe collect)
+PENDING_KEY = "live_delta"
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = ": ping\n\n"
+
+
+def _new_delta() -> dict:
+    return {"events": 0, "recent": 0, "days": {}, "hours": {}, "users": {}, "pages": {}}
+
+
+def _add(target: dict, key, n: int = 1):
+    target[key] = target.get(key, 0) + n
+
+
+def _merge(into: dict, delta: dict):
+    into["events"] += delta["events"]
+    into["recent"] += delta["recent"]
+    for field in ("days", "hours", "users", "pages"):
+        for key, n in delta[field].items():
+            _add(into[field], key, n)
+
+
+def collect(db: Session, rows: list[dict]):
+    """Merkt die Deltas frisch eingefügter Event-Zeilen für den Commit vor."""
+    delta = db.info.get(PENDING_KEY)
+    if delta is None:
+        delta = db.info[PENDING_KEY] = _new_delta()
+
+    since_24h = datetime.now(timezone.utc) - timedelta(hours=24)
+    for row in rows:
+        ts: datetime = row["timestamp"]
+        delta["events"] += 1
+        if ts >= since_24h:
+            delta["recent"] += 1
+        _add(delta["days"], ts.strftime("%Y-%m-%d"))
+        _add(delta["hours"], ts.strftime("%Y-%m-%d %H"))
+        if row["user_id"]:
+            _add(delta["users"], row["user_id"])
+        if row["bc_page_id"]:
+            _add(delta["pages"], row["bc_page_id"])
+
+
+class Subscriber:
+    def __init__(self, seq: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=config.LIVE_SUBSCRIBER_QUEUE)
+        self.seq = seq          # bis hierhin kennt der Client alle Deltas
+        self.lagging = False
+
+
+class Broadcaster:
+    """Ein Fan-out für alle Dashboards: Deltas sammeln, takten, verteilen."""
+
+    def __init__(self, interval_ms: int = config.LIVE_INTERVAL_MS,
+                 history: int = config.LIVE_HISTORY,
+                 top_interval: float = config.LIVE_TOP_INTERVAL):
+        self.interval = interval_ms / 1000
+        self.top_interval = top_interval
+        self.seq = 0
+        self.subscribers: set[Subscriber] = set()
+        # (seq, Delta) der letzten Commits zum Nachreichen
+        self.history: deque[tuple[int, dict]] = deque(maxlen=history)
+        self._pending: dict | None = None
+        self._pending_since = 0     # seq vor dem ersten Delta in _pending
+        self._top_dirty = False
+        self._top_sent: dict | None = None
+        self._top_at = 0.0
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    # -- Schreibseite (beliebiger Thread, nach dem Commit) --
+
+    def publish(self, delta: dict):
+        with self._lock:
+            self.seq += 1
+            self.history.append((self.seq, delta))
+            if self._pending is None:
+                self._pending = _new_delta()
+                self._pending_since = self.seq - 1
+            _merge(self._pending, delta)
+            self._top_dirty = self._top_dirty or bool(delta["users"] or delta["pages"])
+
+    # -- Leseseite (Event-Loop) --
+
+    def subscribe(self, since: int | None) -> tuple[Subscriber, str | None]:
+        """
+        Meldet einen Client an; liefert dazu die seit ``since`` verpassten
+        Deltas als eine SSE-Nachricht (None: nichts verpasst).
+        """
+        with self._lock:
+            seq = self.seq
+            subscriber = Subscriber(seq)
+            self.subscribers.add(subscriber)
+            if since is None or since == seq:
+                return subscriber, None
+            if since > seq or not self._covers(since):
+                # Stand von vor einem Neustart bzw. zu weit zurück
+                return subscriber, _message("reload", {"seq": seq}, seq)
+            return subscriber, self._replay(since, seq)
+
+    def _covers(self, since: int) -> bool:
+        return not self.history or self.history[0][0] <= since + 1
+
+    def _replay(self, since: int, seq: int) -> str:
+        """Deltas (since, seq] aus dem Ringpuffer als eine Nachricht."""
+        merged = _new_delta()
+        for s, delta in self.history:
+            if since < s <= seq:
+                _merge(merged, delta)
+        return _message("delta", {**merged, "seq": seq}, seq)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="live-broadcaster")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._tick()
+            except Exception:
+                # wie beim Spool-Loader: der Task darf nicht sterben, sonst
+                # bleiben alle Dashboards verbunden, bekommen aber nichts mehr
+                logger.exception("Live-Update fehlgeschlagen")
+
+    async def _tick(self):
+        with self._lock:
+            delta, self._pending = self._pending, None
+            since, seq = self._pending_since, self.seq
+        if not self.subscribers:
+            return
+
+        if delta is not None:
+            self._send(_message("delta", {**delta, "seq": seq}, seq), since, seq)
+        top = await self._top_changes()
+        if top is not None:
+            self._send(_message("top", top, seq))
+
+    async def _top_changes(self) -> dict | None:
+        """Top-Nutzer/-Seiten neu abfragen, wenn fällig und geändert."""
+        now = time.monotonic()
+        if not self._top_dirty or now - self._top_at < self.top_interval:
+            return None
+        self._top_dirty = False
+        self._top_at = now
+        top = await offload.run_read(top_lists)
+        if top == self._top_sent:
+            return None
+        self._top_sent = top
+        return top
+
+    def _send(self, message: str, since: int | None = None, seq: int | None = None):
+        """
+        Dieselbe Nachricht an alle; nur wer sich mitten im Takt angemeldet
+        hat, kennt einen Teil der Deltas schon und bekommt den Rest einzeln.
+        """
+        for subscriber in list(self.subscribers):
+            if subscriber.lagging:
+                continue
+            own = message
+            if seq is not None:
+                if subscriber.seq >= seq:
+                    continue
+                if subscriber.seq > since:
+                    with self._lock:
+                        if not self._covers(subscriber.seq):
+                            subscriber.lagging = True
+                            continue
+                        own = self._replay(subscriber.seq, seq)
+                subscriber.seq = seq
+            try:
+                subscriber.queue.put_nowait(own)
+            except asyncio.QueueFull:
+                # zu langsam: nicht puffern, sondern neu laden lassen
+                subscriber.lagging = True
+
+
+def _message(kind: str, data: dict, seq: int) -> str:
+    payload = json.dumps(data, separators=(",", ":"), default=str)
+    return f"id: {seq}\nevent: {kind}\ndata: {payload}\n\n"
+
+
+def top_lists() -> dict:
+    from .database import ReadSessionLocal
+
+    db = ReadSessionLocal()
+    try:
+        return {
+            "top_users": [
+                {"external_id": u.external_id, "event_count": u.event_count}
+                for u in queries.top_users(db, limit=5)
+            ],
+            "top_pages": [
+                {"page_id": p.page_id, "page_url": p.page_url,
+                 "event_count": p.event_count, "user_count": p.user_count}
+                for p in queries.top_pages(db, limit=10)
+            ],
+        }
+    finally:
+        db.close()
+
+
+async def stream(since: int | None):
+    """
+    SSE-Body eines Clients. Angemeldet wird erst, wenn der Body tatsächlich
+    läuft – wird er nie iteriert (Abbruch vor dem ersten Senden), bleibt auch
+    kein Subscriber zurück; abgemeldet wird beim Abbruch im ``finally``.
+    """
+    subscriber, first = broadcaster.subscribe(since)
+    try:
+        if first is not None:
+            yield first
+        while not (subscriber.lagging and subscriber.queue.empty()):
+            try:
+                yield await asyncio.wait_for(subscriber.queue.get(), config.LIVE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+        yield _message("reload", {"seq": broadcaster.seq}, broadcaster.seq)
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+broadcaster = Broadcaster()
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(db: Session):
+    delta = db.info.pop(PENDING_KEY, None)
+    if delta is not None and delta["events"]:
+        broadcaster.publish(delta)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_delta(db: Session, previous_transaction):
+    db.info.pop(PENDING_KEY, None)
@@ -0,0 +1,77 @@
+# app/logs.py
+"""
+Strukturiertes Logging (eine Zeile ``key=value`` je Meldung) für die
+Logger unter ``app.*`` und ein Sampler für Meldungen im heißen Pfad: statt
+jeden Batch zu loggen, geht höchstens LOG_SAMPLE_PER_SECOND Meldungen je
+Sekunde raus, jeweils mit der Zahl der dazwischen unterdrückten.
+
+    logger.info("batch_received", extra={"fields": {"events": 50}})
+"""
+import logging
+import threading
+import time
+
+from . import config
+
+
+def _quote(value) -> str:
+    text = str(value)
+    if not text or any(c in text for c in ' "='):
+        return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return text
+
+
+class KeyValueFormatter(logging.Formatter):
+    """ts=… level=… logger=… msg=… plus die Felder aus ``extra={"fields": …}``."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        parts = [
+            f"ts={self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}",
+            f"level={record.levelname}",
+            f"logger={record.name}",
+            f"msg={_quote(record.getMessage())}",
+        ]
+        for key, value in (getattr(record, "fields", None) or {}).items():
+            parts.append(f"{key}={_quote(value)}")
+        line = " ".join(parts)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class LogSampler:
+    """
+    Lässt höchstens ``per_second`` Meldungen je Sekunde durch (Token-Bucket).
+    ``allow()`` liefert None (unterdrücken) oder die Zahl der seit der
+    letzten durchgelassenen Meldung unterdrückten.
+    """
+
+    def __init__(self, per_second: float = config.LOG_SAMPLE_PER_SECOND):
+        self.rate = per_second
+        self.tokens = max(per_second, 1.0)
+        self.updated = time.monotonic()
+        self.suppressed = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> int | None:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1.0:
+                self.suppressed += 1
+                return None
+            self.tokens -= 1.0
+            suppressed, self.suppressed = self.suppressed, 0
+            return suppressed
+
+
+def setup(level: str = config.LOG_LEVEL):
+    """Handler mit KeyValueFormatter an den ``app``-Logger hängen (idempotent)."""
+    logger = logging.getLogger(__package__)
+    logger.setLevel(level.upper())
+    if not any(isinstance(h.formatter, KeyValueFormatter) for h in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(KeyValueFormatter())
+        logger.addHandler(handler)
+        logger.propagate = False
@@ -2,14 +2,17 @@
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
-from .routers import events, dashboard, dashboard_users  # ggf. anpassen
-from .database import engine, Base  # falls du so etwas hast
+from . import config, live, logs, metrics, migrations, profiling
+from .routers import events, dashboard, dashboard_users, flows, stats  # ggf. anpassen
+from .routers import profiling as profiling_router
+from .ingest import ingest_queue
+from .spool import spool
 
-# DB-Tabellen anlegen (falls noch nicht)
-# Base.metadata.create_all(bind=engine)
+logs.setup()
 
 app = FastAPI(title="Browser Activity Tracker Backend")
 
@@ -22,6 +25,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latenz je Route und SQL-Statement messen (GET /metrics)
+if config.METRICS_ENABLED:
+    metrics.install(app)
+
+# Profiling einzelner Requests auf Anforderung (nur mit PROFILE_TOKEN)
+if config.PROFILE_TOKEN:
+    profiling.install(app)
+
 # optional: Templates
 templates = Jinja2Templates(directory="app/templates")
 
@@ -29,13 +40,42 @@ templates = Jinja2Templates(directory="app/templates")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 
+# Schema-Migrationen anwenden, Ingest-Writer und Live-Updates starten
+# bzw. beim Herunterfahren die Queue leeren
+@app.on_event("startup")
+async def start_ingest_queue():
+    migrations.upgrade()
+    if config.INGEST_QUEUE_ENABLED:
+        await ingest_queue.start()
+    if config.INGEST_SPOOL_ENABLED:
+        await spool.start()     # versiegelt verwaiste Segmente, lädt nach
+    await live.broadcaster.start()
+
+
+@app.on_event("shutdown")
+async def drain_ingest_queue():
+    await spool.stop()
+    await ingest_queue.stop()
+    await live.broadcaster.stop()
+
+
 # Simple Ping-Endpoint zum Testen
 @app.get("/ping")
 async def ping(request: Request):
     return {"status": "ok"}
 
 
+# Prometheus-Scrape-Endpoint
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # Router einbinden
 app.include_router(events.router)
 app.include_router(dashboard.router)
 app.include_router(dashboard_users.router)
+app.include_router(flows.router)
+app.include_router(stats.router)
+if config.PROFILE_TOKEN:
+    app.include_router(profiling_router.router)
@@ -0,0 +1,300 @@
+# app/metrics.py
+"""
+Betriebsmetriken im Prometheus-Textformat (GET /metrics), ohne Zusatzpaket:
+
+- ``http_request_duration_seconds``: Histogramm je Methode, Route-Template
+  und Statusklasse (ASGI-Middleware)
+- ``db_statement_duration_seconds``: Histogramm je SQL-Statement, getaggt mit
+  der Herkunft (erste Funktion aus dem app-Paket im Aufrufstack, z.B.
+  ``queries.top_pages``) und der Art (SELECT/INSERT/...) – per
+  SQLAlchemy-Engine-Events
+- ``ingest_*``: Batchgrößen, empfangene/gespeicherte Events (Events pro
+  Sekunde = ``rate()`` der Zähler), Flush-Dauer, Queue-Tiefe
+- ``db_pool_*``: belegte/verfügbare Verbindungen je Pool
+- ``db_worker_threads``: belegte Worker-Threads und Wartende je Limiter
+- ``sqlite_file_bytes``: Größe der Datenbank- und WAL-Datei
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from . import config
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in items
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [Zähler je Bucket (nicht kumuliert) ..., +Inf, Summe]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = self.header()
+        names = self.label_names + ("le",)
+        for key, row in items:
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row):
+                total += count
+                lines.append(f"{self.name}_bucket{_labels(names, key + (bound,))} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {row[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {total}")
+        return lines
+
+
+class GaugeFunc(Metric):
+    """Gauge, deren Werte erst beim Abruf ermittelt werden: fn() -> {labels: wert}."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labels, fn):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in self.fn().items()
+        ]
+
+
+REGISTRY: list[Metric] = []
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------------
+# HTTP
+# ------------------------------------------------------------
+
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "Dauer der HTTP-Requests",
+    ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """Reine ASGI-Middleware (kein BaseHTTPMiddleware, kein Puffern von Streams)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = scope.get("route")
+            # Route-Template statt Pfad, sonst explodieren die Label-Werte
+            path = getattr(route, "path", None) or (
+                "/static" if scope["path"].startswith("/static/") else "<unmatched>"
+            )
+            HTTP_DURATION.observe(
+                time.perf_counter() - started, scope["method"], path, f"{status // 100}xx"
+            )
+
+
+# ------------------------------------------------------------
+# Datenbank
+# ------------------------------------------------------------
+
+DB_DURATION = Histogram(
+    "db_statement_duration_seconds", "Dauer der SQL-Statements nach Herkunft",
+    ("engine", "origin", "op"),
+)
+
+_PACKAGE = __package__ + "."
+_SKIP_MODULES = {__name__, _PACKAGE + "database"}
+
+
+def query_origin(depth: int = 2) -> str:
+    """Erste Funktion aus dem app-Paket im Aufrufstack, z.B. ``queries.top_pages``."""
+    frame = sys._getframe(depth)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(_PACKAGE) and module not in _SKIP_MODULES:
+            return f"{module[len(_PACKAGE):]}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "other"
+
+
+def statement_op(statement: str) -> str:
+    word = statement.lstrip()[:8].split(None, 1)
+    return word[0].upper() if word else "?"
+
+
+def instrument_engine(engine, name: str):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            DB_DURATION.observe(
+                time.perf_counter() - started, name, query_origin(), statement_op(statement)
+            )
+
+
+def _pool_stats() -> dict:
+    from .database import read_engine, write_engine
+
+    engines = {"write": write_engine}
+    if read_engine is not write_engine:
+        engines["read"] = read_engine
+    values = {}
+    for name, engine in engines.items():
+        pool = engine.pool
+        for stat in ("checkedout", "checkedin", "size", "overflow"):
+            fn = getattr(pool, stat, None)
+            if fn is not None:
+                values[(name, stat)] = fn()
+    return values
+
+
+def _file_sizes() -> dict:
+    url = make_url(config.DATABASE_URL)
+    if not url.drivername.startswith("sqlite") or url.database in (None, "", ":memory:"):
+        return {}
+    values = {}
+    for kind, suffix in (("db", ""), ("wal", "-wal")):
+        try:
+            values[(kind,)] = os.path.getsize(url.database + suffix)
+        except OSError:
+            pass
+    return values
+
+
+def _thread_stats() -> dict:
+    from .offload import read_limiter, write_limiter
+
+    values = {}
+    for name, limiter in (("read", read_limiter), ("write", write_limiter)):
+        stats = limiter.statistics()
+        values[(name, "busy")] = stats.borrowed_tokens
+        values[(name, "total")] = stats.total_tokens
+        values[(name, "waiting")] = stats.tasks_waiting
+    return values
+
+
+GaugeFunc("db_pool_connections", "Verbindungen je Pool", ("pool", "state"), _pool_stats)
+GaugeFunc("db_worker_threads", "Worker-Threads der Handler (app/offload.py)",
+          ("kind", "state"), _thread_stats)
+GaugeFunc("sqlite_file_bytes", "Größe der SQLite-Dateien", ("file",), _file_sizes)
+
+
+# ------------------------------------------------------------
+# Ingest
+# ------------------------------------------------------------
+
+INGEST_BATCH_SIZE = Histogram(
+    "ingest_batch_events", "Events je empfangenem Batch", ("format",), BATCH_BUCKETS
+)
+INGEST_RECEIVED = Counter(
+    "ingest_events_received_total", "Empfangene Events", ("format",)
+)
+INGEST_STORED = Counter("ingest_events_stored_total", "Gespeicherte (committete) Events")
+INGEST_FAILED = Counter("ingest_events_failed_total", "Verworfene Events")
+INGEST_DUPLICATES = Counter("ingest_events_duplicate_total", "Schon bekannte, übersprungene Events")
+INGEST_FLUSH = Histogram("ingest_flush_duration_seconds", "Dauer eines Group Commits")
+
+
+def _queue_stats() -> dict:
+    from .ingest import ingest_queue
+
+    return {("depth",): ingest_queue.depth, ("maxsize",): ingest_queue.maxsize}
+
+
+GaugeFunc("ingest_queue", "Ingest-Queue (Client-Batches)", ("stat",), _queue_stats)
+
+
+def install(app):
+    """Middleware und Engine-Hooks einhängen (einmal beim App-Start)."""
+    from .database import read_engine, write_engine
+
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(write_engine, "write")
+    if read_engine is not write_engine:
+        instrument_engine(read_engine, "read")
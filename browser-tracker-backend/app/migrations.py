@@ -0,0 +1,571 @@
+# app/migrations.py
+"""
+Versionierte Schema-Migrationen.
+
+Jede Migration hat eine fortlaufende Nummer und wird genau einmal angewendet;
+der Stand steht in ``schema_migrations``. Migrationen sind bewusst als
+explizites DDL geschrieben (nicht über die aktuellen Models), damit alte
+Schritte auch dann gleich bleiben, wenn sich die Models später ändern. Sie
+sind außerdem idempotent, damit bestehende Datenbanken von vor der
+Einführung sauber übernommen werden.
+
+Für die ``run``-Schritte gilt:
+
+- Daten umbauen (Sessions zusammenführen, Events partitionieren, Texte
+  internieren) ist ebenfalls eingefrorenes SQL im Stand seiner Migration –
+  eine Datenbank von vor Migration 5 durchläuft sonst Schritt 5 schon mit
+  dem Partitionsformat von Schritt 6.
+- Abgeleitete Tabellen befüllen (Rollups, Aktivität, Flows, Suche,
+  Sketches) läuft dagegen über den aktuellen Code. Diese Tabellen lassen
+  sich jederzeit aus den Events neu aufbauen (``python -m app.rollups
+  rebuild`` usw.) und die Backfills laufen erst, wenn die Events im
+  aktuellen Format vorliegen.
+
+    python -m app.migrations upgrade     # beim Start passiert das automatisch
+    python -m app.migrations status
+"""
+import argparse
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Callable
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from . import activity, flows, rollups, search, sketches
+from .database import write_engine
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    statements: tuple[str, ...] = ()
+    run: Callable[[Connection], None] | None = None
+
+
+def _unique_sessions(conn: Connection):
+    # Das alte Get-or-create hat bei parallelen Batches doppelte Sessions
+    # angelegt: Events auf die älteste Session je (Key, User) umhängen, den
+    # Rest löschen, erst dann kann der Unique-Index entstehen
+    oldest = (
+        "SELECT MIN(k.id) FROM sessions d JOIN sessions k "
+        "ON k.session_key IS d.session_key AND k.user_id IS d.user_id WHERE d.id = {id}"
+    )
+    duplicates = f"SELECT s.id FROM sessions s WHERE s.id <> ({oldest.format(id='s.id')})"
+    if conn.dialect.has_table(conn, "browser_events"):
+        conn.execute(text(
+            f"UPDATE browser_events SET session_id = "
+            f"({oldest.format(id='browser_events.session_id')}) "
+            f"WHERE session_id IN ({duplicates})"
+        ))
+    conn.execute(text(f"DELETE FROM sessions WHERE id IN ({duplicates})"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_sessions_session_key_user_id "
+        "ON sessions (session_key, user_id)"
+    ))
+
+
+def _backfill_rollups(conn: Connection):
+    # Die Rohdaten liegen seit Migration 5 in Partitionen – vorher gibt es
+    # nichts, woraus sich die Rollups aufbauen ließen
+    if conn.dialect.has_table(conn, "event_partitions"):
+        rollups.ensure_backfilled(Session(bind=conn))
+
+
+# Spalten der Event-Partitionen im Stand von Migration 5 bzw. 6 (eingefroren,
+# das aktuelle Format steht in app/partitions.py)
+_EVENT_COLUMNS = (
+    "id", "session_id", "timestamp", "user_id", "page_url", "page_title",
+    "bc_page_id", "bc_company", "element_type", "element_role", "element_label",
+    "element_name", "element_id", "element_path", "action_type", "old_value",
+    "new_value", "meta",
+)
+_INTERNED_COLUMNS = ("page_url", "page_title", "element_path", "element_label")
+_PARTITION_COLUMNS_V5 = """
+    id INTEGER NOT NULL,
+    session_id INTEGER,
+    timestamp DATETIME,
+    user_id INTEGER,
+    page_url TEXT NOT NULL,
+    page_title TEXT,
+    bc_page_id INTEGER,
+    bc_company VARCHAR(100),
+    element_type VARCHAR(64),
+    element_role VARCHAR(64),
+    element_label TEXT,
+    element_name TEXT,
+    element_id TEXT,
+    element_path TEXT,
+    action_type VARCHAR(64) NOT NULL,
+    old_value TEXT,
+    new_value TEXT,
+    meta JSON,
+    PRIMARY KEY (id)
+"""
+_PARTITION_COLUMNS_V6 = """
+    id INTEGER NOT NULL,
+    session_id INTEGER,
+    timestamp DATETIME,
+    user_id INTEGER,
+    page_url_id INTEGER NOT NULL,
+    page_title_id INTEGER,
+    bc_page_id INTEGER,
+    bc_company VARCHAR(100),
+    element_type VARCHAR(64),
+    element_role VARCHAR(64),
+    element_label_id INTEGER,
+    element_name TEXT,
+    element_id TEXT,
+    element_path_id INTEGER,
+    action_type VARCHAR(64) NOT NULL,
+    old_value TEXT,
+    new_value TEXT,
+    meta JSON,
+    PRIMARY KEY (id)
+"""
+_PARTITION_INDEXES = {
+    "timestamp": "timestamp",
+    "user_id_timestamp": "user_id, timestamp",
+    "bc_page_id_user_id": "bc_page_id, user_id",
+    "session_id": "session_id",
+    "bc_company": "bc_company",
+}
+
+
+def _create_partition(conn: Connection, name: str, columns: str):
+    conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{name}" ({columns})'))
+    for suffix, indexed in _PARTITION_INDEXES.items():
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS "ix_{name}_{suffix}" ON "{name}" ({indexed})'
+        ))
+
+
+def _partition_events(conn: Connection):
+    # Alt-Tabelle browser_events auf Monatspartitionen verteilen, ID-Zähler
+    # hinter die höchste vorhandene ID. Die Rollups baut Migration 6 auf,
+    # der aktuelle Code liest nur noch das Format von dort.
+    conn.execute(text(
+        "INSERT INTO id_sequences (name, next_value) "
+        "SELECT 'browser_events', COALESCE(MAX(id), 0) + 1 FROM browser_events WHERE true "
+        "ON CONFLICT (name) DO UPDATE SET next_value = MAX(next_value, excluded.next_value)"
+    ))
+
+    months = conn.execute(text(
+        "SELECT DISTINCT strftime('%Y-%m-01', timestamp) FROM browser_events "
+        "WHERE timestamp IS NOT NULL"
+    )).scalars().all()
+    columns = ", ".join(_EVENT_COLUMNS)
+    for month in map(date.fromisoformat, months):
+        name = f"browser_events_{month:%Y%m}"
+        _create_partition(conn, name, _PARTITION_COLUMNS_V5)
+        conn.execute(
+            text(
+                "INSERT INTO event_partitions (name, month_start, month_end, created_at) "
+                "VALUES (:name, :month_start, :month_end, :created_at) ON CONFLICT DO NOTHING"
+            ),
+            {
+                "name": name,
+                "month_start": month.isoformat(),
+                "month_end": date(month.year + month.month // 12,
+                                  month.month % 12 + 1, 1).isoformat(),
+                "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f"),
+            },
+        )
+        conn.execute(
+            text(
+                f'INSERT INTO "{name}" ({columns}) SELECT {columns} FROM browser_events '
+                "WHERE strftime('%Y-%m-01', timestamp) = :month"
+            ),
+            {"month": month.isoformat()},
+        )
+    conn.execute(text("DELETE FROM browser_events WHERE timestamp IS NOT NULL"))
+
+
+def _intern_strings(conn: Connection):
+    # Partitionen aus Migration 5 umkopieren, Texte dabei nach event_strings
+    names = conn.execute(text("SELECT name FROM event_partitions")).scalars().all()
+    for name in names:
+        if "page_url" not in {c["name"] for c in inspect(conn).get_columns(name)}:
+            continue
+
+        old_name = name + "_unencoded"
+        conn.execute(text(f'ALTER TABLE "{name}" RENAME TO "{old_name}"'))
+        for suffix in _PARTITION_INDEXES:
+            conn.execute(text(f'DROP INDEX IF EXISTS "ix_{name}_{suffix}"'))
+        _create_partition(conn, name, _PARTITION_COLUMNS_V6)
+
+        values = " UNION ".join(
+            f'SELECT {column} FROM "{old_name}" WHERE {column} IS NOT NULL'
+            for column in _INTERNED_COLUMNS
+        )
+        conn.execute(text(
+            f"INSERT INTO event_strings (value) SELECT * FROM ({values}) WHERE true "
+            "ON CONFLICT DO NOTHING"
+        ))
+        targets, sources, joins = [], [], []
+        for column in _EVENT_COLUMNS:
+            if column in _INTERNED_COLUMNS:
+                targets.append(f"{column}_id")
+                sources.append(f"s_{column}.id")
+                joins.append(
+                    f"LEFT JOIN event_strings s_{column} ON s_{column}.value = e.{column}"
+                )
+            else:
+                targets.append(column)
+                sources.append(f"e.{column}")
+        conn.execute(text(
+            f'INSERT INTO "{name}" ({", ".join(targets)}) '
+            f'SELECT {", ".join(sources)} FROM "{old_name}" e {" ".join(joins)}'
+        ))
+        conn.execute(text(f'DROP TABLE "{old_name}"'))
+
+    columns = {c["name"] for c in inspect(conn).get_columns("sessions")}
+    if "user_agent" in columns:
+        if "user_agent_id" not in columns:
+            conn.execute(text(
+                "ALTER TABLE sessions ADD COLUMN user_agent_id INTEGER "
+                "REFERENCES event_strings (id)"
+            ))
+        conn.execute(text(
+            "INSERT INTO event_strings (value) SELECT DISTINCT user_agent FROM sessions "
+            "WHERE user_agent IS NOT NULL ON CONFLICT DO NOTHING"
+        ))
+        conn.execute(text(
+            "UPDATE sessions SET user_agent_id = "
+            "(SELECT id FROM event_strings WHERE value = sessions.user_agent)"
+        ))
+        conn.execute(text("ALTER TABLE sessions DROP COLUMN user_agent"))
+
+    rollups.ensure_backfilled(Session(bind=conn))
+
+
+def _backfill_activity(conn: Connection):
+    db = Session(bind=conn)
+    activity.rebuild(db)
+    db.flush()
+
+
+def _backfill_flows(conn: Connection):
+    db = Session(bind=conn)
+    flows.rebuild(db)
+    db.flush()
+
+
+def _backfill_search(conn: Connection):
+    db = Session(bind=conn)
+    search.rebuild(db)
+    db.flush()
+
+
+def _backfill_sketches(conn: Connection):
+    db = Session(bind=conn)
+    sketches.ensure_backfilled(db)
+    db.flush()
+
+
+MIGRATIONS = [
+    Migration(1, "baseline", (
+        """CREATE TABLE IF NOT EXISTS users (
+            id INTEGER NOT NULL,
+            external_id VARCHAR(255),
+            display_name VARCHAR(255),
+            department VARCHAR(255),
+            PRIMARY KEY (id)
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_external_id ON users (external_id)",
+        "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+        """CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER NOT NULL,
+            user_id INTEGER,
+            session_key VARCHAR(255),
+            started_at DATETIME NOT NULL,
+            ended_at DATETIME,
+            client_ip VARCHAR(64),
+            user_agent TEXT,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_sessions_id ON sessions (id)",
+        "CREATE INDEX IF NOT EXISTS ix_sessions_session_key ON sessions (session_key)",
+        "CREATE INDEX IF NOT EXISTS ix_sessions_user_id ON sessions (user_id)",
+        """CREATE TABLE IF NOT EXISTS browser_events (
+            id INTEGER NOT NULL,
+            session_id INTEGER,
+            timestamp DATETIME,
+            user_id INTEGER,
+            page_url TEXT NOT NULL,
+            page_title TEXT,
+            bc_page_id INTEGER,
+            bc_company VARCHAR(100),
+            element_type VARCHAR(64),
+            element_role VARCHAR(64),
+            element_label TEXT,
+            element_name TEXT,
+            element_id TEXT,
+            element_path TEXT,
+            action_type VARCHAR(64) NOT NULL,
+            old_value TEXT,
+            new_value TEXT,
+            meta JSON,
+            PRIMARY KEY (id),
+            FOREIGN KEY(session_id) REFERENCES sessions (id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_browser_events_id ON browser_events (id)",
+        "CREATE INDEX IF NOT EXISTS ix_browser_events_bc_page_id ON browser_events (bc_page_id)",
+        "CREATE INDEX IF NOT EXISTS ix_browser_events_session_id ON browser_events (session_id)",
+        "CREATE INDEX IF NOT EXISTS ix_browser_events_bc_company ON browser_events (bc_company)",
+        "CREATE INDEX IF NOT EXISTS ix_browser_events_user_id ON browser_events (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_browser_events_timestamp ON browser_events (timestamp)",
+    )),
+    Migration(2, "sessions_unique_key_user", run=_unique_sessions),
+    Migration(3, "event_rollups", (
+        """CREATE TABLE IF NOT EXISTS event_rollup_hourly (
+            bucket DATETIME NOT NULL,
+            user_id INTEGER NOT NULL,
+            bc_page_id INTEGER NOT NULL,
+            bc_company VARCHAR(100) NOT NULL,
+            action_type VARCHAR(64) NOT NULL,
+            event_count INTEGER NOT NULL,
+            PRIMARY KEY (bucket, user_id, bc_page_id, bc_company, action_type)
+        )""",
+        """CREATE TABLE IF NOT EXISTS event_rollup_daily (
+            day DATE NOT NULL,
+            user_id INTEGER NOT NULL,
+            bc_page_id INTEGER NOT NULL,
+            bc_company VARCHAR(100) NOT NULL,
+            action_type VARCHAR(64) NOT NULL,
+            event_count INTEGER NOT NULL,
+            first_event_at DATETIME,
+            last_event_at DATETIME,
+            PRIMARY KEY (day, user_id, bc_page_id, bc_company, action_type)
+        )""",
+        """CREATE TABLE IF NOT EXISTS bc_pages (
+            bc_page_id INTEGER NOT NULL,
+            page_url TEXT,
+            page_title TEXT,
+            PRIMARY KEY (bc_page_id)
+        )""",
+    ), run=_backfill_rollups),
+    Migration(4, "composite_indexes", (
+        # Zugriffspfade der heißen Abfragen (siehe app/plancheck.py)
+        "CREATE INDEX IF NOT EXISTS ix_browser_events_user_id_timestamp "
+        "ON browser_events (user_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_browser_events_bc_page_id_user_id "
+        "ON browser_events (bc_page_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_event_rollup_hourly_bucket_count "
+        "ON event_rollup_hourly (bucket, event_count)",
+        "CREATE INDEX IF NOT EXISTS ix_event_rollup_daily_day_count "
+        "ON event_rollup_daily (day, event_count)",
+        "CREATE INDEX IF NOT EXISTS ix_event_rollup_daily_user "
+        "ON event_rollup_daily (user_id, event_count, last_event_at)",
+        "CREATE INDEX IF NOT EXISTS ix_event_rollup_daily_page "
+        "ON event_rollup_daily (bc_page_id, user_id, event_count)",
+        # überflüssig: Präfix eines zusammengesetzten Index bzw. Index auf
+        # dem INTEGER PRIMARY KEY (= rowid) – kostet nur Schreibzeit
+        "DROP INDEX IF EXISTS ix_browser_events_user_id",
+        "DROP INDEX IF EXISTS ix_browser_events_bc_page_id",
+        "DROP INDEX IF EXISTS ix_browser_events_id",
+        "DROP INDEX IF EXISTS ix_sessions_id",
+        "DROP INDEX IF EXISTS ix_sessions_session_key",
+        "DROP INDEX IF EXISTS ix_users_id",
+        "PRAGMA optimize",
+    )),
+    Migration(5, "event_partitions", (
+        """CREATE TABLE IF NOT EXISTS event_partitions (
+            name VARCHAR(64) NOT NULL,
+            month_start DATE NOT NULL,
+            month_end DATE NOT NULL,
+            created_at DATETIME NOT NULL,
+            PRIMARY KEY (name),
+            UNIQUE (month_start)
+        )""",
+        """CREATE TABLE IF NOT EXISTS id_sequences (
+            name VARCHAR(64) NOT NULL,
+            next_value INTEGER NOT NULL,
+            PRIMARY KEY (name)
+        )""",
+    ), run=_partition_events),
+    Migration(6, "event_strings", (
+        """CREATE TABLE IF NOT EXISTS event_strings (
+            id INTEGER NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (id)
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_event_strings_value ON event_strings (value)",
+    ), run=_intern_strings),
+    Migration(7, "activity", (
+        """CREATE TABLE IF NOT EXISTS activity_spans (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            start_at DATETIME NOT NULL,
+            end_at DATETIME NOT NULL,
+            event_count INTEGER NOT NULL,
+            last_page_id INTEGER NOT NULL,
+            PRIMARY KEY (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_activity_spans_user_start "
+        "ON activity_spans (user_id, start_at)",
+        "CREATE INDEX IF NOT EXISTS ix_activity_spans_end_at ON activity_spans (end_at)",
+        """CREATE TABLE IF NOT EXISTS activity_daily (
+            day DATE NOT NULL,
+            user_id INTEGER NOT NULL,
+            bc_page_id INTEGER NOT NULL,
+            active_seconds FLOAT NOT NULL,
+            PRIMARY KEY (day, user_id, bc_page_id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_activity_daily_user "
+        "ON activity_daily (user_id, bc_page_id, active_seconds)",
+    ), run=_backfill_activity),
+    Migration(8, "flows", (
+        """CREATE TABLE IF NOT EXISTS flow_edges_daily (
+            day DATE NOT NULL,
+            bc_company VARCHAR(255) NOT NULL,
+            from_page INTEGER NOT NULL,
+            to_page INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            transitions INTEGER NOT NULL,
+            dwell_seconds FLOAT NOT NULL,
+            PRIMARY KEY (day, bc_company, from_page, to_page, user_id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_flow_edges_daily_from "
+        "ON flow_edges_daily (from_page, day, to_page, transitions)",
+        "CREATE INDEX IF NOT EXISTS ix_flow_edges_daily_user ON flow_edges_daily (user_id, day)",
+        """CREATE TABLE IF NOT EXISTS flow_paths_daily (
+            day DATE NOT NULL,
+            bc_company VARCHAR(255) NOT NULL,
+            page_a INTEGER NOT NULL,
+            page_b INTEGER NOT NULL,
+            page_c INTEGER NOT NULL,
+            path_count INTEGER NOT NULL,
+            PRIMARY KEY (day, bc_company, page_a, page_b, page_c)
+        )""",
+        """CREATE TABLE IF NOT EXISTS flow_sessions (
+            session_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            bc_company VARCHAR(255) NOT NULL,
+            bc_page_id INTEGER NOT NULL,
+            entered_at DATETIME NOT NULL,
+            prev_page_id INTEGER NOT NULL,
+            last_event_at DATETIME NOT NULL,
+            PRIMARY KEY (session_id)
+        )""",
+    ), run=_backfill_flows),
+    Migration(9, "spool_checkpoints", (
+        """CREATE TABLE IF NOT EXISTS spool_checkpoints (
+            segment VARCHAR(64) NOT NULL,
+            position INTEGER NOT NULL,
+            updated_at DATETIME NOT NULL,
+            PRIMARY KEY (segment)
+        )""",
+    )),
+    Migration(10, "dedup", (
+        """CREATE TABLE IF NOT EXISTS event_fingerprints (
+            fingerprint BIGINT NOT NULL,
+            seen_at DATETIME NOT NULL,
+            PRIMARY KEY (fingerprint)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_event_fingerprints_seen_at "
+        "ON event_fingerprints (seen_at)",
+        """CREATE TABLE IF NOT EXISTS ingest_batches (
+            batch_key BIGINT NOT NULL,
+            seen_at DATETIME NOT NULL,
+            PRIMARY KEY (batch_key)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_ingest_batches_seen_at ON ingest_batches (seen_at)",
+    )),
+    # Suchindizes (FTS5) je Partition legt app/search.py selbst an
+    Migration(11, "search", run=_backfill_search),
+    Migration(12, "sketches", (
+        """CREATE TABLE IF NOT EXISTS sketches (
+            period VARCHAR(1) NOT NULL,
+            bucket DATE NOT NULL,
+            kind VARCHAR(16) NOT NULL,
+            "key" INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (period, bucket, kind, "key")
+        )""",
+    ), run=_backfill_sketches),
+    Migration(13, "sessions_started_at", (
+        # Sessions im Zeitraum (KPI in /api/stats/kpis)
+        "CREATE INDEX IF NOT EXISTS ix_sessions_started_at ON sessions (started_at)",
+    )),
+    Migration(14, "sessions_unique_key_anonymous", (
+        # Ohne User hat das Select-then-insert bei parallelen Batches doppelte
+        # Sessions angelegt. Die jüngeren verlieren nur ihren Key – Events,
+        # Archive und Flow-Stand verweisen weiter auf eine gültige Session
+        """UPDATE sessions SET session_key = NULL
+        WHERE user_id IS NULL AND session_key IS NOT NULL AND id > (
+            SELECT MIN(k.id) FROM sessions k
+            WHERE k.session_key = sessions.session_key AND k.user_id IS NULL
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_sessions_session_key_anonymous "
+        "ON sessions (session_key) WHERE user_id IS NULL",
+    )),
+]
+
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER NOT NULL PRIMARY KEY,"
+        " name VARCHAR(255) NOT NULL,"
+        " applied_at DATETIME NOT NULL)"
+    ))
+
+
+def applied_versions(engine: Engine = write_engine) -> set[int]:
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def upgrade(engine: Engine = write_engine) -> list[Migration]:
+    """Wendet alle noch fehlenden Migrationen in Reihenfolge an."""
+    done = applied_versions(engine)
+    applied = []
+
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        with engine.begin() as conn:
+            for statement in migration.statements:
+                conn.execute(text(statement))
+            if migration.run is not None:
+                migration.run(conn)
+            conn.execute(
+                text(
+                    "INSERT INTO schema_migrations (version, name, applied_at) "
+                    "VALUES (:version, :name, :applied_at)"
+                ),
+                {
+                    "version": migration.version,
+                    "name": migration.name,
+                    "applied_at": datetime.now(timezone.utc).isoformat(),
+                },
+            )
+        applied.append(migration)
+
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.migrations")
+    parser.add_argument("command", choices=["upgrade", "status"])
+    args = parser.parse_args(argv)
+
+    if args.command == "upgrade":
+        for migration in upgrade():
+            print(f"[MIGRATIONS] {migration.version:04d} {migration.name} angewendet")
+        return
+
+    done = applied_versions()
+    for migration in MIGRATIONS:
+        state = "x" if migration.version in done else " "
+        print(f"[{state}] {migration.version:04d} {migration.name}")
+
+
+if __name__ == "__main__":
+    main()
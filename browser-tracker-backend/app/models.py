@@ -1,5 +1,5 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Text
+from sqlalchemy import BigInteger, Column, Integer, String, Date, DateTime, Float, ForeignKey, JSON, LargeBinary, Text, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 
@@ -13,7 +13,7 @@ def utcnow():
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     external_id = Column(String(255), unique=True, index=True)  # BC/AD-User
     display_name = Column(String(255), nullable=True)
     department = Column(String(255), nullable=True)
@@ -23,37 +23,64 @@ class User(Base):
 
 class Session(Base):
     __tablename__ = "sessions"
+    __table_args__ = (
+        # Eine Session pro (Key, User): Ziel für INSERT ... ON CONFLICT
+        # deckt auch die Suche nur nach session_key ab
+        Index("ux_sessions_session_key_user_id", "session_key", "user_id", unique=True),
+        # dasselbe ohne User (NULL ist im Index oben nie gleich)
+        Index("ux_sessions_session_key_anonymous", "session_key", unique=True,
+              sqlite_where=text("user_id IS NULL"), postgresql_where=text("user_id IS NULL")),
+        Index("ix_sessions_started_at", "started_at"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     # ALT:
     # user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     # NEU:
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
 
-    session_key = Column(String(255), index=True)
+    session_key = Column(String(255))
     started_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
     ended_at = Column(DateTime(timezone=True), nullable=True)
     client_ip = Column(String(64), nullable=True)
-    user_agent = Column(Text, nullable=True)
+    user_agent_id = Column(Integer, ForeignKey("event_strings.id"), nullable=True)
 
     user = relationship("User", back_populates="sessions")
     events = relationship("BrowserEvent", back_populates="session")
+    user_agent_string = relationship("EventString")
+
+    @property
+    def user_agent(self) -> str | None:
+        return self.user_agent_string.value if self.user_agent_string else None
 
 
 class BrowserEvent(Base):
+    """
+    Spaltenvorlage der Event-Speicherung. Die Events selbst liegen in
+    Monatspartitionen ``browser_events_YYYYMM`` mit diesen Spalten – lange,
+    sich wiederholende Texte dort als ID in ``event_strings`` (siehe
+    app/partitions.py). ``browser_events`` ist nur noch die Alt-Tabelle von
+    vor der Partitionierung.
+    """
     __tablename__ = "browser_events"
+    __table_args__ = (
+        # Timeline eines Users: WHERE user_id = ? ORDER BY timestamp (, id)
+        Index("ix_browser_events_user_id_timestamp", "user_id", "timestamp"),
+        # Seiten mit distinct User: GROUP BY bc_page_id, COUNT(DISTINCT user_id)
+        Index("ix_browser_events_bc_page_id_user_id", "bc_page_id", "user_id"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     session_id = Column(Integer, ForeignKey("sessions.id"), index=True)
     timestamp = Column(DateTime(timezone=True), default=utcnow, index=True)
 
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
     page_url = Column(Text, nullable=False)
     page_title = Column(Text, nullable=True)
 
     # NEU: BC-spezifisch
-    bc_page_id = Column(Integer, nullable=True, index=True)
+    bc_page_id = Column(Integer, nullable=True)
     bc_company = Column(String(100), nullable=True, index=True)
 
     element_type = Column(String(64), nullable=True)   # input, button, select, ...
@@ -71,3 +98,202 @@ class BrowserEvent(Base):
 
     session = relationship("Session", back_populates="events")
     user = relationship("User")
+
+
+# ---------------------------------------------------------------------------
+# Rollups: vorverdichtete Event-Zähler, werden beim Ingest in derselben
+# Transaktion fortgeschrieben (siehe app/rollups.py). Fehlende Dimensionen
+# werden als 0 bzw. "" gespeichert, damit sie Teil des Primärschlüssels sein
+# können (NULL wäre in SQLite nie "gleich").
+# ---------------------------------------------------------------------------
+
+class EventRollupHourly(Base):
+    __tablename__ = "event_rollup_hourly"
+    __table_args__ = (
+        # Summen über Zeiträume nur aus dem Index
+        Index("ix_event_rollup_hourly_bucket_count", "bucket", "event_count"),
+    )
+
+    bucket = Column(DateTime, primary_key=True)           # volle Stunde (UTC)
+    user_id = Column(Integer, primary_key=True)           # 0 = ohne User
+    bc_page_id = Column(Integer, primary_key=True)        # 0 = ohne Page
+    bc_company = Column(String(100), primary_key=True)    # "" = ohne Company
+    action_type = Column(String(64), primary_key=True)
+
+    event_count = Column(Integer, nullable=False, default=0)
+
+
+class EventRollupDaily(Base):
+    __tablename__ = "event_rollup_daily"
+    __table_args__ = (
+        Index("ix_event_rollup_daily_day_count", "day", "event_count"),
+        # Top-Nutzer / Nutzerübersicht bzw. Top-Seiten als Covering Index
+        Index("ix_event_rollup_daily_user", "user_id", "event_count", "last_event_at"),
+        Index("ix_event_rollup_daily_page", "bc_page_id", "user_id", "event_count"),
+    )
+
+    day = Column(Date, primary_key=True)                  # UTC-Tag
+    user_id = Column(Integer, primary_key=True)
+    bc_page_id = Column(Integer, primary_key=True)
+    bc_company = Column(String(100), primary_key=True)
+    action_type = Column(String(64), primary_key=True)
+
+    event_count = Column(Integer, nullable=False, default=0)
+    first_event_at = Column(DateTime, nullable=True)
+    last_event_at = Column(DateTime, nullable=True)
+
+
+class BcPage(Base):
+    """Erste bekannte URL/Titel je BC-Page-ID (für Top-Seiten-Listen)."""
+    __tablename__ = "bc_pages"
+
+    bc_page_id = Column(Integer, primary_key=True)
+    page_url = Column(Text, nullable=True)
+    page_title = Column(Text, nullable=True)
+
+
+# ---------------------------------------------------------------------------
+# Aktive Zeit: Aktivitätsspannen je Nutzer (Events mit Abstand <= Leerlauf-
+# Schwelle) und daraus abgeleitete Sekunden je Tag x User x Page (siehe
+# app/activity.py).
+# ---------------------------------------------------------------------------
+
+class ActivitySpan(Base):
+    __tablename__ = "activity_spans"
+    __table_args__ = (
+        # offene (letzte) Spanne eines Users
+        Index("ix_activity_spans_user_start", "user_id", "start_at"),
+        # aktive Zeit der letzten 24h
+        Index("ix_activity_spans_end_at", "end_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    start_at = Column(DateTime, nullable=False)           # erstes Event (UTC)
+    end_at = Column(DateTime, nullable=False)             # letztes Event (UTC)
+    event_count = Column(Integer, nullable=False)
+    last_page_id = Column(Integer, nullable=False)        # Page des letzten Events, 0 = ohne
+
+
+class ActivityDaily(Base):
+    __tablename__ = "activity_daily"
+    __table_args__ = (
+        Index("ix_activity_daily_user", "user_id", "bc_page_id", "active_seconds"),
+    )
+
+    day = Column(Date, primary_key=True)                  # UTC-Tag
+    user_id = Column(Integer, primary_key=True)
+    bc_page_id = Column(Integer, primary_key=True)        # 0 = ohne Page
+    active_seconds = Column(Float, nullable=False, default=0)
+
+
+class FlowEdgeDaily(Base):
+    """Seitenübergänge von -> nach je Tag, Company und User (siehe app/flows.py)."""
+    __tablename__ = "flow_edges_daily"
+    __table_args__ = (
+        # Markov: Nachfolger einer Seite
+        Index("ix_flow_edges_daily_from", "from_page", "day", "to_page", "transitions"),
+        # Flow eines Users
+        Index("ix_flow_edges_daily_user", "user_id", "day"),
+    )
+
+    day = Column(Date, primary_key=True)                  # UTC-Tag des Übergangs
+    bc_company = Column(String(255), primary_key=True)    # "" = ohne Company
+    from_page = Column(Integer, primary_key=True)
+    to_page = Column(Integer, primary_key=True)
+    user_id = Column(Integer, primary_key=True)           # 0 = ohne User
+    transitions = Column(Integer, nullable=False, default=0)
+    dwell_seconds = Column(Float, nullable=False, default=0)  # Summe Verweildauer auf from_page
+
+
+class FlowPathDaily(Base):
+    """Pfade aus drei aufeinanderfolgenden Seiten je Tag und Company."""
+    __tablename__ = "flow_paths_daily"
+
+    day = Column(Date, primary_key=True)
+    bc_company = Column(String(255), primary_key=True)
+    page_a = Column(Integer, primary_key=True)
+    page_b = Column(Integer, primary_key=True)
+    page_c = Column(Integer, primary_key=True)
+    path_count = Column(Integer, nullable=False, default=0)
+
+
+class FlowSession(Base):
+    """Letzter Stand je Session, an den neue Events angehängt werden."""
+    __tablename__ = "flow_sessions"
+
+    session_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    bc_company = Column(String(255), nullable=False)
+    bc_page_id = Column(Integer, nullable=False)          # aktuelle Seite
+    entered_at = Column(DateTime, nullable=False)         # Beginn des aktuellen Besuchs
+    prev_page_id = Column(Integer, nullable=False)        # Seite davor, 0 = Kettenanfang
+    last_event_at = Column(DateTime, nullable=False)
+
+
+class EventString(Base):
+    """
+    Internierte Texte (URLs, Titel, CSS-Pfade, Labels, User-Agents): jeder
+    Wert steht genau einmal hier, Events und Sessions speichern nur die ID.
+    """
+    __tablename__ = "event_strings"
+    __table_args__ = (
+        Index("ux_event_strings_value", "value", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    value = Column(Text, nullable=False)
+
+
+class EventPartition(Base):
+    """Register der Monatspartitionen von browser_events."""
+    __tablename__ = "event_partitions"
+
+    name = Column(String(64), primary_key=True)           # browser_events_YYYYMM
+    month_start = Column(Date, nullable=False, unique=True)
+    month_end = Column(Date, nullable=False)              # exklusiv
+    created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+
+
+class IdSequence(Base):
+    """Zähler für IDs, die über mehrere Tabellen eindeutig sein müssen."""
+    __tablename__ = "id_sequences"
+
+    name = Column(String(64), primary_key=True)
+    next_value = Column(Integer, nullable=False)
+
+
+class SpoolCheckpoint(Base):
+    """Bis wohin ein Spool-Segment geladen ist (siehe app/spool.py)."""
+    __tablename__ = "spool_checkpoints"
+
+    segment = Column(String(64), primary_key=True)        # Dateiname ohne Endung
+    position = Column(Integer, nullable=False)            # Byte-Offset nach dem letzten Batch
+    updated_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+
+
+class EventFingerprint(Base):
+    """Abdruck eines gespeicherten Events zum Erkennen von Wiederholungen (app/dedup.py)."""
+    __tablename__ = "event_fingerprints"
+
+    fingerprint = Column(BigInteger, primary_key=True, autoincrement=False)
+    seen_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class IngestBatchId(Base):
+    """Schon angenommene Batch-IDs (Header X-Batch-Id), als 64-Bit-Schlüssel."""
+    __tablename__ = "ingest_batches"
+
+    batch_key = Column(BigInteger, primary_key=True, autoincrement=False)
+    seen_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class Sketch(Base):
+    """Mergebarer Zustand (Space-Saving bzw. HyperLogLog) je Zeit-Bucket (app/sketches.py)."""
+    __tablename__ = "sketches"
+
+    period = Column(String(1), primary_key=True)          # "D" = Tag, "M" = Monat
+    bucket = Column(Date, primary_key=True)               # Tag bzw. Monatsanfang (UTC)
+    kind = Column(String(16), primary_key=True)           # page, user, element, company, page_users
+    key = Column(Integer, primary_key=True, autoincrement=False)  # bc_page_id bei page_users, sonst 0
+    data = Column(LargeBinary, nullable=False)
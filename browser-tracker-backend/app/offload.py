@@ -0,0 +1,67 @@
+# app/offload.py
+"""
+Datenbankzugriffe der Request-Handler in begrenzte Worker-Threads auslagern.
+
+Die Handler sind ``async def``, die SQLAlchemy-Sessions aber synchron: eine
+Abfrage direkt im Handler hält den Event-Loop an, und ein teures
+Dashboard-Aggregat bremst damit jeden gleichzeitigen Ingest-Request aus.
+Deshalb laufen alle Abfragen der Handler über ``run_read`` bzw.
+``run_write`` in Threads, begrenzt durch je einen eigenen CapacityLimiter:
+
+- Lesen: höchstens DB_READ_THREADS gleichzeitig. Wer keinen Platz bekommt,
+  wartet im Event-Loop statt blockiert in einem Thread.
+- Schreiben: einer – es gibt ohnehin nur die eine Schreib-Verbindung.
+
+Weil die Limiter getrennt sind, belegen Dashboard-Abfragen nie den Platz,
+den ein synchroner Ingest (``?wait=true``) braucht; der Ingest-Writer
+(app/ingest.py) läuft sowieso in seinem eigenen Thread. Rechenzeit teilen
+sich aber alle Threads über den GIL: jeder weitere Lese-Thread bringt mehr
+Dashboard-Durchsatz und kostet Schreibdurchsatz (``python -m bench.load
+--dashboard 4``). Standard ist deshalb einer.
+
+AsyncSession mit aiosqlite wäre für SQLite nur eine andere Verpackung
+desselben Prinzips (ein Thread je Verbindung) und hätte alle Abfragen und
+Event-Listener auf ``await`` umgestellt; so bleiben sie unverändert.
+"""
+from typing import Callable, Iterable, TypeVar
+
+import anyio
+from anyio.to_thread import run_sync
+
+from . import config
+
+T = TypeVar("T")
+
+read_limiter = anyio.CapacityLimiter(config.DB_READ_THREADS)
+write_limiter = anyio.CapacityLimiter(1)
+
+_DONE = object()
+
+
+async def run_read(func: Callable[..., T], *args) -> T:
+    """``func(*args)`` in einem Lese-Thread; Context-Variablen wandern mit."""
+    return await run_sync(func, *args, limiter=read_limiter)
+
+
+async def run_write(func: Callable[..., T], *args) -> T:
+    return await run_sync(func, *args, limiter=write_limiter)
+
+
+async def iterate_read(iterable: Iterable[T]):
+    """
+    Synchronen Generator (z.B. den Export-Body) stückweise in Lese-Threads
+    abarbeiten; zwischen zwei Stücken ist der Platz wieder frei.
+    """
+    iterator = iter(iterable)
+    try:
+        while True:
+            item = await run_read(next, iterator, _DONE)
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        # Client weg: Generator schließen, damit er seine Session freigibt
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
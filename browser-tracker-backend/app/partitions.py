@@ -0,0 +1,325 @@
+# app/partitions.py
+"""
+Monatspartitionen für Events.
+
+Jeder Kalendermonat (UTC) liegt in einer eigenen Tabelle
+``browser_events_YYYYMM`` mit den Spalten von ``models.BrowserEvent``. Der
+Ingest schreibt über ``insert_rows`` in die passende Partition, lesende
+Abfragen holen sich mit ``for_range`` nur die Partitionen, die den
+angefragten Zeitraum überhaupt berühren. IDs kommen aus ``id_sequences`` und
+sind über alle Partitionen eindeutig.
+
+Lange, sich ständig wiederholende Texte (INTERNED_COLUMNS) stehen nicht in
+den Partitionen, sondern einmalig in ``event_strings``; die Partition hat
+stattdessen ``<spalte>_id``. ``insert_rows`` kodiert beim Schreiben (über
+den String-Cache des Resolvers), ``select_events`` löst beim Lesen wieder
+auf – Aufrufer sehen immer die Spalten von ``models.BrowserEvent``.
+
+Aufbewahrung heißt damit "Tabelle löschen" statt DELETE + VACUUM (die
+abgeleiteten Rollups, Aktivitäts-, Flow- und Sketch-Zeilen des Monats gehen
+mit):
+
+    python -m app.partitions list
+    python -m app.partitions drop --before 2025-01
+"""
+import argparse
+import threading
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import (
+    Column, Index, Integer, MetaData, Table, and_, delete, event, func, insert, or_, select, text,
+    update,
+)
+from sqlalchemy.orm import Session
+
+from . import models
+from .resolver import resolver
+
+EVENT_ID_SEQUENCE = "browser_events"
+# in der laufenden Transaktion angelegte Partitionen, erst nach Commit in _known
+PENDING_KEY = "partitions_pending"
+
+# als ID auf event_strings gespeichert
+INTERNED_COLUMNS = ("page_url", "page_title", "element_path", "element_label")
+EVENT_COLUMNS = [c.name for c in models.BrowserEvent.__table__.columns]
+
+_metadata = MetaData()
+_tables: dict[str, Table] = {}
+_known: set[str] = set()        # in dieser Prozess-Lebenszeit angelegt/geprüft (committet)
+_lock = threading.Lock()
+
+
+def month_start(value: date | datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"browser_events_{month:%Y%m}"
+
+
+def month_of(name: str) -> date:
+    """Monatsanfang zu einem Partitionsnamen ``browser_events_YYYYMM``."""
+    suffix = name.rsplit("_", 1)[1]
+    return date(int(suffix[:4]), int(suffix[4:]), 1)
+
+
+def partition_table(name: str) -> Table:
+    """Table-Objekt einer Partition (Spalten wie browser_events, Texte interniert)."""
+    with _lock:
+        table = _tables.get(name)
+        if table is None:
+            columns = [
+                Column(c.name + "_id", Integer, nullable=c.nullable)
+                if c.name in INTERNED_COLUMNS else
+                Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable)
+                for c in models.BrowserEvent.__table__.columns
+            ]
+            table = Table(name, _metadata, *columns)
+            Index(f"ix_{name}_timestamp", table.c.timestamp)
+            Index(f"ix_{name}_user_id_timestamp", table.c.user_id, table.c.timestamp)
+            Index(f"ix_{name}_bc_page_id_user_id", table.c.bc_page_id, table.c.user_id)
+            Index(f"ix_{name}_session_id", table.c.session_id)
+            Index(f"ix_{name}_bc_company", table.c.bc_company)
+            _tables[name] = table
+        return table
+
+
+def select_events(table: Table, names: list[str] | None = None):
+    """
+    SELECT der Spalten ``names`` (Standard: alle aus models.BrowserEvent) aus
+    einer Partition, internierte Texte per LEFT JOIN aufgelöst. WHERE/ORDER BY
+    gehen weiter auf ``table.c``.
+    """
+    strings = models.EventString.__table__
+    source = table
+    columns = []
+    for name in names or EVENT_COLUMNS:
+        if name in INTERNED_COLUMNS:
+            s = strings.alias(f"s_{name}")
+            source = source.outerjoin(s, s.c.id == table.c[name + "_id"])
+            columns.append(s.c.value.label(name))
+        else:
+            columns.append(table.c[name])
+    return select(*columns).select_from(source)
+
+
+def ensure_partition(db: Session, month: date) -> Table:
+    name = partition_name(month)
+    table = partition_table(name)
+    if name in _known or name in db.info.get(PENDING_KEY, ()):
+        return table
+
+    conn = db.connection()
+    table.create(conn, checkfirst=True)
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+    stmt = (
+        select(models.EventPartition.name)
+        .where(models.EventPartition.name == name)
+    )
+    if db.execute(stmt).scalar() is None:
+        db.add(models.EventPartition(
+            name=name, month_start=month, month_end=next_month(month)
+        ))
+        db.flush()
+
+    db.info.setdefault(PENDING_KEY, set()).add(name)
+    return table
+
+
+# CREATE TABLE läuft in der Transaktion mit: für alle Sessions gilt die
+# Partition erst nach dem Commit als angelegt, ein Rollback vergisst nur die
+# Partitionen dieser Session (wie beim Resolver)
+@event.listens_for(Session, "after_commit")
+def _publish_known(db: Session):
+    pending = db.info.pop(PENDING_KEY, None)
+    if pending:
+        _known.update(pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(db: Session, previous_transaction):
+    db.info.pop(PENDING_KEY, None)
+
+
+def allocate_ids(db: Session, count: int) -> range:
+    """Reserviert ``count`` fortlaufende Event-IDs (in der Schreib-Transaktion)."""
+    S = models.IdSequence
+    next_value = db.execute(
+        update(S)
+        .where(S.name == EVENT_ID_SEQUENCE)
+        .values(next_value=S.next_value + count)
+        .returning(S.next_value)
+    ).scalar_one()
+    return range(next_value - count, next_value)
+
+
+def insert_rows(db: Session, rows: list[dict]) -> list[int]:
+    """
+    Schreibt Event-Zeilen in ihre Monatspartitionen, ein INSERT je Monat.
+    ``rows`` behalten ihre Texte und bekommen die neue ``id`` eingetragen.
+    """
+    if not rows:
+        return []
+
+    ids = allocate_ids(db, len(rows))
+    string_ids = resolver.string_ids(
+        db, (row[name] for row in rows for name in INTERNED_COLUMNS)
+    )
+
+    by_month: dict[date, list[dict]] = {}
+    for event_id, row in zip(ids, rows):
+        row["id"] = event_id
+        stored = dict(row)
+        for name in INTERNED_COLUMNS:
+            stored[name + "_id"] = string_ids.get(stored.pop(name))
+        by_month.setdefault(month_start(row["timestamp"]), []).append(stored)
+
+    for month, month_rows in by_month.items():
+        table = ensure_partition(db, month)
+        db.execute(insert(table), month_rows)
+
+    return list(ids)
+
+
+def day_bounds(start: datetime | date | None, end: datetime | date | None):
+    """[start, end) als Tage; ein angebrochener End-Tag zählt noch mit."""
+    if isinstance(start, datetime):
+        start = start.date()
+    if isinstance(end, datetime):
+        end_day = end.date()
+        if end.time() != datetime.min.time():
+            end_day += timedelta(days=1)
+        end = end_day
+    return start, end
+
+
+def for_range(db: Session, start: datetime | date | None = None,
+              end: datetime | date | None = None,
+              newest_first: bool = False) -> list[Table]:
+    """
+    Partitionen, die sich mit [start, end) überschneiden – alle anderen
+    werden gar nicht erst angefasst.
+    """
+    P = models.EventPartition
+    start, end = day_bounds(start, end)
+    stmt = select(P.name)
+    if start is not None:
+        stmt = stmt.where(P.month_end > start)
+    if end is not None:
+        stmt = stmt.where(P.month_start < end)
+    stmt = stmt.order_by(P.month_start.desc() if newest_first else P.month_start)
+    return [partition_table(name) for name in db.execute(stmt).scalars()]
+
+
+def has_events(db: Session) -> bool:
+    for table in for_range(db):
+        if db.execute(select(table.c.id).limit(1)).first():
+            return True
+    return False
+
+
+def drop_partition(db: Session, name: str):
+    from .search import drop_index
+
+    db.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+    drop_index(db, name)
+    db.execute(delete(models.EventPartition).where(models.EventPartition.name == name))
+    _known.discard(name)
+    db.info.get(PENDING_KEY, set()).discard(name)
+
+
+# aus den Events abgeleitete Tabellen mit der Spalte, nach der sie zeitlich liegen
+DERIVED_BY_DAY = (
+    models.EventRollupDaily.day, models.ActivityDaily.day,
+    models.FlowEdgeDaily.day, models.FlowPathDaily.day,
+)
+DERIVED_BY_TIME = (models.EventRollupHourly.bucket, models.FlowSession.last_event_at)
+
+
+def drop_derived(db: Session, month: date) -> int:
+    """
+    Löscht Rollups, Aktivität, Seitenübergänge und Sketches eines Monats.
+    Aktivitätsspannen nur, wenn sie ganz im Monat liegen – eine Spanne über
+    die Monatsgrenze gehört zur Hälfte noch zu behaltenen Events.
+    """
+    start, end = month, next_month(month)
+    start_at, end_at = datetime.combine(start, time()), datetime.combine(end, time())
+    statements = [
+        delete(column.table).where(column >= start, column < end) for column in DERIVED_BY_DAY
+    ] + [
+        delete(column.table).where(column >= start_at, column < end_at)
+        for column in DERIVED_BY_TIME
+    ]
+    A = models.ActivitySpan
+    statements.append(delete(A).where(A.start_at >= start_at, A.end_at < end_at))
+    K = models.Sketch
+    statements.append(delete(K).where(or_(
+        and_(K.period == "D", K.bucket >= start, K.bucket < end),
+        and_(K.period == "M", K.bucket == start),
+    )))
+    return sum(db.execute(stmt).rowcount for stmt in statements)
+
+
+def drop_before(db: Session, before: date) -> list[tuple[str, int]]:
+    """
+    Löscht alle Partitionen, die komplett vor ``before`` liegen, und in
+    derselben Transaktion die daraus abgeleiteten Zeilen (``drop_derived``).
+    Liefert (Partition, Anzahl gelöschter abgeleiteter Zeilen).
+
+    Ist ein Monat zusätzlich archiviert (Partition nur für Nachzügler neu
+    angelegt), bleiben seine abgeleiteten Zeilen – das Archiv hat die Events
+    noch.
+    """
+    from .archive import months as archived_months
+
+    P = models.EventPartition
+    names = list(db.execute(
+        select(P.name).where(P.month_end <= before).order_by(P.month_start)
+    ).scalars())
+    archived = {m.name for m in archived_months(end=before)}
+    dropped = []
+    for name in names:
+        drop_partition(db, name)
+        derived = 0 if name in archived else drop_derived(db, month_of(name))
+        dropped.append((name, derived))
+    return dropped
+
+
+def main(argv=None):
+    from .database import SessionLocal
+    from .migrations import upgrade
+
+    parser = argparse.ArgumentParser(prog="python -m app.partitions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Partitionen mit Zeilenanzahl anzeigen")
+    p_drop = sub.add_parser("drop", help="alte Partitionen löschen (Aufbewahrung)")
+    p_drop.add_argument("--before", required=True,
+                        type=lambda v: date.fromisoformat(v + "-01"),
+                        help="alle Monate vor diesem Monat (YYYY-MM) löschen")
+    args = parser.parse_args(argv)
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        if args.command == "list":
+            for table in for_range(db):
+                count = db.execute(select(func.count()).select_from(table)).scalar()
+                print(f"{table.name}\t{count}")
+        else:
+            dropped = drop_before(db, args.before)
+            db.commit()
+            for name, derived in dropped:
+                print(f"[PARTITIONS] {name} gelöscht, {derived} abgeleitete Zeilen "
+                      f"(Rollups, Aktivität, Flows, Sketches)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
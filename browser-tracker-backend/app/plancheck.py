@@ -0,0 +1,146 @@
+# app/plancheck.py
+"""
+Prüft per ``EXPLAIN QUERY PLAN``, dass keine Abfrage der Dashboard- und
+Nutzer-Ansichten auf einen Full Table Scan zurückfällt. Gedacht als Check
+nach Schema- oder Query-Änderungen (Exit-Code 1 bei einem Fund):
+
+    python -m app.plancheck
+"""
+import re
+import sys
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import ReadSessionLocal, read_engine
+
+# Tabellen, deren vollständiges Lesen gewollt ist: die Nutzerübersicht listet
+# nun einmal alle Nutzer (kleine Dimensionstabelle).
+ALLOWED_FULL_SCANS = {"users"}
+
+_SCAN = re.compile(r"^SCAN (?P<table>\w+)(?: AS \w+)?(?P<rest>.*)$")
+
+
+@dataclass
+class Finding:
+    view: str
+    table: str
+    detail: str
+    statement: str
+
+
+@contextmanager
+def captured_statements(engine: Engine):
+    """Sammelt alle SQL-Statements (mit Parametern), die ``engine`` ausführt."""
+    statements: list[tuple[str, tuple]] = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _before)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+
+
+def query_plan(db: Session, statement: str, parameters) -> list[str]:
+    """Die Zeilen von ``EXPLAIN QUERY PLAN`` (nur die Detail-Spalte)."""
+    plan = db.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + statement, parameters
+    ).fetchall()
+    return [row[-1] for row in plan]
+
+
+def full_table_scans(db: Session, statement: str, parameters,
+                     plan: list[str] | None = None) -> list[tuple[str, str]]:
+    # inkl. der Event-Partitionen, die nicht in den Models stehen
+    tables = set(db.connection().exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table'"
+    ).scalars())
+    if plan is None:
+        plan = query_plan(db, statement, parameters)
+
+    scans = []
+    for detail in plan:
+        match = _SCAN.match(detail)
+        if not match or match["table"] not in tables:
+            continue  # SEARCH, Subquery, CONSTANT ROW, ...
+        if "INDEX" in match["rest"] or "PRIMARY KEY" in match["rest"]:
+            continue  # Index-Scan statt Tabellen-Scan
+        if match["table"] in ALLOWED_FULL_SCANS:
+            continue
+        scans.append((match["table"], detail))
+    return scans
+
+
+def dashboard_views(db: Session) -> dict:
+    """Die geprüften Ansichten als view-name -> callable."""
+    # Import hier, weil die Router wiederum app.queries importieren
+    from .routers import stats
+    from .routers.dashboard_users import user_detail_context
+    from . import queries
+
+    user_id = db.execute(select(models.User.id).limit(1)).scalar() or 1
+    end = date.today()
+    start = end - timedelta(days=29)
+    D = models.EventRollupDaily
+    company = db.execute(
+        select(D.bc_company).where(D.bc_company != "").limit(1)
+    ).scalar() or ""
+    return {
+        "stats_kpis": lambda: stats.kpis(db, start, end),
+        "stats_top_users": lambda: stats.top_users(db, start, end),
+        "stats_top_pages": lambda: stats.top_pages(db, start, end),
+        "stats_top_pages_company": lambda: stats.top_pages(db, start, end, company),
+        "stats_per_day": lambda: stats.per_day(db, start, end),
+        "stats_per_hour": lambda: stats.per_hour(db, end),
+        "stats_per_user": lambda: stats.per_user(db, start, end),
+        "users_overview": lambda: queries.users_overview(db),
+        "users_user_detail": lambda: user_detail_context(db, user_id),
+        "flow_edges": lambda: queries.flow_top_edges(db, start, end),
+        "flow_paths": lambda: queries.flow_top_paths(db, start, end),
+        "flow_next": lambda: queries.flow_next_pages(db, 21, start, end),
+        "flow_user": lambda: queries.flow_top_edges(db, start, end, user_id=user_id),
+    }
+
+
+def check(db: Session, engine: Engine = read_engine) -> list[Finding]:
+    findings = []
+    for view, run in dashboard_views(db).items():
+        with captured_statements(engine) as statements:
+            try:
+                run()
+            except HTTPException:
+                continue  # z.B. leere Datenbank ohne User
+
+        for statement, parameters in statements:
+            for table, detail in full_table_scans(db, statement, parameters):
+                findings.append(Finding(view, table, detail, statement))
+    return findings
+
+
+def main() -> int:
+    db = ReadSessionLocal()
+    try:
+        findings = check(db)
+    finally:
+        db.close()
+
+    for f in findings:
+        print(f"[PLAN] {f.view}: Full Table Scan auf {f.table} ({f.detail})")
+        print("       " + " ".join(f.statement.split()))
+    if not findings:
+        print("[PLAN] OK – keine Full Table Scans in den Dashboard-Abfragen")
+    return 1 if findings else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
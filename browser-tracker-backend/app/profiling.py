@@ -0,0 +1,403 @@
+# app/profiling.py
+"""
+Profiling einzelner Requests auf Anforderung, z.B. wenn das Dashboard
+plötzlich langsam ist und unklar ist, welche der vielen Abfragen schuld ist.
+
+Nur aktiv, wenn ``PROFILE_TOKEN`` gesetzt ist (sonst wird weder die
+Middleware noch ein Engine-Hook eingehängt). Ein Request wird profiliert,
+wenn er das Token im Header mitbringt (im Browser z.B. per Header-Extension):
+
+    curl -H "X-Profile: $PROFILE_TOKEN" http://127.0.0.1:8000/users/3
+
+Als Query-Parameter wird das Token bewusst nicht angenommen – es landete
+sonst in Browser-Verlauf, Access-Logs und Referer-Headern.
+
+Aufgezeichnet werden alle SQL-Statements mit Dauer, Herkunft und
+``EXPLAIN QUERY PLAN`` (Full Table Scans markiert) sowie CPU-Stichproben des
+Handlers inkl. Template-Rendering. Der View-Cache wird für diesen Request
+umgangen, sonst liefen die Abfragen gar nicht. Nur HTML-Antworten werden
+gepuffert und bekommen den Bericht als Panel unten angehängt; alle anderen
+gehen unverändert und ungepuffert durch (Export-Streams!) und bekommen nur
+den Header ``X-Profile-Report``. Server-Sent Events werden nie profiliert.
+Die letzten PROFILE_KEEP Berichte liegen zum Download unter
+GET /_profile/{id} (JSON, ``?format=collapsed`` für Flamegraph-Tools). Der
+Link im Panel trägt statt des Tokens einen eigenen Schlüssel, der nur für
+diesen einen Bericht und nur PROFILE_LINK_TTL_S Sekunden gilt.
+
+Die Stichproben gelten dem Thread des Event-Loops und allen Threads, die für
+den Request SQL ausführen – parallel laufende Requests auf demselben Loop
+können also mit auftauchen.
+"""
+import asyncio
+import os
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import event
+from starlette.responses import JSONResponse
+
+from . import config, plancheck
+from .cache import BYPASS
+from .metrics import query_origin, statement_op
+
+HEADER = b"x-profile"
+LINK_PARAM = "key"
+PREFIX = "/_profile"
+
+MAX_STACK_DEPTH = 64
+TOP_FUNCTIONS = 30
+# Frames, an denen sich SQL-Zeit bzw. Template-Rendering erkennen lässt
+_SQL_FRAME = "sqlalchemy.engine.default.do_execute"
+_TEMPLATE_SUFFIX = ".html"
+_OWN_FRAMES = ("app.profiling.", "app.metrics.")
+
+_current: ContextVar["Profile | None"] = ContextVar("profile", default=None)
+
+reports: OrderedDict[str, dict] = OrderedDict()
+# Bericht-ID -> (Link-Schlüssel, gültig bis time.monotonic())
+_links: dict[str, tuple[str, float]] = {}
+_reports_lock = threading.Lock()
+
+templates = Jinja2Templates(directory="app/templates")
+
+
+@dataclass
+class Statement:
+    origin: str
+    op: str
+    statement: str
+    parameters: object
+    ms: float
+
+
+@dataclass
+class Profile:
+    method: str
+    path: str
+    started_at: datetime
+    statements: list[Statement] = field(default_factory=list)
+    threads: set[int] = field(default_factory=set)
+    enabled: bool = True
+
+
+def authorized(token: str | None) -> bool:
+    if not config.PROFILE_TOKEN or not token:
+        return False
+    return secrets.compare_digest(token.encode(), config.PROFILE_TOKEN.encode())
+
+
+def link_authorized(report_id: str, key: str | None) -> bool:
+    """Schlüssel aus dem Panel-Link: nur für diesen Bericht und nur bis zum Ablauf."""
+    link = _links.get(report_id)
+    if link is None or not key or time.monotonic() > link[1]:
+        return False
+    return secrets.compare_digest(key.encode(), link[0].encode())
+
+
+# ------------------------------------------------------------
+# CPU-Stichproben
+# ------------------------------------------------------------
+
+def _label(frame) -> str:
+    code = frame.f_code
+    if code.co_filename.endswith(_TEMPLATE_SUFFIX):
+        return os.path.basename(code.co_filename)   # kompiliertes Jinja-Template
+    return f"{frame.f_globals.get('__name__', '?')}.{code.co_name}"
+
+
+def _stack(frame) -> tuple[str, ...]:
+    """Stack als Tupel von der Wurzel zum aktuellen Frame."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_label(frame))
+        frame = frame.f_back
+    return tuple(reversed(labels))
+
+
+class Sampler(threading.Thread):
+    """Nimmt alle ``interval`` Sekunden den Stack der beobachteten Threads auf."""
+
+    def __init__(self, threads: set[int], interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.threads = threads
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in tuple(self.threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[_stack(frame)] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+# ------------------------------------------------------------
+# SQL
+# ------------------------------------------------------------
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None and profile.enabled:
+        profile.threads.add(threading.get_ident())
+        context._profile_started = time.perf_counter()
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    started = getattr(context, "_profile_started", None)
+    if profile is not None and profile.enabled and started is not None:
+        profile.statements.append(Statement(
+            origin=query_origin(),
+            op=statement_op(statement),
+            statement=statement,
+            parameters=None if executemany else parameters,
+            ms=(time.perf_counter() - started) * 1000,
+        ))
+
+
+def _plans(statements: list[Statement]) -> dict:
+    """(Statement, Parameter) -> (Plan, Full Table Scans) für alle SELECTs."""
+    from .database import ReadSessionLocal
+
+    plans = {}
+    db = ReadSessionLocal()
+    try:
+        if db.get_bind().dialect.name != "sqlite":
+            return plans
+        for s in statements:
+            key = (s.statement, repr(s.parameters))
+            if s.op != "SELECT" or s.parameters is None or key in plans:
+                continue
+            try:
+                plan = plancheck.query_plan(db, s.statement, s.parameters)
+                scans = plancheck.full_table_scans(db, s.statement, s.parameters, plan)
+            except Exception as exc:
+                plan, scans = [f"EXPLAIN fehlgeschlagen: {exc}"], []
+            plans[key] = (plan, [detail for _, detail in scans])
+    finally:
+        db.close()
+    return plans
+
+
+# ------------------------------------------------------------
+# Bericht
+# ------------------------------------------------------------
+
+def _cpu_summary(stacks: Counter, interval_ms: float) -> dict:
+    total = sum(stacks.values())
+    inclusive, own = Counter(), Counter()
+    sql = template = 0
+    for stack, count in stacks.items():
+        labels = set(stack)
+        for label in labels:
+            inclusive[label] += count
+        own[stack[-1]] += count
+        sql += count if _SQL_FRAME in labels else 0
+        template += count if any(l.endswith(_TEMPLATE_SUFFIX) for l in labels) else 0
+
+    # nur eigener Code und Templates, Framework-Frames stünden sonst bei 100 %
+    functions = [
+        {"function": label, "total": n, "self": own[label],
+         "percent": round(100 * n / total, 1)}
+        for label, n in inclusive.most_common()
+        if (label.startswith("app.") and not label.startswith(_OWN_FRAMES))
+        or label.endswith(_TEMPLATE_SUFFIX)
+    ][:TOP_FUNCTIONS]
+    return {
+        "interval_ms": interval_ms,
+        "samples": total,
+        "sql_samples": sql,
+        "template_samples": template,
+        "functions": functions,
+        "collapsed": [f"{';'.join(stack)} {count}" for stack, count in stacks.most_common()],
+    }
+
+
+def build_report(profile: Profile, report_id: str, status: int, duration_ms: float,
+                 stacks: Counter) -> dict:
+    plans = _plans(profile.statements)
+    statements, by_origin = [], {}
+    for s in profile.statements:
+        plan, scans = plans.get((s.statement, repr(s.parameters)), ([], []))
+        statements.append({
+            "origin": s.origin,
+            "op": s.op,
+            "ms": round(s.ms, 3),
+            "statement": " ".join(s.statement.split()),
+            "parameters": None if s.parameters is None else [repr(p) for p in s.parameters],
+            "plan": plan,
+            "full_scans": scans,
+        })
+        entry = by_origin.setdefault(s.origin, {"origin": s.origin, "count": 0, "ms": 0.0})
+        entry["count"] += 1
+        entry["ms"] += s.ms
+
+    return {
+        "id": report_id,
+        "method": profile.method,
+        "path": profile.path,
+        "status": status,
+        "started_at": profile.started_at.isoformat(timespec="milliseconds"),
+        "duration_ms": round(duration_ms, 3),
+        "sql": {
+            "count": len(statements),
+            "ms": round(sum(s.ms for s in profile.statements), 3),
+            "by_origin": sorted(
+                ({**e, "ms": round(e["ms"], 3)} for e in by_origin.values()),
+                key=lambda e: e["ms"], reverse=True,
+            ),
+            "statements": statements,
+        },
+        "cpu": _cpu_summary(stacks, config.PROFILE_SAMPLE_INTERVAL_MS),
+    }
+
+
+def _keep(report: dict):
+    with _reports_lock:
+        reports[report["id"]] = report
+        while len(reports) > config.PROFILE_KEEP:
+            report_id, _ = reports.popitem(last=False)
+            _links.pop(report_id, None)
+
+
+def _link(report_id: str) -> str:
+    """Download-Link mit kurzlebigem Schlüssel nur für diesen Bericht."""
+    key = secrets.token_urlsafe(16)
+    with _reports_lock:
+        if report_id in reports:
+            _links[report_id] = (key, time.monotonic() + config.PROFILE_LINK_TTL_S)
+    return f"{PREFIX}/{report_id}?{LINK_PARAM}={key}"
+
+
+def render_panel(report: dict, link: str) -> str:
+    return templates.get_template("profile_panel.html").render(report=report, link=link)
+
+
+# ------------------------------------------------------------
+# Middleware
+# ------------------------------------------------------------
+
+# Header, die bei einer profilierten Antwort nicht mehr stimmen bzw. stören
+_DROP_RESPONSE_HEADERS = {b"content-length", b"etag", b"last-modified", b"cache-control"}
+_DROP_REQUEST_HEADERS = {b"if-none-match", b"if-modified-since"}
+
+
+class ProfileMiddleware:
+    """
+    Reine ASGI-Middleware. Ohne Token im Request kostet sie einen Blick in
+    die Header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        token = headers.get(HEADER)
+        # EventSource meldet sich so an; ein Stream ohne Ende hätte nie einen Bericht
+        if token is None or b"text/event-stream" in headers.get(b"accept", b""):
+            await self.app(scope, receive, send)
+            return
+        if not authorized(token.decode("latin-1")):
+            await JSONResponse({"detail": "Profiling nicht erlaubt"}, status_code=403)(
+                scope, receive, send)
+            return
+
+        await self._profile(scope, receive, send)
+
+    async def _profile(self, scope, receive, send):
+        # ohne Validatoren, sonst käme nur ein 304 ohne eine einzige Abfrage zurück
+        scope = dict(scope, headers=[
+            (k, v) for k, v in scope["headers"] if k not in _DROP_REQUEST_HEADERS
+        ])
+        profile = Profile(scope["method"], scope["path"], datetime.now(timezone.utc),
+                          threads={threading.get_ident()})
+        sampler = Sampler(profile.threads, config.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        report_id = uuid.uuid4().hex[:12]
+        start = None
+        html = None     # gepufferter Body, nur bei text/html
+
+        async def capture(message):
+            nonlocal start, html
+            if message["type"] == "http.response.start":
+                start = message
+                content_type = dict(message["headers"]).get(b"content-type", b"")
+                if content_type.startswith(b"text/html"):
+                    html = []
+                    return
+                if content_type.startswith(b"text/event-stream"):
+                    # doch ein Stream: Aufzeichnung abbrechen, nur durchreichen
+                    profile.enabled = False
+                    sampler.stop()
+                    await send(message)
+                    return
+                await send({**message, "headers": [
+                    *message["headers"], (b"x-profile-report", f"{PREFIX}/{report_id}".encode()),
+                ]})
+            elif html is not None and message["type"] == "http.response.body":
+                html.append(message.get("body", b""))
+            else:
+                await send(message)
+
+        profile_token = _current.set(profile)
+        bypass_token = BYPASS.set(True)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            sampler.stop()
+            BYPASS.reset(bypass_token)
+            _current.reset(profile_token)
+        duration_ms = (time.perf_counter() - started) * 1000
+        if not profile.enabled:
+            return
+
+        report = await asyncio.to_thread(
+            build_report, profile, report_id, start["status"], duration_ms, sampler.stacks
+        )
+        _keep(report)
+        if html is None:
+            return
+
+        body = b"".join(html)
+        end = body.rfind(b"</body>")
+        if end >= 0:
+            body = body[:end] + render_panel(report, _link(report_id)).encode() + body[end:]
+
+        headers = [(k, v) for k, v in start["headers"] if k not in _DROP_RESPONSE_HEADERS]
+        headers += [
+            (b"content-length", str(len(body)).encode()),
+            (b"cache-control", b"no-store"),
+            (b"x-profile-report", f"{PREFIX}/{report_id}".encode()),
+        ]
+        await send({**start, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def install(app):
+    """Middleware und Engine-Hooks einhängen – nur wenn PROFILE_TOKEN gesetzt ist."""
+    from .database import read_engine, write_engine
+
+    app.add_middleware(ProfileMiddleware)
+    for engine in {id(write_engine): write_engine, id(read_engine): read_engine}.values():
+        event.listen(engine, "before_cursor_execute", _before)
+        event.listen(engine, "after_cursor_execute", _after)
@@ -0,0 +1,489 @@
+# app/queries.py
+"""
+Lesende Abfragen für Dashboard und Nutzer-Ansichten. Alles, was über viele
+Events aggregiert, liest aus den Rollup-Tabellen (app/rollups.py), damit die
+Ladezeit nicht mit der Menge der Rohdaten wächst. Wo doch Rohdaten gebraucht
+werden, wird nur über die betroffenen Monatspartitionen (app/partitions.py)
+bzw. archivierten Monate (app/archive.py) gelesen. Top-Nutzer und -Seiten
+kommen aus den Sketches (app/sketches.py), solange SKETCHES_ENABLED gesetzt ist.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import desc, func, null, select, tuple_
+from sqlalchemy.orm import Session
+
+from . import archive, config, models, partitions, sketches
+from .rollups import NO_COMPANY, NO_PAGE, NO_USER
+
+H = models.EventRollupHourly
+D = models.EventRollupDaily
+
+
+def _rollup_filter(query, model, start: date | None = None, end: date | None = None,
+                   company: str | None = None):
+    """Tage [start, end] (beide inklusive) und Company auf einem Tages-Rollup."""
+    if start is not None:
+        query = query.filter(model.day >= start)
+    if end is not None:
+        query = query.filter(model.day <= end)
+    if company is not None:
+        query = query.filter(model.bc_company == company)
+    return query
+
+
+def _next_day(end: date | None) -> date | None:
+    return end + timedelta(days=1) if end is not None else None
+
+
+def total_events(db: Session, start: date | None = None, end: date | None = None,
+                 company: str | None = None) -> int:
+    query = _rollup_filter(db.query(func.sum(D.event_count)), D, start, end, company)
+    return query.scalar() or 0
+
+
+def total_users(db: Session) -> int:
+    return db.query(func.count(models.User.id)).scalar() or 0
+
+
+def total_sessions(db: Session) -> int:
+    return db.query(func.count(models.Session.id)).scalar() or 0
+
+
+def active_users(db: Session, start: date | None = None, end: date | None = None,
+                 company: str | None = None) -> int:
+    """Verschiedene Nutzer mit Events in [start, end] (aus dem Tages-Rollup)."""
+    query = db.query(func.count(func.distinct(D.user_id))).filter(D.user_id != NO_USER)
+    return _rollup_filter(query, D, start, end, company).scalar() or 0
+
+
+def sessions_started(db: Session, start: date | None = None, end: date | None = None) -> int:
+    S = models.Session
+    query = db.query(func.count(S.id))
+    if start is not None:
+        query = query.filter(S.started_at >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        query = query.filter(S.started_at < datetime.combine(_next_day(end), datetime.min.time()))
+    return query.scalar() or 0
+
+
+def events_since(db: Session, since: datetime, company: str | None = None) -> int:
+    """
+    Exakte Anzahl Events ab ``since``: volle Stunden aus dem Stunden-Rollup,
+    nur die angebrochene erste Stunde aus den Rohdaten (Index auf timestamp).
+    """
+    next_hour = since.replace(minute=0, second=0, microsecond=0)
+    if next_hour < since:
+        next_hour += timedelta(hours=1)
+
+    full_hours = db.query(func.sum(H.event_count)).filter(H.bucket >= next_hour)
+    if company is not None:
+        full_hours = full_hours.filter(H.bc_company == company)
+    partial = 0
+    for E in partitions.for_range(db, since, next_hour):
+        where = [E.c.timestamp >= since, E.c.timestamp < next_hour]
+        if company is not None:
+            where.append(E.c.bc_company == company)
+        partial += db.execute(select(func.count(E.c.id)).where(*where)).scalar() or 0
+    for month in archive.months(since, next_hour):
+        with month.open() as reader:
+            if company is None:
+                partial += reader.count_between(since, next_hour)
+            else:
+                mask = reader.time_mask(since, next_hour) & reader.matches("bc_company", company)
+                partial += int(mask.sum())
+    return (full_hours.scalar() or 0) + partial
+
+
+def active_time_total(db: Session) -> float:
+    """Aktive Zeit aller Nutzer in Sekunden (siehe app/activity.py)."""
+    return db.query(func.sum(models.ActivityDaily.active_seconds)).scalar() or 0.0
+
+
+def active_time_between(db: Session, start: date | None = None,
+                        end: date | None = None) -> float:
+    """Aktive Zeit der Tage [start, end] in Sekunden."""
+    A = models.ActivityDaily
+    query = _rollup_filter(db.query(func.sum(A.active_seconds)), A, start, end)
+    return query.scalar() or 0.0
+
+
+def active_time_since(db: Session, since: datetime) -> float:
+    """Aktive Zeit ab ``since``: Spannen, die danach enden, anteilig."""
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    spans = db.execute(
+        select(models.ActivitySpan.start_at, models.ActivitySpan.end_at)
+        .where(models.ActivitySpan.end_at > since)
+    ).all()
+    return sum((end - max(start, since)).total_seconds() for start, end in spans)
+
+
+TopUser = namedtuple("TopUser", "display_name external_id event_count")
+TopPage = namedtuple("TopPage", "page_id page_url event_count user_count")
+
+
+def top_users(db: Session, limit: int = 5, start: date | None = None,
+              end: date | None = None, company: str | None = None):
+    # Sketches gibt es nur über alle Companies
+    if config.SKETCHES_ENABLED and company is None:
+        items = sketches.top(db, "user", start, _next_day(end), limit)
+        users = {
+            row.id: row for row in db.execute(
+                select(models.User.id, models.User.display_name, models.User.external_id)
+                .where(models.User.id.in_([item.key for item in items]))
+            )
+        }
+        return [
+            TopUser(users[item.key].display_name, users[item.key].external_id, item.count)
+            for item in items if item.key in users
+        ]
+
+    per_user = (
+        _rollup_filter(
+            db.query(D.user_id, func.sum(D.event_count).label("event_count"))
+            .filter(D.user_id != NO_USER), D, start, end, company,
+        )
+        .group_by(D.user_id)
+        .subquery()
+    )
+    return (
+        db.query(
+            models.User.display_name,
+            models.User.external_id,
+            per_user.c.event_count,
+        )
+        .join(per_user, per_user.c.user_id == models.User.id)
+        .order_by(desc(per_user.c.event_count))
+        .limit(limit)
+        .all()
+    )
+
+
+def top_pages(db: Session, limit: int = 10, start: date | None = None,
+              end: date | None = None, company: str | None = None):
+    if config.SKETCHES_ENABLED and company is None:
+        items = sketches.top(db, "page", start, _next_day(end), limit)
+        page_ids = [item.key for item in items]
+        user_counts = sketches.distinct_users(db, page_ids, start, _next_day(end))
+        urls = dict(db.execute(
+            select(models.BcPage.bc_page_id, models.BcPage.page_url)
+            .where(models.BcPage.bc_page_id.in_(page_ids))
+        ).all())
+        return [
+            TopPage(item.key, urls.get(item.key), item.count, user_counts[item.key])
+            for item in items
+        ]
+
+    per_page = (
+        _rollup_filter(
+            db.query(
+                D.bc_page_id.label("page_id"),
+                func.sum(D.event_count).label("event_count"),
+                # NULLIF: Events ohne User zählen nicht als eigener Nutzer
+                func.count(func.distinct(func.nullif(D.user_id, NO_USER))).label("user_count"),
+            )
+            .filter(D.bc_page_id != NO_PAGE), D, start, end, company,
+        )
+        .group_by(D.bc_page_id)
+        .order_by(desc("event_count"))
+        .limit(limit)
+        .subquery()
+    )
+    return (
+        db.query(
+            per_page.c.page_id,
+            models.BcPage.page_url,
+            per_page.c.event_count,
+            per_page.c.user_count,
+        )
+        .outerjoin(models.BcPage, models.BcPage.bc_page_id == per_page.c.page_id)
+        .order_by(desc(per_page.c.event_count))
+        .all()
+    )
+
+
+def events_by_day(db: Session, since: date, end: date | None = None,
+                  company: str | None = None):
+    return (
+        _rollup_filter(
+            db.query(D.day.label("day"), func.sum(D.event_count).label("count")),
+            D, since, end, company,
+        )
+        .group_by(D.day)
+        .order_by(D.day)
+        .all()
+    )
+
+
+def events_by_hour(db: Session, start: datetime, end: datetime, company: str | None = None):
+    hour = func.strftime("%H", H.bucket)
+    query = db.query(hour.label("hour"), func.sum(H.event_count).label("count"))
+    query = query.filter(H.bucket >= start, H.bucket < end)
+    if company is not None:
+        query = query.filter(H.bc_company == company)
+    return query.group_by(hour).order_by(hour).all()
+
+
+def users_overview(db: Session):
+    per_user = (
+        db.query(
+            D.user_id,
+            func.sum(D.event_count).label("event_count"),
+            func.max(D.last_event_at).label("last_activity"),
+        )
+        .group_by(D.user_id)
+        .subquery()
+    )
+    event_count = func.coalesce(per_user.c.event_count, 0)
+    return (
+        db.query(
+            models.User.id,
+            models.User.external_id,
+            models.User.display_name,
+            event_count.label("event_count"),
+            per_user.c.last_activity,
+        )
+        .outerjoin(per_user, per_user.c.user_id == models.User.id)
+        .order_by(desc(event_count))
+        .all()
+    )
+
+
+def user_breakdown(db: Session, start: date | None = None, end: date | None = None,
+                   company: str | None = None, limit: int = 100):
+    """
+    Je Nutzer Events, letzte Aktivität und aktive Zeit in [start, end], die
+    aktivsten zuerst. Die aktive Zeit gibt es nicht je Company (dann None).
+    """
+    per_user = (
+        _rollup_filter(
+            db.query(
+                D.user_id,
+                func.sum(D.event_count).label("event_count"),
+                func.max(D.last_event_at).label("last_activity"),
+            )
+            .filter(D.user_id != NO_USER), D, start, end, company,
+        )
+        .group_by(D.user_id)
+        .subquery()
+    )
+    A = models.ActivityDaily
+    active = (
+        _rollup_filter(
+            db.query(A.user_id, func.sum(A.active_seconds).label("active_seconds")),
+            A, start, end,
+        )
+        .group_by(A.user_id)
+        .subquery()
+    )
+    if company is None:
+        active_seconds = func.coalesce(active.c.active_seconds, 0.0)
+    else:
+        active_seconds = null()
+    return (
+        db.query(
+            models.User.id,
+            models.User.external_id,
+            models.User.display_name,
+            per_user.c.event_count,
+            per_user.c.last_activity,
+            active_seconds.label("active_seconds"),
+        )
+        .join(per_user, per_user.c.user_id == models.User.id)
+        .outerjoin(active, active.c.user_id == models.User.id)
+        .order_by(desc(per_user.c.event_count))
+        .limit(limit)
+        .all()
+    )
+
+
+def user_stats(db: Session, user_id: int):
+    return (
+        db.query(
+            func.coalesce(func.sum(D.event_count), 0).label("event_count"),
+            func.min(D.first_event_at).label("first_activity"),
+            func.max(D.last_event_at).label("last_activity"),
+            func.count(func.distinct(func.nullif(D.bc_company, NO_COMPANY))).label(
+                "company_count"
+            ),
+            func.count(func.distinct(func.nullif(D.bc_page_id, NO_PAGE))).label(
+                "page_count"
+            ),
+        )
+        .filter(D.user_id == user_id)
+        .one()
+    )
+
+
+def user_active_time(db: Session, user_id: int) -> float:
+    A = models.ActivityDaily
+    return (
+        db.query(func.sum(A.active_seconds)).filter(A.user_id == user_id).scalar() or 0.0
+    )
+
+
+def user_active_pages(db: Session, user_id: int, limit: int = 10):
+    A = models.ActivityDaily
+    return (
+        db.query(
+            func.nullif(A.bc_page_id, NO_PAGE).label("bc_page_id"),
+            func.sum(A.active_seconds).label("active_seconds"),
+        )
+        .filter(A.user_id == user_id)
+        .group_by(A.bc_page_id)
+        .order_by(desc("active_seconds"))
+        .limit(limit)
+        .all()
+    )
+
+
+def user_top_pages(db: Session, user_id: int, limit: int = 20):
+    return (
+        db.query(
+            func.nullif(D.bc_company, NO_COMPANY).label("bc_company"),
+            func.nullif(D.bc_page_id, NO_PAGE).label("bc_page_id"),
+            func.sum(D.event_count).label("cnt"),
+        )
+        .filter(D.user_id == user_id)
+        .group_by(D.bc_company, D.bc_page_id)
+        .order_by(desc("cnt"))
+        .limit(limit)
+        .all()
+    )
+
+
+def user_action_stats(db: Session, user_id: int):
+    return (
+        db.query(D.action_type, func.sum(D.event_count).label("cnt"))
+        .filter(D.user_id == user_id)
+        .group_by(D.action_type)
+        .order_by(desc("cnt"))
+        .all()
+    )
+
+
+def user_timeline(db: Session, user_id: int, columns: list[str], limit: int = 10,
+                  before: tuple[datetime, int] | None = None) -> list[dict]:
+    """
+    Events eines Nutzers, neueste zuerst, als dicts mit ``id``, ``timestamp``
+    und den Spalten ``columns``. Keyset-Paging: ``before`` = (timestamp, id)
+    des letzten Events der vorigen Seite – jede Seite ist ein Range-Read auf
+    dem (user_id, timestamp)-Index, egal wie weit hinten sie liegt.
+    """
+    columns = ["id", "timestamp"] + [c for c in columns if c not in ("id", "timestamp")]
+    # Partitionen nach dem Cursor brauchen wir gar nicht erst anzufassen
+    end = before[0] + timedelta(microseconds=1) if before else None
+
+    # Monat für Monat, neueste zuerst. Ein archivierter Monat kann zusätzlich
+    # eine Partition haben (Nachzügler nach dem Kompaktieren) – dann werden
+    # beide Quellen nach (timestamp, id) zusammengeführt.
+    sources: dict[date, list] = {}
+    for E in partitions.for_range(db, end=end):
+        sources.setdefault(partitions.month_of(E.name), []).append(E)
+    for month in archive.months(end=end):
+        sources.setdefault(month.month_start, []).append(month)
+
+    events: list[dict] = []
+    for month in sorted(sources, reverse=True):
+        found: list[dict] = []
+        wanted = limit - len(events)
+        for source in sources[month]:
+            if isinstance(source, archive.ArchivedMonth):
+                found += _archived_timeline(source, user_id, columns, wanted, before)
+            else:
+                found += _partition_timeline(db, source, user_id, columns, wanted, before)
+        if len(sources[month]) > 1:
+            found.sort(key=lambda e: (e["timestamp"] or datetime.min, e["id"]), reverse=True)
+        events += found[:wanted]
+        if len(events) >= limit:
+            break
+    return events
+
+
+def _partition_timeline(db: Session, E, user_id: int, columns: list[str], limit: int,
+                        before: tuple[datetime, int] | None) -> list[dict]:
+    stmt = partitions.select_events(E, columns).where(E.c.user_id == user_id)
+    if before is not None:
+        stmt = stmt.where(tuple_(E.c.timestamp, E.c.id) < tuple_(*before))
+    rows = db.execute(stmt.order_by(E.c.timestamp.desc(), E.c.id.desc()).limit(limit))
+    return [dict(row._mapping) for row in rows]
+
+
+def _archived_timeline(month: archive.ArchivedMonth, user_id: int, columns: list[str],
+                       limit: int, before: tuple[datetime, int] | None) -> list[dict]:
+    # Auswahl über user_id, timestamp und id, dekodiert werden nur die Treffer
+    with month.open() as reader:
+        mask = reader.column("user_id") == user_id
+        if before is not None:
+            mask &= reader.before(*before)
+        return reader.records(columns, mask, limit=limit, newest_first=True)
+
+
+# ------------------------------------------------------------
+# Seitenübergänge (app/flows.py)
+# ------------------------------------------------------------
+
+FE = models.FlowEdgeDaily
+FP = models.FlowPathDaily
+
+
+def _flow_where(model, start: date, end: date, company: str | None):
+    """Tage ``start``..``end`` (beide inklusive), optional eine Company."""
+    where = [model.day >= start, model.day <= end]
+    if company is not None:
+        where.append(model.bc_company == company)
+    return where
+
+
+def flow_top_edges(db: Session, start: date, end: date, company: str | None = None,
+                   limit: int = 20, user_id: int | None = None):
+    where = _flow_where(FE, start, end, company)
+    if user_id is not None:
+        where.append(FE.user_id == user_id)
+    return (
+        db.query(
+            FE.from_page,
+            FE.to_page,
+            func.sum(FE.transitions).label("transitions"),
+            (func.sum(FE.dwell_seconds) / func.sum(FE.transitions)).label("avg_dwell_seconds"),
+        )
+        .filter(*where)
+        .group_by(FE.from_page, FE.to_page)
+        .order_by(desc("transitions"))
+        .limit(limit)
+        .all()
+    )
+
+
+def flow_top_paths(db: Session, start: date, end: date, company: str | None = None,
+                   limit: int = 20):
+    return (
+        db.query(FP.page_a, FP.page_b, FP.page_c, func.sum(FP.path_count).label("count"))
+        .filter(*_flow_where(FP, start, end, company))
+        .group_by(FP.page_a, FP.page_b, FP.page_c)
+        .order_by(desc("count"))
+        .limit(limit)
+        .all()
+    )
+
+
+def flow_next_pages(db: Session, page_id: int, start: date, end: date,
+                    company: str | None = None, limit: int = 10) -> tuple[int, list[dict]]:
+    """
+    Markov-Schätzung P(nächste Seite | ``page_id``) aus den Übergangszählern.
+    Liefert (Übergänge ab ``page_id`` gesamt, die ``limit`` wahrscheinlichsten).
+    """
+    rows = (
+        db.query(FE.to_page, func.sum(FE.transitions).label("transitions"))
+        .filter(FE.from_page == page_id, *_flow_where(FE, start, end, company))
+        .group_by(FE.to_page)
+        .order_by(desc("transitions"))
+        .all()
+    )
+    total = sum(r.transitions for r in rows)
+    return total, [
+        {"to_page": r.to_page, "transitions": r.transitions,
+         "probability": r.transitions / total}
+        for r in rows[:limit]
+    ]
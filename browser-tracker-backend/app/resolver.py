@@ -0,0 +1,174 @@
+# app/resolver.py
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+
+from . import config, models
+from .cache import TTLCache
+from .database import upsert_insert
+
+# Während einer Transaktion neu aufgelöste IDs; erst nach dem Commit
+# wandern sie in den Cache (nach einem Rollback gäbe es sie nicht mehr).
+PENDING_KEY = "resolver_pending"
+
+
+class IdentityResolver:
+    """
+    Löst ``external_id`` -> User-ID, ``(session_key, user_id)`` -> Session-ID
+    und Texte -> ``event_strings``-ID auf. Treffer kommen aus einem LRU+TTL-
+    Cache ohne Datenbankzugriff, Fehlschläge werden per
+    ``INSERT ... ON CONFLICT`` race-frei angelegt.
+    """
+
+    def __init__(self, maxsize: int = config.RESOLVER_CACHE_SIZE,
+                 ttl: float = config.RESOLVER_CACHE_TTL,
+                 strings_maxsize: int = config.STRING_CACHE_SIZE):
+        self.users = TTLCache(maxsize, ttl)
+        self.sessions = TTLCache(maxsize, ttl)
+        self.strings = TTLCache(strings_maxsize, ttl)
+
+    def clear(self):
+        self.users.clear()
+        self.sessions.clear()
+        self.strings.clear()
+
+    def _cached(self, db: Session, cache: TTLCache, key):
+        pending = db.info.get(PENDING_KEY)
+        if pending and (cache, key) in pending:
+            return pending[(cache, key)]
+        return cache.get(key)
+
+    def _remember(self, db: Session, cache: TTLCache, key, value):
+        db.info.setdefault(PENDING_KEY, {})[(cache, key)] = value
+
+    def user_id(self, db: Session, external_id: str | None) -> int | None:
+        if not external_id:
+            return None
+
+        user_id = self._cached(db, self.users, external_id)
+        if user_id is not None:
+            return user_id
+
+        stmt = upsert_insert(db, models.User)
+        if stmt is not None:
+            # DO UPDATE (statt DO NOTHING), damit RETURNING auch bei einem
+            # bereits vorhandenen User die ID liefert
+            stmt = (
+                stmt.values(external_id=external_id)
+                .on_conflict_do_update(
+                    index_elements=[models.User.external_id],
+                    set_={"external_id": external_id},
+                )
+                .returning(models.User.id)
+            )
+            user_id = db.execute(stmt).scalar_one()
+        else:
+            user_id = db.execute(
+                select(models.User.id).where(models.User.external_id == external_id)
+            ).scalar()
+            if user_id is None:
+                user_id = db.execute(
+                    insert(models.User)
+                    .values(external_id=external_id)
+                    .returning(models.User.id)
+                ).scalar_one()
+
+        self._remember(db, self.users, external_id, user_id)
+        return user_id
+
+    def string_ids(self, db: Session, values) -> dict[str, int]:
+        """IDs in ``event_strings`` für alle ``values`` (None wird übersprungen)."""
+        ids: dict[str, int] = {}
+        missing = []
+        for value in set(values):
+            if value is None:
+                continue
+            string_id = self._cached(db, self.strings, value)
+            if string_id is None:
+                missing.append(value)
+            else:
+                ids[value] = string_id
+        if not missing:
+            return ids
+
+        S = models.EventString
+        stmt = upsert_insert(db, S)
+        if stmt is not None:
+            # ein executemany mit RETURNING für alle neuen Werte
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[S.value], set_={"value": stmt.excluded.value}
+            ).returning(S.id, S.value)
+            found = db.execute(stmt, [{"value": v} for v in missing]).all()
+        else:
+            found = db.execute(select(S.id, S.value).where(S.value.in_(missing))).all()
+            known = {value for _, value in found}
+            new = [{"value": v} for v in missing if v not in known]
+            if new:
+                found += db.execute(insert(S).returning(S.id, S.value), new).all()
+
+        for string_id, value in found:
+            ids[value] = string_id
+            self._remember(db, self.strings, value, string_id)
+        return ids
+
+    def session_id(self, db: Session, session_key: str | None, user_id: int | None,
+                   client_ip: str | None, user_agent: str | None) -> int:
+        key = (session_key, user_id)
+        if session_key:
+            session_id = self._cached(db, self.sessions, key)
+            if session_id is not None:
+                return session_id
+
+        S = models.Session
+        values = {
+            "user_id": user_id,
+            "session_key": session_key,
+            "client_ip": client_ip,
+            "user_agent_id": self.string_ids(db, [user_agent]).get(user_agent),
+            "started_at": models.utcnow(),
+        }
+
+        if not session_key:
+            # Fallback: eine generische Session pro Batch ohne Key
+            return db.execute(insert(S).values(**values).returning(S.id)).scalar_one()
+
+        stmt = upsert_insert(db, S)
+        if stmt is not None:
+            if user_id is not None:
+                target = {"index_elements": [S.session_key, S.user_id]}
+            else:
+                # NULL-User sind im Unique-Index nie gleich: eigener Teilindex
+                target = {"index_elements": [S.session_key], "index_where": S.user_id.is_(None)}
+            stmt = (
+                stmt.values(**values)
+                .on_conflict_do_update(**target, set_={"session_key": session_key})
+                .returning(S.id)
+            )
+            session_id = db.execute(stmt).scalar_one()
+        else:
+            session_id = db.execute(
+                select(S.id).where(
+                    S.session_key == session_key,
+                    S.user_id == user_id,  # None -> IS NULL
+                )
+            ).scalar()
+            if session_id is None:
+                session_id = db.execute(insert(S).values(**values).returning(S.id)).scalar_one()
+
+        self._remember(db, self.sessions, key, session_id)
+        return session_id
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(db: Session):
+    pending = db.info.pop(PENDING_KEY, None)
+    if pending:
+        for (cache, key), value in pending.items():
+            cache.set(key, value)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(db: Session, previous_transaction):
+    db.info.pop(PENDING_KEY, None)
+
+
+resolver = IdentityResolver()
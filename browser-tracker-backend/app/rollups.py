@@ -0,0 +1,256 @@
+# app/rollups.py
+"""
+Pflege der Rollup-Tabellen (Events pro Stunde/Tag x User x Page x Company x
+Aktion). Beim Ingest werden die Zähler in derselben Transaktion wie die
+Events fortgeschrieben; ``rebuild`` füllt sie aus den Rohdaten neu.
+
+Backfill per Kommandozeile (aus ``browser-tracker-backend``):
+
+    python -m app.rollups rebuild [--since 2025-01-01]
+"""
+import argparse
+from datetime import date, datetime
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from . import archive, models, partitions
+from .database import SessionLocal, upsert_insert
+
+# Platzhalter für fehlende Dimensionen (siehe models.EventRollupHourly)
+NO_USER = 0
+NO_PAGE = 0
+NO_COMPANY = ""
+
+HOUR_FORMAT = "%Y-%m-%d %H:00:00.000000"   # wie SQLAlchemy DateTime in SQLite
+
+
+def _dims(row: dict) -> tuple:
+    return (
+        row["user_id"] or NO_USER,
+        row["bc_page_id"] or NO_PAGE,
+        row["bc_company"] or NO_COMPANY,
+        row["action_type"],
+    )
+
+
+def _least_greatest(db: Session):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.min, func.max       # skalare min()/max() mit 2 Argumenten
+    return func.least, func.greatest
+
+
+def upsert_hourly(db: Session, rows: list[dict]):
+    """Addiert Stunden-Zähler auf (bucket + Dimensionen -> event_count)."""
+    if not rows:
+        return
+    H = models.EventRollupHourly
+    stmt = upsert_insert(db, H)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[H.bucket, H.user_id, H.bc_page_id, H.bc_company, H.action_type],
+        set_={"event_count": H.event_count + stmt.excluded.event_count},
+    )
+    db.execute(stmt, rows)
+
+
+def upsert_daily(db: Session, rows: list[dict]):
+    """Addiert Tages-Zähler auf und erweitert first/last_event_at."""
+    if not rows:
+        return
+    D = models.EventRollupDaily
+    least, greatest = _least_greatest(db)
+    stmt = upsert_insert(db, D)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[D.day, D.user_id, D.bc_page_id, D.bc_company, D.action_type],
+        set_={
+            "event_count": D.event_count + stmt.excluded.event_count,
+            "first_event_at": least(D.first_event_at, stmt.excluded.first_event_at),
+            "last_event_at": greatest(D.last_event_at, stmt.excluded.last_event_at),
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def apply_rows(db: Session, rows: list[dict]):
+    """Schreibt die Zähler für frisch eingefügte Event-Zeilen fort."""
+    if not rows:
+        return
+
+    hourly: dict[tuple, int] = {}
+    daily: dict[tuple, list] = {}
+    pages: dict[int, tuple] = {}
+
+    for row in rows:
+        ts: datetime = row["timestamp"]
+        dims = _dims(row)
+
+        hour_key = (ts.replace(minute=0, second=0, microsecond=0),) + dims
+        hourly[hour_key] = hourly.get(hour_key, 0) + 1
+
+        day_key = (ts.date(),) + dims
+        agg = daily.get(day_key)
+        if agg is None:
+            daily[day_key] = [1, ts, ts]
+        else:
+            agg[0] += 1
+            agg[1] = min(agg[1], ts)
+            agg[2] = max(agg[2], ts)
+
+        if row["bc_page_id"] and row["bc_page_id"] not in pages:
+            pages[row["bc_page_id"]] = (row["page_url"], row["page_title"])
+
+    upsert_hourly(db, [
+        {
+            "bucket": key[0], "user_id": key[1], "bc_page_id": key[2],
+            "bc_company": key[3], "action_type": key[4], "event_count": count,
+        }
+        for key, count in hourly.items()
+    ])
+    upsert_daily(db, [
+        {
+            "day": key[0], "user_id": key[1], "bc_page_id": key[2],
+            "bc_company": key[3], "action_type": key[4], "event_count": agg[0],
+            "first_event_at": agg[1], "last_event_at": agg[2],
+        }
+        for key, agg in daily.items()
+    ])
+
+    if pages:
+        stmt = upsert_insert(db, models.BcPage).on_conflict_do_nothing()
+        db.execute(stmt, [
+            {"bc_page_id": page_id, "page_url": url, "page_title": title}
+            for page_id, (url, title) in pages.items()
+        ])
+
+
+def rebuild(db: Session, since: date | None = None):
+    """
+    Baut die Rollups aus den Event-Partitionen und dem Spaltenarchiv neu auf
+    (komplett oder ab ``since``). Committet nicht.
+    """
+    H = models.EventRollupHourly
+    D = models.EventRollupDaily
+
+    del_hourly = delete(H)
+    del_daily = delete(D)
+    since_dt = None
+    if since is not None:
+        since_dt = datetime.combine(since, datetime.min.time())
+        del_hourly = del_hourly.where(H.bucket >= since_dt)
+        del_daily = del_daily.where(D.day >= since)
+
+    db.execute(del_hourly)
+    db.execute(del_daily)
+
+    # Stunden und Tage liegen nie über einer Monatsgrenze, jede Partition
+    # liefert also eigene Schlüssel
+    for table in partitions.for_range(db, start=since):
+        _rebuild_partition(db, table, since_dt)
+
+    # archivierte Monate addieren (ein Monat kann nach Nachzüglern in beiden
+    # liegen – daher Upsert statt INSERT)
+    for month in archive.months(start=since):
+        with month.open() as reader:
+            _rebuild_archived(db, reader, since_dt)
+
+
+def _rebuild_partition(db: Session, E, since_dt: datetime | None):
+    H = models.EventRollupHourly
+    D = models.EventRollupDaily
+
+    dims = [
+        func.coalesce(E.c.user_id, NO_USER),
+        func.coalesce(E.c.bc_page_id, NO_PAGE),
+        func.coalesce(E.c.bc_company, NO_COMPANY),
+        E.c.action_type,
+    ]
+    dim_cols = ["user_id", "bc_page_id", "bc_company", "action_type"]
+    where = [E.c.timestamp.isnot(None)]
+    if since_dt is not None:
+        where.append(E.c.timestamp >= since_dt)
+
+    hour = func.strftime(HOUR_FORMAT, E.c.timestamp)
+    db.execute(
+        H.__table__.insert().from_select(
+            ["bucket", *dim_cols, "event_count"],
+            select(hour, *dims, func.count()).where(*where).group_by(hour, *dims),
+        )
+    )
+
+    day = func.date(E.c.timestamp)
+    db.execute(
+        D.__table__.insert().from_select(
+            ["day", *dim_cols, "event_count", "first_event_at", "last_event_at"],
+            select(
+                day, *dims, func.count(), func.min(E.c.timestamp), func.max(E.c.timestamp)
+            ).where(*where).group_by(day, *dims),
+        )
+    )
+
+    pages = (
+        partitions.select_events(E, ["bc_page_id", "page_url", "page_title"])
+        .where(E.c.bc_page_id.isnot(None), *where)
+        .subquery()
+    )
+    db.execute(
+        upsert_insert(db, models.BcPage).from_select(
+            ["bc_page_id", "page_url", "page_title"],
+            select(pages.c.bc_page_id, func.min(pages.c.page_url), func.min(pages.c.page_title))
+            .where(pages.c.bc_page_id.isnot(None))
+            .group_by(pages.c.bc_page_id),
+        ).on_conflict_do_nothing()
+    )
+
+
+def _rebuild_archived(db: Session, reader: "archive.MonthReader", since_dt: datetime | None):
+    dim_cols = ["user_id", "bc_page_id", "bc_company", "action_type"]
+
+    def dims(row):
+        return {
+            "user_id": row[1] or NO_USER, "bc_page_id": row[2] or NO_PAGE,
+            "bc_company": row[3] or NO_COMPANY, "action_type": row[4],
+        }
+
+    upsert_hourly(db, [
+        {"bucket": row[0], **dims(row), "event_count": row[5]}
+        for row in reader.group_count(dim_cols, "h", since=since_dt)
+    ])
+    upsert_daily(db, [
+        {
+            "day": row[0], **dims(row), "event_count": row[5],
+            "first_event_at": row[6], "last_event_at": row[7],
+        }
+        for row in reader.group_count(dim_cols, "D", since=since_dt)
+    ])
+
+
+def ensure_backfilled(db: Session):
+    """Einmaliger Backfill, falls es Events, aber noch keine Rollups gibt."""
+    has_rollups = db.execute(select(models.EventRollupDaily.day).limit(1)).first()
+    if not has_rollups and partitions.has_events(db):
+        rebuild(db)
+        db.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rebuild = sub.add_parser("rebuild", help="Rollups aus den Event-Partitionen neu aufbauen")
+    p_rebuild.add_argument("--since", type=date.fromisoformat, default=None,
+                           help="nur ab diesem Tag (YYYY-MM-DD) neu aufbauen")
+    args = parser.parse_args(argv)
+
+    from .migrations import upgrade
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        rebuild(db, since=args.since)
+        db.commit()
+    finally:
+        db.close()
+    print(f"[ROLLUPS] Neu aufgebaut{' ab ' + str(args.since) if args.since else ''}")
+
+
+if __name__ == "__main__":
+    main()
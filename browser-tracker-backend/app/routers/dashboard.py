@@ -1,13 +1,10 @@
 # app/routers/dashboard.py
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from datetime import datetime, timedelta, timezone
+from datetime import date
 
-from ..deps import get_db
-from .. import models
+from .. import live
 
 router = APIRouter(tags=["dashboard"])
 
@@ -15,93 +12,32 @@ templates = Jinja2Templates(directory="app/templates")
 
 
 @router.get("/", response_class=HTMLResponse)
-async def dashboard(request: Request, db: Session = Depends(get_db)):
-    now = datetime.now(timezone.utc)
-    since_24h = now - timedelta(hours=24)
-    since_365d = now - timedelta(days=365)
-
-    total_events = db.query(func.count(models.BrowserEvent.id)).scalar() or 0
-    total_users = db.query(func.count(models.User.id)).scalar() or 0
-    total_sessions = db.query(func.count(models.Session.id)).scalar() or 0
-
-    events_last_24h = (
-        db.query(func.count(models.BrowserEvent.id))
-        .filter(models.BrowserEvent.timestamp >= since_24h)
-        .scalar()
-        or 0
-    )
-
-    # Top 5 Nutzer
-    top_users = (
-        db.query(
-            models.User.display_name,
-            models.User.external_id,
-            func.count(models.BrowserEvent.id).label("event_count"),
-        )
-        .join(models.Session, models.User.id == models.Session.user_id)
-        .join(models.BrowserEvent, models.Session.id == models.BrowserEvent.session_id)
-        .group_by(models.User.id)
-        .order_by(desc("event_count"))
-        .limit(5)
-        .all()
-    )
-
-    # Top 5 Seiten (nach Page-ID) mit Event-Anzahl und Anzahl unterschiedlicher Nutzer
-    top_pages = (
-        db.query(
-            models.BrowserEvent.bc_page_id.label("page_id"),
-            func.min(models.BrowserEvent.page_url).label("page_url"),
-            func.count(models.BrowserEvent.id).label("event_count"),
-            func.count(func.distinct(models.BrowserEvent.user_id)).label("user_count"),
-        )
-        .filter(models.BrowserEvent.bc_page_id.isnot(None))
-        .group_by(models.BrowserEvent.bc_page_id)
-        .order_by(desc("event_count"))
-        .limit(10)
-        .all()
-    )
-
-    # Events pro Tag (letzte 365 Tage)
-    events_by_day = (
-        db.query(
-            func.date(models.BrowserEvent.timestamp).label("day"),
-            func.count(models.BrowserEvent.id).label("count"),
-        )
-        .filter(models.BrowserEvent.timestamp >= since_365d)
-        .group_by("day")
-        .order_by("day")
-        .all()
-    )
-
-    # Events pro Stunde (heute, 0–23 Uhr)
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    tomorrow_start = today_start + timedelta(days=1)
-
-    events_by_hour_today = (
-        db.query(
-            func.strftime("%H", models.BrowserEvent.timestamp).label("hour"),
-            func.count(models.BrowserEvent.id).label("count"),
-        )
-        .filter(
-            models.BrowserEvent.timestamp >= today_start,
-            models.BrowserEvent.timestamp < tomorrow_start,
-        )
-        .group_by("hour")
-        .order_by("hour")
-        .all()
-    )
-
-    return templates.TemplateResponse(
-        "dashboard.html",
-        {
-            "request": request,
-            "total_events": total_events,
-            "total_users": total_users,
-            "total_sessions": total_sessions,
-            "events_last_24h": events_last_24h,
-            "top_users": top_users,
-            "top_pages": top_pages,
-            "events_by_day": events_by_day,
-            "events_by_hour_today": events_by_hour_today,
-        },
+async def dashboard(request: Request, start: date | None = None, end: date | None = None,
+                    company: str | None = None):
+    """
+    Nur die Hülle: die Panels lädt das Dashboard selbst und parallel über
+    /api/stats/* (app/routers/stats.py, app/static/js/dashboard.js), mit
+    denselben Filtern ``start``/``end``/``company`` wie hier in der URL.
+    """
+    return templates.TemplateResponse("dashboard.html", {
+        "request": request,
+        "start": start,
+        "end": end,
+        "company": company or "",
+    })
+
+
+@router.get("/api/live/dashboard")
+async def dashboard_live(request: Request, since: int | None = None):
+    """
+    Server-Sent Events mit den Deltas seit ``since`` (bzw. ``Last-Event-ID``
+    nach einem Reconnect), siehe app/live.py.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    return StreamingResponse(
+        live.stream(since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -1,17 +1,53 @@
 # app/routers/dashboard_users.py
 
-from fastapi import APIRouter, Depends, Request, HTTPException
+import base64
+import json
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Request, Response, HTTPException
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
 
+from ..activity import format_duration
+from ..archive import COLUMNS
+from ..cache import view_cache
 from ..deps import get_db
-from .. import models
+from .. import models, offload, queries, schemas
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 templates = Jinja2Templates(directory="app/templates")
 
+# Spalten, die die Timeline im Detail-Template braucht
+TIMELINE_FIELDS = [
+    "bc_company", "bc_page_id", "action_type",
+    "element_role", "element_label", "element_name", "new_value",
+]
+TIMELINE_PAGE_SIZE = 10
+TIMELINE_MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(event: dict) -> str:
+    raw = json.dumps([event["timestamp"].isoformat(), event["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, event_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(event_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Ungültiger Cursor")
+
+
+def timeline_page(db: Session, user_id: int, fields: list[str], limit: int,
+                  before: tuple[datetime, int] | None = None) -> dict:
+    # ein Event mehr lesen, um zu wissen, ob es eine nächste Seite gibt
+    events = queries.user_timeline(db, user_id, fields, limit=limit + 1, before=before)
+    next_cursor = encode_cursor(events[limit - 1]) if len(events) > limit else None
+    return {"events": events[:limit], "next_cursor": next_cursor}
+
 
 @router.get("/", name="users_overview")
 async def users_overview(request: Request, db: Session = Depends(get_db)):
@@ -19,27 +55,59 @@ async def users_overview(request: Request, db: Session = Depends(get_db)):
     Übersicht aller bekannten Nutzer mit Event-Anzahl und letzter Aktivität.
     """
 
-    user_stats = (
-        db.query(
-            models.User.id,
-            models.User.external_id,
-            models.User.display_name,
-            func.count(models.BrowserEvent.id).label("event_count"),
-            func.max(models.BrowserEvent.timestamp).label("last_activity"),
-        )
-        .outerjoin(models.BrowserEvent, models.BrowserEvent.user_id == models.User.id)
-        .group_by(models.User.id)
-        .order_by(desc("event_count"))
-        .all()
+    validator = view_cache.validator("users_overview")
+    if validator.matches(request):
+        return validator.not_modified()
+
+    user_stats = await offload.run_read(
+        view_cache.get_or_compute, validator, lambda: queries.users_overview(db)
     )
 
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "users_overview.html",
         {
             "request": request,
             "users": user_stats,
         },
     )
+    response.headers.update(validator.headers)
+    return response
+
+
+def user_detail_context(db: Session, user_id: int) -> dict:
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Basisstats für KPIs (aus dem Tages-Rollup)
+    stats = queries.user_stats(db, user_id)
+
+    # erste Seite der Timeline, weitere lädt das Template nach
+    timeline = timeline_page(db, user_id, TIMELINE_FIELDS, TIMELINE_PAGE_SIZE)
+
+    # Top Business Central Seiten (Company + Page-ID) nach Event-Anzahl
+    top_pages = queries.user_top_pages(db, user_id, limit=20)
+
+    # Verteilung nach Aktionstyp (click/change/keydown etc.)
+    action_stats = queries.user_action_stats(db, user_id)
+
+    # Aktive Zeit gesamt und je Seite (aus den Aktivitätsspannen)
+    active_time = format_duration(queries.user_active_time(db, user_id))
+    active_pages = [
+        {"bc_page_id": p.bc_page_id, "active_time": format_duration(p.active_seconds)}
+        for p in queries.user_active_pages(db, user_id, limit=10)
+    ]
+
+    return {
+        "user": user,
+        "stats": stats,
+        "top_pages": top_pages,
+        "action_stats": action_stats,
+        "active_time": active_time,
+        "active_pages": active_pages,
+        "events": timeline["events"],
+        "next_cursor": timeline["next_cursor"],
+    }
 
 
 @router.get("/{user_id}", name="users_user_detail")
@@ -54,75 +122,56 @@ async def users_user_detail(
     - Letzte Events (Timeline)
     """
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Basisstats für KPIs
-    stats = (
-        db.query(
-            func.count(models.BrowserEvent.id).label("event_count"),
-            func.min(models.BrowserEvent.timestamp).label("first_activity"),
-            func.max(models.BrowserEvent.timestamp).label("last_activity"),
-            func.count(func.distinct(models.BrowserEvent.bc_company)).label(
-                "company_count"
-            ),
-            func.count(func.distinct(models.BrowserEvent.bc_page_id)).label(
-                "page_count"
-            ),
-        )
-        .filter(models.BrowserEvent.user_id == user_id)
-        .one()
-    )
+    # Generation pro User: neue Events anderer Nutzer lassen den Cache stehen
+    validator = view_cache.validator("users_user_detail", (user_id,), user_id=user_id)
+    if validator.matches(request):
+        return validator.not_modified()
 
-    # letzte 200 Events des Nutzers
-    events = (
-        db.query(models.BrowserEvent)
-        .filter(models.BrowserEvent.user_id == user_id)
-        .order_by(models.BrowserEvent.timestamp.desc())
-        .limit(200)
-        .all()
+    context = await offload.run_read(
+        view_cache.get_or_compute, validator, lambda: user_detail_context(db, user_id)
     )
 
-    # Top Business Central Seiten (Company + Page-ID) nach Event-Anzahl
-    top_pages = (
-        db.query(
-            models.BrowserEvent.bc_company,
-            models.BrowserEvent.bc_page_id,
-            models.BrowserEvent.page_title,
-            func.count(models.BrowserEvent.id).label("cnt"),
-        )
-        .filter(models.BrowserEvent.user_id == user_id)
-        .group_by(
-            models.BrowserEvent.bc_company,
-            models.BrowserEvent.bc_page_id,
-            models.BrowserEvent.page_title,
-        )
-        .order_by(desc("cnt"))
-        .limit(20)
-        .all()
+    response = templates.TemplateResponse(
+        "users_detail.html", {"request": request, **context}
     )
-
-    # Verteilung nach Aktionstyp (click/change/keydown etc.)
-    action_stats = (
-        db.query(
-            models.BrowserEvent.action_type,
-            func.count(models.BrowserEvent.id).label("cnt"),
-        )
-        .filter(models.BrowserEvent.user_id == user_id)
-        .group_by(models.BrowserEvent.action_type)
-        .order_by(desc("cnt"))
-        .all()
+    response.headers.update(validator.headers)
+    return response
+
+
+@router.get(
+    "/{user_id}/timeline", name="users_user_timeline", response_model=schemas.TimelinePage
+)
+async def users_user_timeline(
+    user_id: int,
+    request: Request,
+    response: Response,
+    cursor: str | None = None,
+    limit: int = TIMELINE_PAGE_SIZE,
+    fields: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Timeline eines Nutzers, seitenweise per Cursor (neueste zuerst).
+    ``fields`` = kommagetrennte Spalten (Standard: die der Detailseite);
+    ``id`` und ``timestamp`` sind immer dabei. ``next_cursor`` in die nächste
+    Anfrage übernehmen.
+    """
+    selected = fields.split(",") if fields else TIMELINE_FIELDS
+    unknown = [f for f in selected if f not in COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unbekannte Felder: {', '.join(unknown)}")
+    limit = max(1, min(limit, TIMELINE_MAX_PAGE_SIZE))
+    before = decode_cursor(cursor) if cursor else None
+
+    validator = view_cache.validator(
+        "users_user_timeline", (user_id, cursor, limit, tuple(selected)), user_id=user_id
     )
+    if validator.matches(request):
+        return validator.not_modified()
 
-    return templates.TemplateResponse(
-        "users_detail.html",
-        {
-            "request": request,
-            "user": user,
-            "stats": stats,
-            "top_pages": top_pages,
-            "action_stats": action_stats,
-            "events": events,
-        },
+    page = await offload.run_read(
+        view_cache.get_or_compute, validator,
+        lambda: timeline_page(db, user_id, selected, limit, before),
     )
+    response.headers.update(validator.headers)
+    return page
@@ -1,120 +1,259 @@
 # app/routers/events.py
-from fastapi import APIRouter, Depends, Request
+import logging
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime, timezone
+from typing import List, Literal, Union
 
-from ..deps import get_db
-from .. import models, schemas
+from ..dedup import deduplicator
+from ..deps import get_db, get_write_db
+from ..export import MEDIA_TYPES, EventFilter, stream
+from ..ingest import IngestBatch, ingest_queue, store_batch
+from ..logs import LogSampler
+from ..spool import spool
+from .. import config, metrics, models, offload, schemas, search, wire
 
 router = APIRouter(prefix="/api/events", tags=["events"])
 
+logger = logging.getLogger(__name__)
+_batch_log = LogSampler()
 
-def get_or_create_user(db: Session, external_id: str | None):
-    if not external_id:
-        return None
 
-    user = (
-        db.query(models.User)
-        .filter(models.User.external_id == external_id)
-        .first()
-    )
+@router.post(
+    "/batch",
+    response_model=Union[
+        schemas.IngestAccepted, schemas.BatchAck, List[schemas.BrowserEvent]
+    ],
+)
+async def create_events_batch(
+    request: Request,
+    response: Response,
+    events: List[schemas.BrowserEventCreate],
+    wait: bool = False,
+    echo: bool = False,
+    db: Session = Depends(get_write_db),
+):
+    """
+    Nimmt einen Batch an. Standardmäßig landet er in der Ingest-Queue und
+    der Client bekommt sofort ``202 Accepted``; geschrieben wird gesammelt
+    vom Writer-Task.
 
-    if not user:
-        user = models.User(external_id=external_id)
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+    Mit ``?wait=true`` wird synchron per Bulk-Insert gespeichert und eine
+    Quittung (Anzahl, erste/letzte ID, Session) zurückgegeben, mit
+    ``?echo=true`` zusätzlich alle gespeicherten Events.
 
-    return user
+    Ein optionaler Header ``X-Batch-Id`` macht Wiederholungen idempotent:
+    ein schon angenommener Batch wird nicht noch einmal gespeichert, ebenso
+    einzelne schon bekannte Events (siehe app/dedup.py).
+    """
 
+    return await accept_batch(request, response, events, wait, echo, db, "v1")
 
-def get_or_create_session(db: Session, user, session_key: str | None,
-                          client_ip: str | None, user_agent: str | None):
-    if not session_key:
-        # Fallback: eine generische Session pro User ohne Key
-        session = models.Session(
-            user_id=user.id if user else None,
-            client_ip=client_ip,
-            user_agent=user_agent,
-        )
-        db.add(session)
-        db.commit()
-        db.refresh(session)
-        return session
-
-    session = (
-        db.query(models.Session)
-        .filter(
-            models.Session.session_key == session_key,
-            models.Session.user_id == (user.id if user else None),
-        )
-        .order_by(models.Session.started_at.desc())
-        .first()
+
+@router.post(
+    "/v2/batch",
+    response_model=Union[
+        schemas.IngestAccepted, schemas.BatchAck, List[schemas.BrowserEvent]
+    ],
+)
+async def create_events_batch_v2(
+    request: Request,
+    response: Response,
+    wait: bool = False,
+    echo: bool = False,
+    db: Session = Depends(get_write_db),
+):
+    """
+    Wie ``/batch``, aber im Spaltenformat v2 (siehe app/wire.py): gemeinsame
+    Felder einmal je Batch, sonst ein Array je Feld; optional gzip- oder
+    zstd-komprimiert (``Content-Encoding``).
+    """
+    try:
+        data = wire.decompress(await request.body(), request.headers.get("content-encoding"))
+        events = wire.decode_batch(data)
+    except wire.WireError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+    return await accept_batch(request, response, events, wait, echo, db, "v2")
+
+
+async def accept_batch(
+    request: Request,
+    response: Response,
+    events: List[schemas.BrowserEventCreate],
+    wait: bool,
+    echo: bool,
+    db: Session,
+    fmt: str,
+):
+    """Gemeinsamer Teil von v1 und v2: in die Queue legen oder direkt schreiben."""
+    metrics.INGEST_BATCH_SIZE.observe(len(events), fmt)
+    metrics.INGEST_RECEIVED.inc(len(events), fmt)
+    # unter Last nicht jeden Batch loggen (siehe app/logs.py)
+    if logger.isEnabledFor(logging.INFO):
+        suppressed = _batch_log.allow()
+        if suppressed is not None:
+            logger.info("batch_received", extra={"fields": {
+                "events": len(events), "format": fmt, "suppressed": suppressed,
+            }})
+
+    batch_id = request.headers.get("x-batch-id") or None
+    if batch_id is not None and len(batch_id) > 64:
+        raise HTTPException(status_code=422, detail="X-Batch-Id länger als 64 Zeichen")
+
+    batch = IngestBatch(
+        events=events,
+        client_ip=request.client.host if request.client else None,
+        user_agent=request.headers.get("user-agent", ""),
+        batch_id=batch_id,
     )
-    if not session:
-        session = models.Session(
-            user_id=user.id if user else None,
-            session_key=session_key,
-            client_ip=client_ip,
-            user_agent=user_agent,
+
+    if not (wait or echo) and spool.running:
+        try:
+            await spool.append(batch)
+        except OSError:
+            logger.exception("Spool nicht beschreibbar")
+            raise HTTPException(
+                status_code=503,
+                detail="Ingest-Spool nicht beschreibbar",
+                headers={"Retry-After": "1"},
+            )
+        response.status_code = 202
+        return schemas.IngestAccepted(accepted=len(events), queue_depth=spool.backlog())
+
+    if not (wait or echo) and ingest_queue.running:
+        if not await ingest_queue.enqueue(batch):
+            raise HTTPException(
+                status_code=503,
+                detail="Ingest-Queue voll",
+                headers={"Retry-After": "1"},
+            )
+        response.status_code = 202
+        return schemas.IngestAccepted(
+            accepted=len(events), queue_depth=ingest_queue.depth
         )
-        db.add(session)
+
+    def write():
+        result = store_batch(db, batch)
         db.commit()
-        db.refresh(session)
-    return session
+        return result
 
+    ack, ids = await offload.run_write(write)
+    metrics.INGEST_STORED.inc(ack.count)
+    metrics.INGEST_DUPLICATES.inc(ack.duplicates)
 
-@router.post("/batch", response_model=list[schemas.BrowserEvent])
-async def create_events_batch(
-    request: Request,
-    events: List[schemas.BrowserEventCreate],
+    if echo:
+        # Echo ohne db.refresh(): die Werte kennen wir bereits aus dem Request
+        return [
+            schemas.BrowserEvent(id=event_id, **ev.dict())
+            for event_id, ev in zip(ids, events)
+            if event_id is not None
+        ]
+
+    return ack
+
+
+@router.get("/ingest-stats")
+async def ingest_stats():
+    """Queue-Tiefe und Flush-Zähler des Ingest-Writers (bzw. des Spools)."""
+    return {
+        "running": ingest_queue.running,
+        "queue_depth": ingest_queue.depth,
+        "queue_maxsize": ingest_queue.maxsize,
+        **ingest_queue.stats.as_dict(),
+        "spool": spool.as_dict() if spool.running else None,
+        "dedup": deduplicator.as_dict() if config.DEDUP_ENABLED else None,
+    }
+
+
+def _user_id(db: Session, user: str) -> int:
+    user_id = db.execute(
+        select(models.User.id).where(models.User.external_id == user)
+    ).scalar()
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User nicht gefunden")
+    return user_id
+
+
+@router.get("/search")
+async def search_events(
+    q: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    user_id: int | None = None,
+    user: str | None = None,
+    bc_company: str | None = None,
+    bc_page_id: int | None = None,
+    action_type: str | None = None,
+    order: Literal["rank", "time"] = "rank",
+    limit: int = 50,
+    offset: int = 0,
     db: Session = Depends(get_db),
 ):
+    """
+    Volltextsuche über Feldbeschriftung, Seitentitel, Feldname und neuen
+    Wert, z.B. ``q="Posting Date"&bc_page_id=42``. Wörter müssen alle
+    vorkommen, ``"..."`` sucht eine Phrase, ``wort*`` ein Präfix. Filter wie
+    beim Export; sortiert nach Relevanz (``order=rank``) oder Zeit
+    (``order=time``), seitenweise über ``limit``/``offset``.
+    """
+    limit = max(1, min(limit, config.SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
 
-    print(f"[EVENTS] Batch erhalten: {len(events)} Events")  # <--- NEU
-    
-    client_ip = request.client.host if request.client else None
-    user_agent = request.headers.get("user-agent", "")
-
-    created_events: list[models.BrowserEvent] = []
-
-    # Annahme: Alle Events im Batch gehören zum selben User & Session
-    user_external_id = events[0].user_external_id if events else None
-    session_key = events[0].session_key if events else None
-
-    user = get_or_create_user(db, user_external_id) if user_external_id else None
-    session = get_or_create_session(db, user, session_key, client_ip, user_agent)
-
-    for ev in events:
-        ts = ev.timestamp
-        if isinstance(ts, str):
-            ts = datetime.fromisoformat(ts)
-
-        db_event = models.BrowserEvent(
-            session_id=session.id if session else None,
-            timestamp=ts.astimezone(timezone.utc),
-            user_id=user.id if user else None,
-            page_url=ev.page_url,
-            page_title=ev.page_title,
-            bc_page_id=ev.bc_page_id,
-            bc_company=ev.bc_company,
-            element_type=ev.element_type,
-            element_role=ev.element_role,
-            element_label=ev.element_label,
-            element_name=ev.element_name,
-            element_id=ev.element_id,
-            element_path=ev.element_path,
-            action_type=ev.action_type,
-            old_value=ev.old_value,
-            new_value=ev.new_value,
-            meta=ev.meta,
-        )
-        db.add(db_event)
-        created_events.append(db_event)
+    flt = EventFilter(
+        start=start, end=end, user_id=user_id, bc_company=bc_company,
+        bc_page_id=bc_page_id, action_type=action_type,
+    )
+
+    def run():
+        if not search.available(db):
+            raise HTTPException(status_code=503, detail="Volltextsuche nicht verfügbar (FTS5)")
+        if user is not None:
+            flt.user_id = _user_id(db, user)
+        return search.search(db, q, flt, order, limit, offset)
 
-    db.commit()
-    for e in created_events:
-        db.refresh(e)
+    hits, has_more = await offload.run_read(run)
+    return {"query": q, "offset": offset, "limit": limit, "has_more": has_more, "hits": hits}
 
-    return created_events
+
+@router.get("/export")
+async def export_events(
+    request: Request,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    user_id: int | None = None,
+    user: str | None = None,
+    bc_company: str | None = None,
+    bc_page_id: int | None = None,
+    action_type: str | None = None,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    db: Session = Depends(get_db),
+):
+    """
+    Streamt die Roh-Events als NDJSON (Standard) oder CSV, sortiert nach
+    Zeit. Filter: Zeitraum ``[start, end)``, Nutzer (``user_id`` oder
+    ``user`` = external_id), ``bc_company``, ``bc_page_id``, ``action_type``.
+    Mit ``Accept-Encoding: gzip`` wird on the fly komprimiert.
+    """
+    if user is not None:
+        user_id = await offload.run_read(_user_id, db, user)
+
+    flt = EventFilter(
+        start=start, end=end, user_id=user_id, bc_company=bc_company,
+        bc_page_id=bc_page_id, action_type=action_type,
+    )
+    gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="events.{format}"',
+        "Vary": "Accept-Encoding",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        offload.iterate_read(stream(flt, format, gzip)),
+        media_type=MEDIA_TYPES[format], headers=headers,
+    )
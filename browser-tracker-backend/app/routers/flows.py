@@ -0,0 +1,132 @@
+# app/routers/flows.py
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+
+from ..cache import view_cache
+from ..deps import get_db
+from .. import models, offload, queries
+
+router = APIRouter(prefix="/api/flows", tags=["flows"])
+
+FLOW_DEFAULT_DAYS = 30
+FLOW_MAX_LIMIT = 200
+
+
+def _period(start: date | None, end: date | None) -> tuple[date, date]:
+    """Standard: die letzten FLOW_DEFAULT_DAYS Tage bis heute (UTC)."""
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=FLOW_DEFAULT_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=422, detail="start liegt nach end")
+    return start, end
+
+
+async def _cached(request: Request, response: Response, view: str, params: tuple, compute,
+                  user_id: int | None = None):
+    validator = view_cache.validator(view, params, user_id=user_id)
+    if validator.matches(request):
+        return validator.not_modified()
+    result = await offload.run_read(view_cache.get_or_compute, validator, compute)
+    response.headers.update(validator.headers)
+    return result
+
+
+@router.get("/edges")
+async def flow_edges(
+    request: Request,
+    response: Response,
+    start: date | None = None,
+    end: date | None = None,
+    company: str | None = None,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+):
+    """Häufigste Seitenübergänge mit mittlerer Verweildauer auf der Ausgangsseite."""
+    start, end = _period(start, end)
+    limit = max(1, min(limit, FLOW_MAX_LIMIT))
+
+    def compute():
+        rows = queries.flow_top_edges(db, start, end, company, limit)
+        return {"start": start, "end": end, "edges": [dict(r._mapping) for r in rows]}
+
+    return await _cached(request, response, "flow_edges", (start, end, company, limit), compute)
+
+
+@router.get("/paths")
+async def flow_paths(
+    request: Request,
+    response: Response,
+    start: date | None = None,
+    end: date | None = None,
+    company: str | None = None,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+):
+    """Häufigste Pfade aus drei aufeinanderfolgenden Seiten."""
+    start, end = _period(start, end)
+    limit = max(1, min(limit, FLOW_MAX_LIMIT))
+
+    def compute():
+        rows = queries.flow_top_paths(db, start, end, company, limit)
+        return {
+            "start": start, "end": end,
+            "paths": [
+                {"pages": [r.page_a, r.page_b, r.page_c], "count": r.count} for r in rows
+            ],
+        }
+
+    return await _cached(request, response, "flow_paths", (start, end, company, limit), compute)
+
+
+@router.get("/next/{page_id}")
+async def flow_next(
+    page_id: int,
+    request: Request,
+    response: Response,
+    start: date | None = None,
+    end: date | None = None,
+    company: str | None = None,
+    limit: int = 10,
+    db: Session = Depends(get_db),
+):
+    """Wahrscheinlichste Folgeseiten von ``page_id`` (Markov, 1. Ordnung)."""
+    start, end = _period(start, end)
+    limit = max(1, min(limit, FLOW_MAX_LIMIT))
+
+    def compute():
+        total, pages = queries.flow_next_pages(db, page_id, start, end, company, limit)
+        return {"start": start, "end": end, "page_id": page_id,
+                "transitions": total, "next": pages}
+
+    return await _cached(
+        request, response, "flow_next", (page_id, start, end, company, limit), compute
+    )
+
+
+@router.get("/users/{user_id}")
+async def flow_user(
+    user_id: int,
+    request: Request,
+    response: Response,
+    start: date | None = None,
+    end: date | None = None,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+):
+    """Seitenübergänge eines Nutzers."""
+    if await offload.run_read(db.get, models.User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User nicht gefunden")
+    start, end = _period(start, end)
+    limit = max(1, min(limit, FLOW_MAX_LIMIT))
+
+    def compute():
+        rows = queries.flow_top_edges(db, start, end, limit=limit, user_id=user_id)
+        return {"start": start, "end": end, "user_id": user_id,
+                "edges": [dict(r._mapping) for r in rows]}
+
+    return await _cached(
+        request, response, "flow_user", (user_id, start, end, limit), compute,
+        user_id=user_id,
+    )
@@ -0,0 +1,49 @@
+# app/routers/profiling.py
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from .. import profiling
+
+router = APIRouter(prefix=profiling.PREFIX, tags=["profiling"], include_in_schema=False)
+
+
+def require_token(request: Request):
+    """Gleiches Token wie beim Profilieren, nur im Header X-Profile."""
+    if not profiling.authorized(request.headers.get("x-profile")):
+        raise HTTPException(status_code=403, detail="Profiling nicht erlaubt")
+
+
+def require_token_or_link(request: Request, report_id: str):
+    """Wie require_token, alternativ der Schlüssel aus dem Panel-Link (nur dieser Bericht)."""
+    key = request.query_params.get(profiling.LINK_PARAM)
+    if not profiling.link_authorized(report_id, key):
+        require_token(request)
+
+
+@router.get("/", dependencies=[Depends(require_token)])
+async def profile_reports():
+    """Die zuletzt aufgezeichneten Berichte (neueste zuerst)."""
+    return [
+        {key: r[key] for key in ("id", "method", "path", "status", "started_at", "duration_ms")}
+        for r in reversed(list(profiling.reports.values()))
+    ]
+
+
+@router.get("/{report_id}", dependencies=[Depends(require_token_or_link)])
+async def profile_report(report_id: str, format: Literal["json", "collapsed"] = "json"):
+    """Bericht zum Download; ``collapsed`` = Stacks für Flamegraph-Tools."""
+    report = profiling.reports.get(report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Bericht nicht (mehr) vorhanden")
+
+    if format == "collapsed":
+        return PlainTextResponse(
+            "\n".join(report["cpu"]["collapsed"]) + "\n",
+            headers={"Content-Disposition": f'attachment; filename="profile-{report_id}.txt"'},
+        )
+    return JSONResponse(
+        report,
+        headers={"Content-Disposition": f'attachment; filename="profile-{report_id}.json"'},
+    )
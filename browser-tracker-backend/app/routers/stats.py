@@ -0,0 +1,218 @@
+# app/routers/stats.py
+"""
+JSON-Endpunkte für die Dashboard-Panels (GET /api/stats/...). Das Dashboard
+lädt nur noch die HTML-Hülle und holt jedes Panel einzeln und parallel, ein
+langsames Panel hält die anderen nicht mehr auf.
+
+Alle Endpunkte nehmen ``start``/``end`` (Tage, beide inklusive, UTC) und
+``company``. Listen kommen spaltenweise (``{"data": {"day": [...],
+"count": [...]}}``), ``meta`` nennt Zeitraum, Company und ``seq``, den Stand
+der Live-Updates (app/live.py) vor der Abfrage: Deltas mit größerer Nummer
+sind in den Zahlen noch nicht enthalten.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+
+from ..activity import format_duration
+from ..cache import view_cache
+from ..deps import get_db
+from .. import live, offload, queries
+
+router = APIRouter(prefix="/api/stats", tags=["stats"])
+
+DAYS_DEFAULT = 365
+TOP_MAX_LIMIT = 100
+USERS_MAX_LIMIT = 500
+
+
+def _range(start: date | None, end: date | None) -> tuple[date | None, date | None]:
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=422, detail="start liegt nach end")
+    return start, end
+
+
+def _columns(rows, names: tuple[str, ...]) -> dict:
+    return {name: [getattr(row, name) for row in rows] for name in names}
+
+
+def _result(start, end, company, seq: int, data) -> dict:
+    return {"meta": {"start": start, "end": end, "company": company, "seq": seq},
+            "data": data}
+
+
+# ------------------------------------------------------------
+# Panels (auch für app/plancheck.py und bench/queries.py)
+# ------------------------------------------------------------
+
+def kpis(db: Session, start: date | None = None, end: date | None = None,
+         company: str | None = None) -> dict:
+    """
+    Kennzahlen im Zeitraum. Sessions und aktive Zeit gibt es nicht je
+    Company (dann None); die 24h-Werte hängen nicht vom Zeitraum ab.
+    """
+    since_24h = datetime.now(timezone.utc) - timedelta(hours=24)
+    per_company = company is not None
+    active = None if per_company else queries.active_time_between(db, start, end)
+    active_24h = None if per_company else queries.active_time_since(db, since_24h)
+    return {
+        "total_events": queries.total_events(db, start, end, company),
+        "users": queries.active_users(db, start, end, company),
+        "sessions": None if per_company else queries.sessions_started(db, start, end),
+        "events_24h": queries.events_since(db, since_24h, company),
+        "active_seconds": active,
+        "active_time": format_duration(active) if active is not None else None,
+        "active_seconds_24h": active_24h,
+        "active_time_24h": format_duration(active_24h) if active_24h is not None else None,
+    }
+
+
+def top_users(db: Session, start=None, end=None, company=None, limit: int = 5) -> dict:
+    rows = queries.top_users(db, limit, start, end, company)
+    return _columns(rows, ("external_id", "display_name", "event_count"))
+
+
+def top_pages(db: Session, start=None, end=None, company=None, limit: int = 10) -> dict:
+    rows = queries.top_pages(db, limit, start, end, company)
+    data = _columns(rows, ("page_id", "event_count", "user_count"))
+    # Query-String der ersten URL ist je Nutzer verschieden, nur die Basis zählt
+    data["page_url"] = [row.page_url.split("?")[0] if row.page_url else None for row in rows]
+    return data
+
+
+def per_day(db: Session, start: date, end=None, company=None) -> dict:
+    rows = queries.events_by_day(db, start, end, company)
+    return {"day": [row.day for row in rows], "count": [row.count for row in rows]}
+
+
+def per_hour(db: Session, day: date, company=None) -> dict:
+    """24 Werte (0–23 Uhr UTC), auch für Stunden ohne Events."""
+    day_start = datetime.combine(day, time.min)
+    rows = queries.events_by_hour(db, day_start, day_start + timedelta(days=1), company)
+    counts = [0] * 24
+    for row in rows:
+        counts[int(row.hour)] = row.count
+    return {"hour": list(range(24)), "count": counts}
+
+
+def per_user(db: Session, start=None, end=None, company=None, limit: int = 100) -> dict:
+    rows = queries.user_breakdown(db, start, end, company, limit)
+    return _columns(rows, ("id", "external_id", "display_name", "event_count",
+                           "last_activity", "active_seconds"))
+
+
+# ------------------------------------------------------------
+# Endpunkte
+# ------------------------------------------------------------
+
+async def _panel(request: Request, response: Response, view: str, params: tuple, run):
+    validator = view_cache.validator(view, params)
+    if validator.matches(request):
+        return validator.not_modified()
+
+    def compute():
+        # Stand vor den Abfragen: ein Commit währenddessen kommt beim
+        # Client lieber doppelt als gar nicht an
+        seq = live.broadcaster.seq
+        start, end, company = params[:3]
+        return _result(start, end, company, seq, run())
+
+    result = await offload.run_read(view_cache.get_or_compute, validator, compute)
+    response.headers.update(validator.headers)
+    return result
+
+
+@router.get("/kpis")
+async def stats_kpis(
+    request: Request,
+    response: Response,
+    start: date | None = None,
+    end: date | None = None,
+    company: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """Events, aktive Nutzer, Sessions und aktive Zeit im Zeitraum, dazu die letzten 24h."""
+    start, end = _range(start, end)
+    return await _panel(request, response, "stats_kpis", (start, end, company),
+                        lambda: kpis(db, start, end, company))
+
+
+@router.get("/top-users")
+async def stats_top_users(
+    request: Request,
+    response: Response,
+    start: date | None = None,
+    end: date | None = None,
+    company: str | None = None,
+    limit: int = 5,
+    db: Session = Depends(get_db),
+):
+    start, end = _range(start, end)
+    limit = max(1, min(limit, TOP_MAX_LIMIT))
+    return await _panel(request, response, "stats_top_users", (start, end, company, limit),
+                        lambda: top_users(db, start, end, company, limit))
+
+
+@router.get("/top-pages")
+async def stats_top_pages(
+    request: Request,
+    response: Response,
+    start: date | None = None,
+    end: date | None = None,
+    company: str | None = None,
+    limit: int = 10,
+    db: Session = Depends(get_db),
+):
+    start, end = _range(start, end)
+    limit = max(1, min(limit, TOP_MAX_LIMIT))
+    return await _panel(request, response, "stats_top_pages", (start, end, company, limit),
+                        lambda: top_pages(db, start, end, company, limit))
+
+
+@router.get("/per-day")
+async def stats_per_day(
+    request: Request,
+    response: Response,
+    start: date | None = None,
+    end: date | None = None,
+    company: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """Events je Tag; ohne ``start`` die letzten DAYS_DEFAULT Tage. Tage ohne Events fehlen."""
+    start, end = _range(start, end)
+    if start is None:
+        start = (end or datetime.now(timezone.utc).date()) - timedelta(days=DAYS_DEFAULT - 1)
+    return await _panel(request, response, "stats_per_day", (start, end, company),
+                        lambda: per_day(db, start, end, company))
+
+
+@router.get("/per-hour")
+async def stats_per_hour(
+    request: Request,
+    response: Response,
+    day: date | None = None,
+    company: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """Events je Stunde eines Tages (Standard: heute, UTC)."""
+    day = day or datetime.now(timezone.utc).date()
+    return await _panel(request, response, "stats_per_hour", (day, day, company),
+                        lambda: per_hour(db, day, company))
+
+
+@router.get("/per-user")
+async def stats_per_user(
+    request: Request,
+    response: Response,
+    start: date | None = None,
+    end: date | None = None,
+    company: str | None = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+):
+    """Events, letzte Aktivität und aktive Zeit je Nutzer, die aktivsten zuerst."""
+    start, end = _range(start, end)
+    limit = max(1, min(limit, USERS_MAX_LIMIT))
+    return await _panel(request, response, "stats_per_user", (start, end, company, limit),
+                        lambda: per_user(db, start, end, company, limit))
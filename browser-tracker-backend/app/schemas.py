@@ -40,6 +40,28 @@ class BrowserEvent(BrowserEventBase):
         orm_mode = True
 
 
+class BatchAck(BaseModel):
+    """Kompakte Quittung für einen gespeicherten Batch (statt Echo aller Events)."""
+    count: int
+    duplicates: int = 0                       # schon bekannt, übersprungen
+    first_id: Optional[int] = None
+    last_id: Optional[int] = None
+    session_id: Optional[int] = None          # nur bei genau einer Session
+    session_ids: List[int] = []
+
+
+class IngestAccepted(BaseModel):
+    """Antwort, wenn ein Batch in die Ingest-Queue gelegt wurde (202)."""
+    accepted: int
+    queue_depth: int
+
+
+class TimelinePage(BaseModel):
+    """Eine Seite der Nutzer-Timeline (neueste zuerst)."""
+    events: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None        # None = keine weiteren Events
+
+
 class StatsOverview(BaseModel):
     total_events: int
     total_users: int
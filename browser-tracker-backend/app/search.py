@@ -0,0 +1,301 @@
+# app/search.py
+"""
+Volltextsuche über Feldbeschriftung, Seitentitel, Feldname und neuen Wert
+(GET /api/events/search) mit SQLite FTS5.
+
+Zu jeder Monatspartition gibt es einen Index ``browser_events_YYYYMM_fts``
+(contentless: nur die Wortlisten, die Texte stehen weiter in der Partition;
+rowid = Event-ID). Der Ingest schreibt über ``apply_rows`` mit, wie bei den
+Rollups. Damit Filter auf User, Page und Company nicht erst nach dem Ranking
+greifen, steht je Event eine Spalte ``scope`` mit Tokens ``u<user_id>``,
+``p<bc_page_id>`` und ``c<id der Company in event_strings>`` (0 = ohne) im
+Index – FTS5 schneidet die Trefferlisten dann selbst. Nur der Zeitraum und
+``action_type`` werden per Join auf die Partition geprüft, wobei ohnehin nur
+die Partitionen im Zeitraum angefasst werden.
+
+Archivierte Monate (app/archive.py) sind nicht durchsuchbar; beim
+Archivieren bzw. Löschen einer Partition verschwindet auch ihr Index.
+
+    python -m app.search rebuild
+"""
+import argparse
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import column, event, func, insert, select, table, text
+from sqlalchemy.orm import Session
+
+from . import config, models, partitions
+from .database import SessionLocal, upsert_insert
+from .export import EventFilter
+from .resolver import resolver
+
+TEXT_COLUMNS = ("element_label", "page_title", "element_name", "new_value")
+# bm25-Gewichte in der Reihenfolge von TEXT_COLUMNS, scope zählt nicht
+RANK = "bm25(10.0, 2.0, 5.0, 1.0, 0.0)"
+
+NO_USER = 0        # wie in den Rollups
+NO_PAGE = 0
+NO_COMPANY = 0
+
+_known: set[str] = set()        # in dieser Prozess-Lebenszeit angelegt/geprüft (committet)
+# in der laufenden Transaktion angelegte Indizes, erst nach Commit in _known
+PENDING_KEY = "search_pending"
+_available: bool | None = None
+
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+_COLUMNS = ("rowid",) + TEXT_COLUMNS + ("scope",)
+
+
+def index_name(partition: str) -> str:
+    return partition + "_fts"
+
+
+def _index_table(name: str):
+    return table(name, *(column(c) for c in _COLUMNS + ("rank",)))
+
+
+def available(db: Session) -> bool:
+    """FTS5 gibt es nur mit SQLite (und dort fast immer einkompiliert)."""
+    global _available
+    if _available is None:
+        bind = db.get_bind()
+        _available = bind.dialect.name == "sqlite" and bool(
+            db.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar()
+        )
+    return _available
+
+
+def _exists(db: Session, name: str) -> bool:
+    return db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": name},
+    ).scalar() is not None
+
+
+def ensure_index(db: Session, partition: str) -> str:
+    name = index_name(partition)
+    if name in _known or name in db.info.get(PENDING_KEY, ()):
+        return name
+    if not _exists(db, name):
+        columns = ", ".join(TEXT_COLUMNS + ("scope",))
+        db.execute(text(
+            f'CREATE VIRTUAL TABLE "{name}" USING fts5({columns}, content=\'\', '
+            f"tokenize='unicode61 remove_diacritics 2')"
+        ))
+        # Gewichte fest im Index, damit ORDER BY rank sie benutzt
+        db.execute(text(f'INSERT INTO "{name}" ("{name}", rank) VALUES (\'rank\', :rank)'),
+                   {"rank": RANK})
+    db.info.setdefault(PENDING_KEY, set()).add(name)
+    return name
+
+
+# wie bei den Partitionen: erst der Commit macht den Index für alle sichtbar
+@event.listens_for(Session, "after_commit")
+def _publish_known(db: Session):
+    pending = db.info.pop(PENDING_KEY, None)
+    if pending:
+        _known.update(pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(db: Session, previous_transaction):
+    db.info.pop(PENDING_KEY, None)
+
+
+def drop_index(db: Session, partition: str):
+    name = index_name(partition)
+    db.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+    _known.discard(name)
+    db.info.get(PENDING_KEY, set()).discard(name)
+
+
+def _scope(user_id: int | None, page_id: int | None, company_id: int | None) -> str:
+    return f"u{user_id or NO_USER} p{page_id or NO_PAGE} c{company_id or NO_COMPANY}"
+
+
+def apply_rows(db: Session, rows: list[dict]):
+    """Frisch eingefügte Event-Zeilen (mit ``id``) in die Suchindizes eintragen."""
+    if not rows or not config.SEARCH_ENABLED or not available(db):
+        return
+    companies = resolver.string_ids(db, (row["bc_company"] for row in rows))
+
+    by_partition: dict[str, list[dict]] = {}
+    for row in rows:
+        partition = partitions.partition_name(partitions.month_start(row["timestamp"]))
+        values = {name: row[name] for name in TEXT_COLUMNS}
+        values["rowid"] = row["id"]
+        values["scope"] = _scope(row["user_id"], row["bc_page_id"],
+                                 companies.get(row["bc_company"]))
+        by_partition.setdefault(partition, []).append(values)
+
+    for partition, values in by_partition.items():
+        name = ensure_index(db, partition)
+        db.execute(insert(_index_table(name)), values)
+
+
+def _build_partition(db: Session, partition):
+    name = ensure_index(db, partition.name)
+    S = models.EventString.__table__
+    label, title, company = S.alias("s_label"), S.alias("s_title"), S.alias("s_company")
+    e = partition.c
+    scope = func.printf(
+        "u%d p%d c%d", func.coalesce(e.user_id, NO_USER),
+        func.coalesce(e.bc_page_id, NO_PAGE), func.coalesce(company.c.id, NO_COMPANY),
+    )
+    stmt = (
+        select(e.id, label.c.value, title.c.value, e.element_name, e.new_value, scope)
+        .select_from(
+            partition
+            .outerjoin(label, label.c.id == e.element_label_id)
+            .outerjoin(title, title.c.id == e.page_title_id)
+            .outerjoin(company, company.c.value == e.bc_company)
+        )
+    )
+    db.execute(insert(_index_table(name)).from_select(list(_COLUMNS), stmt))
+    db.execute(text(f'INSERT INTO "{name}" ("{name}") VALUES (\'optimize\')'))
+
+
+def rebuild(db: Session):
+    """Alle Suchindizes aus den Partitionen neu aufbauen. Committet nicht."""
+    if not available(db):
+        return
+    S = models.EventString
+    for partition in partitions.for_range(db):
+        # Companies stehen in der Partition als Text, der Index braucht ihre ID
+        company = partition.c.bc_company
+        db.execute(
+            upsert_insert(db, S).from_select(
+                ["value"], select(company).where(company.isnot(None)).distinct(),
+            ).on_conflict_do_nothing()
+        )
+        drop_index(db, partition.name)
+        _build_partition(db, partition)
+
+
+# ------------------------------------------------------------
+# Suche
+# ------------------------------------------------------------
+
+def match_expression(query: str) -> str | None:
+    """
+    Suchtext als FTS5-Ausdruck: Wörter (``post*`` als Präfix) und
+    "Phrasen in Anführungszeichen", alle müssen vorkommen. Operatoren der
+    FTS5-Syntax werden nicht interpretiert, sondern mitgesucht.
+    """
+    terms = []
+    for phrase, word in _TERM.findall(query):
+        prefix = False
+        if word:
+            prefix = word.endswith("*")
+            phrase = word.rstrip("*")
+        if phrase.strip():
+            terms.append('"' + phrase.replace('"', '""') + '"' + ("*" if prefix else ""))
+    if not terms:
+        return None
+    columns = " ".join(TEXT_COLUMNS)
+    return "{" + columns + "} : (" + " ".join(terms) + ")"
+
+
+@dataclass
+class SearchHit:
+    rank: float
+    timestamp: object
+    row: dict
+
+
+def _partition_hits(db: Session, partition, match: str, flt: EventFilter,
+                    order: str, limit: int) -> list[SearchHit]:
+    name = index_name(partition.name)
+    if name not in _known and not _exists(db, name):
+        return []   # Suche war beim Schreiben abgeschaltet: python -m app.search rebuild
+    fts = _index_table(name)
+    rank = fts.c.rank
+    e = partition.c
+
+    stmt = (
+        partitions.select_events(partition)
+        .add_columns(rank.label("rank"))
+        .join(fts, fts.c.rowid == e.id)
+        .where(text(f'"{name}" MATCH :match').bindparams(match=match))
+    )
+    if flt.action_type is not None:
+        stmt = stmt.where(e.action_type == flt.action_type)
+    if flt.start is not None:
+        stmt = stmt.where(e.timestamp >= flt.start)
+    if flt.end is not None:
+        stmt = stmt.where(e.timestamp < flt.end)
+    if order == "time":
+        stmt = stmt.order_by(e.timestamp.desc(), e.id.desc())
+    else:
+        stmt = stmt.order_by(rank, e.timestamp.desc())
+
+    hits = []
+    for row in db.execute(stmt.limit(limit)).mappings():
+        data = dict(row)
+        hits.append(SearchHit(data.pop("rank"), data["timestamp"], data))
+    return hits
+
+
+def search(db: Session, query: str, flt: EventFilter, order: str = "rank",
+           limit: int = 50, offset: int = 0) -> tuple[list[dict], bool]:
+    """
+    Treffer ``[offset, offset + limit)`` und ob es weitere gibt. ``order``:
+    "rank" (Relevanz, bm25) oder "time" (neueste zuerst). Ränge verschiedener
+    Monate sind nur ungefähr vergleichbar (bm25 rechnet je Index).
+    """
+    match = match_expression(query)
+    if match is None:
+        return [], False
+
+    scope = []
+    if flt.user_id is not None:
+        scope.append(f"u{flt.user_id}")
+    if flt.bc_page_id is not None:
+        scope.append(f"p{flt.bc_page_id}")
+    if flt.bc_company is not None:
+        company_id = db.execute(
+            select(models.EventString.id).where(models.EventString.value == flt.bc_company)
+        ).scalar()
+        if company_id is None:
+            return [], False
+        scope.append(f"c{company_id}")
+    if scope:
+        match += " AND scope : (" + " ".join(f'"{token}"' for token in scope) + ")"
+
+    wanted = offset + limit + 1
+    hits: list[SearchHit] = []
+    for partition in partitions.for_range(db, flt.start, flt.end, newest_first=True):
+        hits += _partition_hits(db, partition, match, flt, order, wanted)
+        if order == "time" and len(hits) >= wanted:
+            # neueste Monate zuerst: ältere können nichts mehr verdrängen
+            break
+
+    if order == "time":
+        hits.sort(key=lambda h: (h.timestamp, h.row["id"]), reverse=True)
+    else:
+        hits.sort(key=lambda h: h.rank)
+    page = hits[offset:offset + limit]
+    return [{**h.row, "rank": h.rank} for h in page], len(hits) > offset + limit
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.search")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="Suchindizes aus den Partitionen neu aufbauen")
+    parser.parse_args(argv)
+
+    from .migrations import upgrade
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+    print("[SEARCH] Neu aufgebaut")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+# app/sketches.py
+"""
+Sketches für Top-N und Distinct-Counts in konstanter Größe je Zeit-Bucket.
+
+Je Tag und je Monat (UTC) gibt es in ``sketches``:
+
+- eine Space-Saving-Zusammenfassung je Dimension (``page``, ``user``,
+  ``element`` = ID der Feldbeschriftung in event_strings, ``company``) mit
+  höchstens SKETCH_TOPK_CAPACITY Einträgen. Zählungen sind exakt, solange es
+  nicht mehr verschiedene Werte gibt; sonst Überschätzung um höchstens
+  ``error``.
+- ein HyperLogLog (2^SKETCH_HLL_PRECISION Register) der User je Page
+  (``page_users``, key = bc_page_id, 0 = alle Pages).
+
+Beides ist verlustfrei mergebar: eine Abfrage über einen Zeitraum nimmt die
+vollen Monate und die Tage an den Rändern und fasst nur diese Zustände
+zusammen – die Rohdaten und Rollups werden dafür nicht gelesen.
+
+Beim Ingest sammelt ``collect`` die Deltas je Transaktion in ``db.info``;
+geschrieben wird einmal kurz vor dem Commit (Group Commit = ein Update je
+Sketch, nicht je Client-Batch).
+
+    python -m app.sketches rebuild
+    python -m app.sketches top --dim element [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+import argparse
+import json
+import math
+import zlib
+from collections import Counter, namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import and_, delete, event, func, or_, select
+from sqlalchemy.orm import Session
+
+from . import archive, config, models, partitions
+from .database import SessionLocal, upsert_insert
+from .resolver import resolver
+from .rollups import NO_COMPANY, NO_PAGE, NO_USER
+
+DIMENSIONS = ("page", "user", "element", "company")
+PAGE_USERS = "page_users"
+ALL_PAGES = 0
+
+DAY, MONTH = "D", "M"
+
+# Während einer Transaktion gesammelte Deltas (siehe collect)
+PENDING_KEY = "sketch_delta"
+
+TopItem = namedtuple("TopItem", "key count error")
+
+
+# ------------------------------------------------------------
+# Datenstrukturen
+# ------------------------------------------------------------
+
+class SpaceSaving:
+    """Heavy Hitters (Metwally et al.): je Wert Zählung und maximale Überschätzung."""
+
+    def __init__(self, capacity: int = config.SKETCH_TOPK_CAPACITY):
+        self.capacity = capacity
+        self.counts: dict = {}
+        self.errors: dict = {}
+
+    @property
+    def floor(self) -> int:
+        """Höchstmögliche Zählung eines Werts, der nicht (mehr) enthalten ist."""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def update(self, counts: Counter):
+        """Exakte Zählungen (z.B. eines Batches) einrechnen."""
+        other = SpaceSaving(capacity=len(counts) + 1)
+        other.counts = dict(counts)
+        other.errors = dict.fromkeys(counts, 0)
+        self.merge(other)
+
+    def merge(self, other: "SpaceSaving"):
+        floor_a, floor_b = self.floor, other.floor
+        counts, errors = {}, {}
+        for key in self.counts.keys() | other.counts.keys():
+            counts[key] = self.counts.get(key, floor_a) + other.counts.get(key, floor_b)
+            errors[key] = self.errors.get(key, floor_a) + other.errors.get(key, floor_b)
+        if len(counts) > self.capacity:
+            keep = sorted(counts, key=counts.get, reverse=True)[:self.capacity]
+            counts = {key: counts[key] for key in keep}
+            errors = {key: errors[key] for key in keep}
+        self.counts, self.errors = counts, errors
+
+    def top(self, n: int) -> list[TopItem]:
+        keys = sorted(self.counts, key=lambda k: (-self.counts[k], str(k)))[:n]
+        return [TopItem(key, self.counts[key], self.errors[key]) for key in keys]
+
+    def to_bytes(self) -> bytes:
+        items = [[key, self.counts[key], self.errors[key]] for key in self.counts]
+        return json.dumps({"k": self.capacity, "items": items}, separators=(",", ":")).encode()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SpaceSaving":
+        raw = json.loads(data)
+        sketch = cls(raw["k"])
+        for key, count, error in raw["items"]:
+            sketch.counts[key] = count
+            sketch.errors[key] = error
+        return sketch
+
+
+def _mix64(value: int) -> int:
+    """splitmix64: gleichverteilter 64-Bit-Hash einer (User-)ID."""
+    z = (value + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return z ^ (z >> 31)
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = config.SKETCH_HLL_PRECISION,
+                 registers: np.ndarray | None = None):
+        self.p = precision
+        self.registers = (registers if registers is not None
+                          else np.zeros(1 << precision, dtype=np.uint8))
+
+    def add(self, value: int):
+        h = _mix64(value)
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))   # Linear Counting für kleine Mengen
+        return round(raw)
+
+    def to_bytes(self) -> bytes:
+        # meist dünn besetzt – komprimiert nur ein paar Dutzend Bytes
+        return bytes([self.p]) + zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        registers = np.frombuffer(zlib.decompress(data[1:]), dtype=np.uint8).copy()
+        return cls(data[0], registers)
+
+
+def _load(kind: str, data: bytes):
+    return HyperLogLog.from_bytes(data) if kind == PAGE_USERS else SpaceSaving.from_bytes(data)
+
+
+# ------------------------------------------------------------
+# Fortschreiben
+# ------------------------------------------------------------
+
+class Delta:
+    """Exakte Zählungen je Tag, bis sie in die Sketches eingerechnet werden."""
+
+    def __init__(self):
+        self.counts: dict[date, dict[str, Counter]] = {}
+        self.users: dict[date, dict[int, set[int]]] = {}
+
+    def add(self, day: date, user_id, page_id, company, element_id, n: int = 1):
+        counts = self.counts.get(day)
+        if counts is None:
+            counts = self.counts[day] = {dim: Counter() for dim in DIMENSIONS}
+            self.users[day] = {}
+        if page_id:
+            counts["page"][page_id] += n
+        if element_id:
+            counts["element"][element_id] += n
+        if company:
+            counts["company"][company] += n
+        if user_id:
+            counts["user"][user_id] += n
+            users = self.users[day]
+            users.setdefault(ALL_PAGES, set()).add(user_id)
+            if page_id:
+                users.setdefault(page_id, set()).add(user_id)
+
+
+def collect(db: Session, rows: list[dict]):
+    """Merkt frisch eingefügte Event-Zeilen für den Commit vor."""
+    if not config.SKETCHES_ENABLED or not rows:
+        return
+    delta = db.info.get(PENDING_KEY)
+    if delta is None:
+        delta = db.info[PENDING_KEY] = Delta()
+    # schon beim Insert interniert, kommt also aus dem Cache
+    labels = resolver.string_ids(db, (row["element_label"] for row in rows))
+    for row in rows:
+        delta.add(row["timestamp"].date(), row["user_id"], row["bc_page_id"],
+                  row["bc_company"], labels.get(row["element_label"]))
+
+
+def write(db: Session, delta: Delta):
+    """Deltas in die Tages- und Monats-Sketches einrechnen (Read-Modify-Write)."""
+    S = models.Sketch
+    updates: dict[tuple, object] = {}   # (period, bucket, kind, key) -> Sketch
+
+    wanted = []
+    for day, counts in delta.counts.items():
+        for period, bucket in ((DAY, day), (MONTH, partitions.month_start(day))):
+            wanted += [(period, bucket, dim, 0) for dim, c in counts.items() if c]
+            wanted += [(period, bucket, PAGE_USERS, page) for page in delta.users[day]]
+    wanted = list(dict.fromkeys(wanted))
+
+    # vorhandene Zustände in wenigen Abfragen holen (je Bucket)
+    by_bucket: dict[tuple, list] = {}
+    for period, bucket, kind, key in wanted:
+        by_bucket.setdefault((period, bucket), []).append((kind, key))
+    for (period, bucket), keys in by_bucket.items():
+        # page_users nur für die Seiten im Batch, nicht alle HLLs des Monats
+        stmt = (
+            select(S.kind, S.key, S.data)
+            .where(S.period == period, S.bucket == bucket,
+                   S.kind.in_({kind for kind, _ in keys}),
+                   S.key.in_({key for _, key in keys}))
+            .with_for_update()
+        )
+        wanted_keys = set(keys)
+        for kind, key, data in db.execute(stmt):
+            if (kind, key) in wanted_keys:
+                updates[(period, bucket, kind, key)] = _load(kind, data)
+
+    for day, counts in delta.counts.items():
+        for period, bucket in ((DAY, day), (MONTH, partitions.month_start(day))):
+            for dim, c in counts.items():
+                if c:
+                    sketch = updates.setdefault((period, bucket, dim, 0), SpaceSaving())
+                    sketch.update(c)
+            for page, users in delta.users[day].items():
+                sketch = updates.setdefault((period, bucket, PAGE_USERS, page), HyperLogLog())
+                for user_id in users:
+                    sketch.add(user_id)
+
+    rows = [
+        {"period": period, "bucket": bucket, "kind": kind, "key": key,
+         "data": sketch.to_bytes()}
+        for (period, bucket, kind, key), sketch in updates.items()
+    ]
+    if not rows:
+        return
+    stmt = upsert_insert(db, S)
+    if stmt is not None:
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[S.period, S.bucket, S.kind, S.key],
+            set_={"data": stmt.excluded.data},
+        ), rows)
+    else:
+        for row in rows:
+            db.execute(delete(S).where(
+                S.period == row["period"], S.bucket == row["bucket"],
+                S.kind == row["kind"], S.key == row["key"],
+            ))
+        db.execute(S.__table__.insert(), rows)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_before_commit(db: Session):
+    delta = db.info.pop(PENDING_KEY, None)
+    if delta is not None:
+        write(db, delta)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_delta(db: Session, previous_transaction):
+    db.info.pop(PENDING_KEY, None)
+
+
+# ------------------------------------------------------------
+# Abfragen
+# ------------------------------------------------------------
+
+def _buckets(db: Session, start: date | None, end: date | None) -> list:
+    """
+    WHERE-Bedingungen für [start, end) aus möglichst wenigen Buckets: volle
+    Monate als Monats-Sketch, die Ränder tageweise.
+    """
+    S = models.Sketch
+    if start is None:
+        start = db.execute(select(func.min(S.bucket)).where(S.period == MONTH)).scalar()
+        if start is None:
+            return []
+    if end is None:
+        end = datetime.now(timezone.utc).date() + timedelta(days=1)
+
+    days, months = [], []
+    current = start
+    while current < end:
+        month = partitions.month_start(current)
+        following = partitions.next_month(month)
+        if current == month and following <= end:
+            months.append(month)
+            current = following
+        else:
+            days.append(current)
+            current += timedelta(days=1)
+
+    where = []
+    if months:
+        where.append(and_(S.period == MONTH, S.bucket.in_(months)))
+    if days:
+        where.append(and_(S.period == DAY, S.bucket.in_(days)))
+    return where
+
+
+def _merged(db: Session, kind: str, start: date | None, end: date | None,
+            keys: list[int] | None = None) -> dict:
+    S = models.Sketch
+    where = _buckets(db, start, end)
+    if not where:
+        return {}
+    stmt = select(S.key, S.data).where(or_(*where), S.kind == kind)
+    if keys is not None:
+        stmt = stmt.where(S.key.in_(keys))
+
+    merged = {}
+    for key, data in db.execute(stmt):
+        sketch = _load(kind, data)
+        if key in merged:
+            merged[key].merge(sketch)
+        else:
+            merged[key] = sketch
+    return merged
+
+
+def top(db: Session, dim: str, start: date | None = None, end: date | None = None,
+        limit: int = 10) -> list[TopItem]:
+    """Häufigste Werte einer Dimension in [start, end) (Standard: alles)."""
+    sketch = _merged(db, dim, start, end).get(0)
+    return sketch.top(limit) if sketch is not None else []
+
+
+def distinct_users(db: Session, page_ids: list[int], start: date | None = None,
+                   end: date | None = None) -> dict[int, int]:
+    """Geschätzte Anzahl verschiedener User je Page (ALL_PAGES = insgesamt)."""
+    merged = _merged(db, PAGE_USERS, start, end, page_ids)
+    return {page: merged[page].estimate() if page in merged else 0 for page in page_ids}
+
+
+# ------------------------------------------------------------
+# Neuaufbau
+# ------------------------------------------------------------
+
+def rebuild(db: Session):
+    """Alle Sketches aus Partitionen und Spaltenarchiv neu aufbauen. Committet nicht."""
+    db.execute(delete(models.Sketch))
+    for month in archive.months():
+        with month.open() as reader:
+            delta = Delta()
+            rows = reader.group_count(
+                ["user_id", "bc_page_id", "bc_company", "element_label"], "D"
+            )
+            labels = resolver.string_ids(db, (row[4] for row in rows))
+            for day, user_id, page_id, company, label, count, _, _ in rows:
+                delta.add(day, user_id, page_id, company, labels.get(label), count)
+            write(db, delta)
+
+    for table in partitions.for_range(db):
+        E = table.c
+        dims = [
+            func.date(E.timestamp),
+            func.coalesce(E.user_id, NO_USER),
+            func.coalesce(E.bc_page_id, NO_PAGE),
+            func.coalesce(E.bc_company, NO_COMPANY),
+            E.element_label_id,
+        ]
+        delta = Delta()
+        stmt = select(*dims, func.count()).where(E.timestamp.isnot(None)).group_by(*dims)
+        for day, user_id, page_id, company, label_id, count in db.execute(stmt):
+            delta.add(date.fromisoformat(day), user_id, page_id, company, label_id, count)
+        write(db, delta)
+
+
+def ensure_backfilled(db: Session):
+    """Einmaliger Backfill, falls es Events, aber noch keine Sketches gibt."""
+    has_sketches = db.execute(select(models.Sketch.kind).limit(1)).first()
+    if not has_sketches and (partitions.has_events(db) or archive.months()):
+        rebuild(db)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.sketches")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="Sketches aus den Rohdaten neu aufbauen")
+    p_top = sub.add_parser("top", help="häufigste Werte einer Dimension anzeigen")
+    p_top.add_argument("--dim", choices=DIMENSIONS, default="page")
+    p_top.add_argument("--start", type=date.fromisoformat)
+    p_top.add_argument("--end", type=date.fromisoformat, help="exklusiv")
+    p_top.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    from .migrations import upgrade
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            rebuild(db)
+            db.commit()
+            print("[SKETCHES] Neu aufgebaut")
+        else:
+            items = top(db, args.dim, args.start, args.end, args.limit)
+            names = {}
+            if args.dim == "element":
+                S = models.EventString
+                names = dict(db.execute(
+                    select(S.id, S.value).where(S.id.in_([item.key for item in items]))
+                ).all())
+            for item in items:
+                print(f"{names.get(item.key, item.key)}\t{item.count}\t±{item.error}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+# app/spool.py
+"""
+Dauerhafter Ingest-Spool: angenommene Batches landen zuerst in einer
+Append-only-Datei auf der lokalen Platte (fsync vor der Quittung) und werden
+danach von einem Loader in die Datenbank geladen. So geht bei gesperrter
+Datenbank oder einem Neustart nichts verloren, und mehrere uvicorn-Worker
+können annehmen, ohne um den einen SQLite-Writer zu konkurrieren.
+
+Aufbau von SPOOL_DIR:
+
+- ``<ns>-<pid>.open``: Segment, in das ein Prozess gerade schreibt. Es wird
+  nach SPOOL_SEGMENT_BYTES bzw. SPOOL_SEGMENT_SECONDS geschlossen und in
+  ``<ns>-<pid>.seg`` umbenannt ("versiegelt"); die Namen sortieren sich
+  zeitlich. Solange der Prozess lebt, hält er einen ``flock`` auf seinem
+  offenen Segment – die PID im Namen dient nur der Diagnose (im Container
+  ist der Server nach jedem Neustart wieder PID 1).
+- Ein Segment ist eine Folge von Sätzen ``<Länge><CRC32><JSON>``; ein Satz
+  ist ein Client-Batch. Ein abgerissener letzter Satz (Absturz beim
+  Schreiben) fällt an der Prüfsumme auf und wird verworfen.
+
+Der Loader lädt versiegelte Segmente in Gruppen von bis zu
+INGEST_FLUSH_EVENTS Events je Transaktion. Der Offset steht in
+``spool_checkpoints`` und wird in derselben Transaktion wie die Events
+fortgeschrieben (Compare-and-Swap) – ein Batch wird also genau einmal
+geladen, auch wenn zwei Loader gleichzeitig laufen oder einer mittendrin
+abbricht. Fertige Segmente werden gelöscht.
+
+Beim Start versiegelt die App verwaiste ``.open``-Segmente abgestürzter
+Prozesse und lädt alles nach (sofern SPOOL_LOADER gesetzt ist). Bei mehreren
+Workern SPOOL_LOADER=0 setzen und den Loader separat starten:
+
+    python -m app.spool load [--follow]
+    python -m app.spool status
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:   # Windows: offene Dateien lassen sich dort gar nicht umbenennen
+    fcntl = None
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+from . import config, metrics, models
+from .database import SessionLocal, upsert_insert
+from .ingest import IngestBatch, store_batch
+from .wire import FIELDS, WireEvent
+
+try:
+    import orjson
+    _dumps, _loads = orjson.dumps, orjson.loads
+except ImportError:   # Fallback: Standardbibliothek
+    def _dumps(value) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("<II")      # Länge, CRC32 des JSON
+OPEN, SEALED, CORRUPT = ".open", ".seg", ".corrupt"
+NEW = ".new"                        # angelegt, aber noch nicht gesperrt
+
+
+# ------------------------------------------------------------
+# Sätze
+# ------------------------------------------------------------
+
+def encode(batch: IngestBatch) -> bytes:
+    """Ein Batch als Satz; Events spaltenweise wie ``wire.FIELDS``."""
+    events = []
+    for ev in batch.events:
+        values = ev.dict()
+        ts = values["timestamp"]
+        if isinstance(ts, datetime):
+            values["timestamp"] = ts.isoformat()
+        events.append([values[name] for name in FIELDS])
+    payload = _dumps({"ip": batch.client_ip, "ua": batch.user_agent,
+                      "id": batch.batch_id, "events": events})
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode(payload: bytes) -> IngestBatch:
+    data = _loads(payload)
+    return IngestBatch(
+        events=[WireEvent(*values) for values in data["events"]],
+        client_ip=data["ip"],
+        user_agent=data["ua"],
+        batch_id=data.get("id"),
+    )
+
+
+def read_records(f, offset: int = 0):
+    """
+    (Batch, Offset nach dem Satz) ab ``offset``; endet am Dateiende oder am
+    ersten unvollständigen/beschädigten Satz (``f.tell()`` zeigt dann dorthin).
+    """
+    f.seek(offset)
+    while True:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            f.seek(offset)
+            return
+        length, crc = HEADER.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            f.seek(offset)
+            return
+        offset += HEADER.size + length
+        yield decode(payload), offset
+
+
+# ------------------------------------------------------------
+# Schreiben (Events-Router)
+# ------------------------------------------------------------
+
+def _fsync_dir(directory: str):
+    """Umbenennungen dauerhaft machen (unter Windows nicht nötig/möglich)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class SpoolWriter:
+    """
+    Hängt Batches an das offene Segment dieses Prozesses an. Gleichzeitige
+    Aufrufe teilen sich ein fsync (Group Commit): wer nach dem Schreiben
+    feststellt, dass ein anderer schon bis über seinen Satz hinaus
+    synchronisiert hat, muss nicht mehr selbst.
+    """
+
+    def __init__(self, directory: str = config.SPOOL_DIR,
+                 segment_bytes: int = config.SPOOL_SEGMENT_BYTES,
+                 segment_seconds: float = config.SPOOL_SEGMENT_SECONDS):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self._file = None
+        self._path = None
+        self._opened_at = 0.0
+        self._size = 0
+        self._appended = 0          # Sätze insgesamt ...
+        self._synced = 0            # ... davon sicher auf der Platte
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def append(self, batch: IngestBatch):
+        """Blockiert bis zum fsync – aus dem Event-Loop per to_thread aufrufen."""
+        record = encode(batch)
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(record)
+            self._size += len(record)
+            self._appended += 1
+            mine = self._appended
+        self._sync(mine)
+        if self._size >= self.segment_bytes:
+            self.seal()
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        name = os.path.join(self.directory, f"{time.time_ns():020d}-{os.getpid()}")
+        # erst sperren, dann als .open sichtbar machen – sonst könnte recover()
+        # das frische Segment dazwischen für verwaist halten
+        self._file = open(name + NEW, "ab", buffering=0)
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._path = name + OPEN
+        os.replace(name + NEW, self._path)
+        self._opened_at = time.monotonic()
+        self._size = 0
+
+    def _sync(self, upto: int):
+        with self._sync_lock:
+            if self._synced >= upto:
+                return
+            with self._lock:
+                target, f = self._appended, self._file
+            os.fsync(f.fileno())
+            self._synced = target
+
+    def seal(self, min_age: float = 0.0) -> str | None:
+        """Schließt das offene Segment (wenn es älter als ``min_age`` ist)."""
+        with self._sync_lock, self._lock:
+            if self._file is None or time.monotonic() - self._opened_at < min_age:
+                return None
+            os.fsync(self._file.fileno())
+            self._file.close()
+            sealed = self._path[:-len(OPEN)] + SEALED
+            os.replace(self._path, sealed)
+            _fsync_dir(self.directory)
+            self._synced = self._appended
+            self._file = self._path = None
+            return sealed
+
+
+def _owner_alive(path: str) -> bool:
+    """
+    Der Schreiber sperrt sein offenes Segment per ``flock``; mit dem Prozess
+    endet auch die Sperre. Das gilt auch für diesen Prozess selbst, ein
+    Segment eines abgestürzten Vorgängers mit derselben PID ist also frei.
+    """
+    if fcntl is None:
+        return False    # offene Dateien lassen sich unter Windows nicht umbenennen
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return True     # schon versiegelt
+    with f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+    return False
+
+
+def recover(directory: str = config.SPOOL_DIR) -> list[str]:
+    """Versiegelt offene Segmente von Prozessen, die nicht mehr laufen."""
+    if not os.path.isdir(directory):
+        return []
+    sealed = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.endswith(OPEN) or _owner_alive(path):
+            continue
+        try:
+            os.replace(path, path[:-len(OPEN)] + SEALED)
+        except OSError:
+            continue    # anderer Prozess war schneller bzw. Datei noch offen
+        sealed.append(name)
+    if sealed:
+        _fsync_dir(directory)
+        logger.warning("spool_recovered", extra={"fields": {"segments": len(sealed)}})
+    return sealed
+
+
+def segments(directory: str = config.SPOOL_DIR, suffix: str = SEALED) -> list[str]:
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, n) for n in sorted(os.listdir(directory))
+            if n.endswith(suffix)]
+
+
+# ------------------------------------------------------------
+# Laden
+# ------------------------------------------------------------
+
+def _checkpoint(db: Session, segment: str) -> int:
+    db.execute(upsert_insert(db, models.SpoolCheckpoint).values(
+        segment=segment, position=0, updated_at=datetime.now(timezone.utc),
+    ).on_conflict_do_nothing())
+    position = db.get(models.SpoolCheckpoint, segment).position
+    db.commit()
+    return position
+
+
+def _advance(db: Session, segment: str, old: int, new: int) -> bool:
+    """Offset nur weiterschieben, wenn ihn kein anderer Loader bewegt hat."""
+    C = models.SpoolCheckpoint
+    result = db.execute(
+        update(C).where(C.segment == segment, C.position == old)
+        .values(position=new, updated_at=datetime.now(timezone.utc))
+    )
+    return result.rowcount == 1
+
+
+class Loader:
+    def __init__(self, directory: str = config.SPOOL_DIR,
+                 flush_events: int = config.INGEST_FLUSH_EVENTS,
+                 session_factory=SessionLocal):
+        self.directory = directory
+        self.flush_events = flush_events
+        self.session_factory = session_factory
+        self.loaded_events = 0
+        self.failed_events = 0
+
+    def load_all(self) -> int:
+        """Lädt alle versiegelten Segmente; liefert die Zahl der Events."""
+        before = self.loaded_events
+        for path in segments(self.directory):
+            self.load_segment(path)
+        return self.loaded_events - before
+
+    def load_segment(self, path: str):
+        segment = os.path.basename(path)[:-len(SEALED)]
+        db = self.session_factory()
+        try:
+            position = _checkpoint(db, segment)
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                # ein anderer Loader war schneller und hat schon aufgeräumt
+                db.execute(delete(models.SpoolCheckpoint)
+                           .where(models.SpoolCheckpoint.segment == segment))
+                db.commit()
+                return
+            with f:
+                records = read_records(f, position)
+                while True:
+                    group, n = [], 0
+                    for record in records:
+                        group.append(record)
+                        n += len(record[0].events)
+                        if n >= self.flush_events:
+                            break
+                    if not group:
+                        break
+                    if not self._commit(db, segment, position, group):
+                        return  # anderer Loader ist an diesem Segment
+                    position = group[-1][1]
+                complete = f.seek(0, os.SEEK_END) == position
+
+            if not complete:
+                # abgerissener Satz am Ende: zur Ansicht liegen lassen
+                logger.warning("spool_corrupt_tail", extra={"fields": {
+                    "segment": segment, "position": position,
+                }})
+                os.replace(path, path[:-len(SEALED)] + CORRUPT)
+            else:
+                os.remove(path)
+            db.execute(delete(models.SpoolCheckpoint)
+                       .where(models.SpoolCheckpoint.segment == segment))
+            db.commit()
+        finally:
+            db.close()
+
+    def _commit(self, db: Session, segment: str, position: int, group: list) -> bool:
+        """Eine Gruppe samt Offset in einer Transaktion; notfalls Satz für Satz."""
+        try:
+            acks = [store_batch(db, batch)[0] for batch, _ in group]
+            if not _advance(db, segment, position, group[-1][1]):
+                db.rollback()
+                return False
+            db.commit()
+            self._count(sum(ack.count for ack in acks), 0)
+            return True
+        except Exception:
+            db.rollback()
+            logger.exception("Spool-Gruppe aus %s fehlgeschlagen, lade einzeln", segment)
+
+        for batch, end in group:
+            try:
+                ack, _ = store_batch(db, batch)
+                stored, failed = ack.count, 0
+            except Exception:
+                db.rollback()
+                logger.exception("Batch mit %d Events aus %s verworfen",
+                                 len(batch.events), segment)
+                stored, failed = 0, len(batch.events)
+            if not _advance(db, segment, position, end):
+                db.rollback()
+                return False
+            db.commit()
+            self._count(stored, failed)
+            position = end
+        return True
+
+    def _count(self, loaded: int, failed: int):
+        self.loaded_events += loaded
+        self.failed_events += failed
+        metrics.INGEST_STORED.inc(loaded)
+        if failed:
+            metrics.INGEST_FAILED.inc(failed)
+
+
+# ------------------------------------------------------------
+# Einbindung in die App
+# ------------------------------------------------------------
+
+class Spool:
+    """Writer für den Events-Router plus (optional) der Loader als Task."""
+
+    def __init__(self, directory: str = config.SPOOL_DIR, run_loader: bool = config.SPOOL_LOADER):
+        self.directory = directory
+        self.run_loader = run_loader
+        self.writer = SpoolWriter(directory)
+        self.loader = Loader(directory)
+        self.appended_batches = 0
+        self.appended_events = 0
+        self._task: asyncio.Task | None = None
+        self._stopping: asyncio.Event | None = None
+        self._backlog = (0.0, 0)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        await asyncio.to_thread(recover, self.directory)
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="spool-loader")
+
+    async def stop(self):
+        """Offenes Segment versiegeln und (mit Loader) alles nachladen."""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task    # laufenden Ladevorgang abwarten, nicht abbrechen
+        self._task = None
+        await asyncio.to_thread(self.writer.seal)
+        if self.run_loader:
+            await asyncio.to_thread(self.loader.load_all)
+
+    async def append(self, batch: IngestBatch):
+        await asyncio.to_thread(self.writer.append, batch)
+        self.appended_batches += 1
+        self.appended_events += len(batch.events)
+
+    def backlog(self) -> int:
+        """Versiegelte, noch nicht geladene Segmente (höchstens 1 s alt)."""
+        checked_at, count = self._backlog
+        if time.monotonic() - checked_at > 1:
+            count = len(segments(self.directory))
+            self._backlog = (time.monotonic(), count)
+        return count
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.to_thread(self.writer.seal, self.writer.segment_seconds)
+                if self.run_loader:
+                    await asyncio.to_thread(self.loader.load_all)
+            except Exception:
+                # wie beim Ingest-Writer: der Task darf nicht sterben
+                logger.exception("Spool-Loader fehlgeschlagen")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), config.SPOOL_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def as_dict(self) -> dict:
+        return {
+            "running": self.running,
+            "loader": self.run_loader,
+            "appended_batches": self.appended_batches,
+            "appended_events": self.appended_events,
+            "loaded_events": self.loader.loaded_events,
+            "failed_events": self.loader.failed_events,
+            "sealed_segments": self.backlog(),
+        }
+
+
+spool = Spool()
+
+
+def main():
+    from . import migrations
+    from .logs import setup
+
+    parser = argparse.ArgumentParser(description="Ingest-Spool")
+    parser.add_argument("--dir", default=config.SPOOL_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    load = sub.add_parser("load", help="versiegelte Segmente in die DB laden")
+    load.add_argument("--follow", action="store_true",
+                      help="weiterlaufen und neue Segmente laden")
+    sub.add_parser("status", help="Segmente und Checkpoints anzeigen")
+    args = parser.parse_args()
+    setup()
+    migrations.upgrade()    # der Loader kann vor der App starten
+
+    if args.command == "status":
+        for suffix in (OPEN, SEALED, CORRUPT):
+            for path in segments(args.dir, suffix):
+                print(f"[SPOOL] {os.path.basename(path)}: {os.path.getsize(path)} Bytes")
+        db = SessionLocal()
+        try:
+            for cp in db.query(models.SpoolCheckpoint).order_by(models.SpoolCheckpoint.segment):
+                print(f"[SPOOL] Checkpoint {cp.segment}: {cp.position}")
+        finally:
+            db.close()
+        return
+
+    loader = Loader(args.dir)
+    while True:
+        recover(args.dir)
+        n = loader.load_all()
+        if n or not args.follow:
+            print(f"[SPOOL] {n} Events geladen, {loader.failed_events} verworfen")
+        if not args.follow:
+            break
+        time.sleep(config.SPOOL_POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+// app/static/js/dashboard.js
+// Dashboard-Panels: jedes Panel lädt sich parallel aus /api/stats/*
+// (siehe app/routers/stats.py), danach kommen Live-Updates per SSE dazu.
+
+(function () {
+    // Filter aus der Dashboard-URL unverändert an die Stats-API weitergeben
+    const page = new URLSearchParams(location.search);
+    const filter = new URLSearchParams();
+    for (const key of ["start", "end", "company"]) {
+        if (page.get(key)) {
+            filter.set(key, page.get(key));
+        }
+    }
+    // Live-Deltas zählen alles seit dem Laden, passen also nur ohne Filter
+    const live = filter.toString() === "";
+
+    function url(path, extra) {
+        const params = new URLSearchParams(filter);
+        for (const [key, value] of Object.entries(extra || {})) {
+            params.set(key, value);
+        }
+        const query = params.toString();
+        return "/api/stats/" + path + (query ? "?" + query : "");
+    }
+
+    function rows(data) {
+        // spaltenweise -> Liste von Objekten
+        const names = Object.keys(data);
+        const n = names.length ? data[names[0]].length : 0;
+        const result = [];
+        for (let i = 0; i < n; i++) {
+            const row = {};
+            for (const name of names) {
+                row[name] = data[name][i];
+            }
+            result.push(row);
+        }
+        return result;
+    }
+
+    function fillTable(id, list, cells) {
+        const body = document.getElementById(id);
+        body.replaceChildren(...list.map(r => {
+            const tr = document.createElement("tr");
+            for (const [value, cls] of cells(r)) {
+                const td = document.createElement("td");
+                td.textContent = value;
+                if (cls) {
+                    td.className = cls;
+                }
+                tr.appendChild(td);
+            }
+            return tr;
+        }));
+    }
+
+    function formatDuration(seconds) {
+        // wie app/activity.py format_duration
+        const minutes = Math.floor((seconds || 0) / 60);
+        if (minutes < 60) {
+            return minutes + " min";
+        }
+        return Math.floor(minutes / 60) + " h " + String(minutes % 60).padStart(2, "0") + " min";
+    }
+
+    function barChart(id, label, xTitle, autoSkip) {
+        return new Chart(document.getElementById(id).getContext("2d"), {
+            type: "bar",
+            data: { labels: [], datasets: [{ label: label, data: [] }] },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,  // Höhe via CSS
+                plugins: { legend: { display: false } },
+                scales: {
+                    x: {
+                        title: { display: true, text: xTitle },
+                        ticks: { maxRotation: 0, autoSkip: autoSkip }
+                    },
+                    y: {
+                        beginAtZero: true,
+                        title: { display: true, text: "Events" }
+                    }
+                }
+            }
+        });
+    }
+
+    const dayChart = barChart("eventsByDayChart", "Events pro Tag", "Tag", true);
+    const hourChart = barChart("eventsByHourTodayChart", "Events pro Stunde", "Stunde", false);
+    let hourDay = null;
+
+    function addDay(day, n) {
+        const labels = dayChart.data.labels;
+        const data = dayChart.data.datasets[0].data;
+        let i = labels.indexOf(day);
+        if (i < 0) {
+            // Tage ohne Events fehlen in den Labels -> sortiert einfügen
+            i = labels.findIndex(l => l > day);
+            if (i < 0) {
+                i = labels.length;
+            }
+            labels.splice(i, 0, day);
+            data.splice(i, 0, 0);
+        }
+        data[i] += n;
+    }
+
+    function addToKpi(name, n) {
+        const el = document.querySelector('[data-kpi="' + name + '"]');
+        el.textContent = Number(el.textContent) + n;
+    }
+
+    function renderTopUsers(data) {
+        fillTable("topUsersBody", rows(data), u => [[u.external_id], [u.event_count]]);
+    }
+
+    function renderTopPages(data) {
+        fillTable("topPagesBody", rows(data), p => [
+            [p.page_id || "-"],
+            [p.page_url || "-", "truncate"],
+            [p.event_count],
+            [p.user_count],
+        ]);
+    }
+
+    // Je Panel: Endpunkt, Darstellung und (optional) Anwenden eines Live-Deltas
+    const panels = [
+        {
+            path: "kpis",
+            render(data) {
+                for (const [name, value] of Object.entries(data)) {
+                    const el = document.querySelector('[data-kpi="' + name + '"]');
+                    if (el) {
+                        el.textContent = value === null ? "–" : value;
+                    }
+                }
+            },
+            apply(d) {
+                addToKpi("total_events", d.events);
+                addToKpi("events_24h", d.recent);
+            },
+        },
+        { path: "top-users", render: renderTopUsers },
+        { path: "top-pages", render: renderTopPages },
+        {
+            path: "per-day",
+            render(data) {
+                dayChart.data.labels = data.day;
+                dayChart.data.datasets[0].data = data.count;
+                dayChart.update();
+            },
+            apply(d) {
+                for (const [day, n] of Object.entries(d.days)) {
+                    addDay(day, n);
+                }
+                dayChart.update("none");
+            },
+        },
+        {
+            path: "per-hour",
+            extra: filter.get("end") ? { day: filter.get("end") } : {},
+            render(data, meta) {
+                hourDay = meta.start;
+                hourChart.data.labels = data.hour.map(h => String(h).padStart(2, "0") + ":00");
+                hourChart.data.datasets[0].data = data.count;
+                hourChart.update();
+            },
+            apply(d) {
+                for (const [key, n] of Object.entries(d.hours)) {
+                    const [day, hour] = key.split(" ");   // Buckets sind UTC
+                    if (day === hourDay) {
+                        hourChart.data.datasets[0].data[Number(hour)] += n;
+                    }
+                }
+                hourChart.update("none");
+            },
+        },
+        {
+            path: "per-user",
+            render(data) {
+                fillTable("perUserBody", rows(data), u => [
+                    [u.external_id],
+                    [u.event_count],
+                    [u.active_seconds === null ? "–" : formatDuration(u.active_seconds)],
+                    [u.last_activity ? u.last_activity.replace("T", " ").slice(0, 19) : "-"],
+                ]);
+            },
+        },
+    ];
+
+    async function load(panel) {
+        try {
+            const response = await fetch(url(panel.path, panel.extra));
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            const body = await response.json();
+            panel.render(body.data, body.meta);
+            panel.seq = body.meta.seq;
+        } catch (err) {
+            console.error("Panel " + panel.path + " nicht geladen", err);
+            panel.failed = true;
+        }
+    }
+
+    // ==========================
+    // Live-Updates (Server-Sent Events, siehe app/live.py)
+    // ==========================
+
+    function connect() {
+        const ready = panels.filter(p => !p.failed);
+        if (!live || !window.EventSource || !ready.length) {
+            return;
+        }
+        // ab dem ältesten Panel-Stand; jedes Panel nimmt nur Deltas nach seinem
+        const since = Math.min(...ready.map(p => p.seq));
+        const source = new EventSource("/api/live/dashboard?since=" + since);
+
+        source.addEventListener("delta", (e) => {
+            const d = JSON.parse(e.data);
+            for (const panel of ready) {
+                if (panel.apply && d.seq > panel.seq) {
+                    panel.apply(d);
+                    panel.seq = d.seq;
+                }
+            }
+        });
+
+        source.addEventListener("top", (e) => {
+            const d = JSON.parse(e.data);
+            renderTopUsers({
+                external_id: d.top_users.map(u => u.external_id),
+                event_count: d.top_users.map(u => u.event_count),
+            });
+            renderTopPages({
+                page_id: d.top_pages.map(p => p.page_id),
+                page_url: d.top_pages.map(p => p.page_url ? p.page_url.split("?")[0] : null),
+                event_count: d.top_pages.map(p => p.event_count),
+                user_count: d.top_pages.map(p => p.user_count),
+            });
+        });
+
+        // Lücke in den Deltas (Neustart, Client zu langsam) -> neu laden
+        source.addEventListener("reload", () => {
+            source.close();
+            location.reload();
+        });
+    }
+
+    Promise.all(panels.map(load)).then(connect);
+})();
@@ -0,0 +1,197 @@
+# app/wire.py
+"""
+Spaltenformat v2 für Event-Batches (POST /api/events/v2/batch).
+
+Statt eines JSON-Arrays, in dem jedes Event User, Session, URL, Titel,
+Page und Company wiederholt, schickt der Client ein Objekt:
+
+    {
+      "v": 2,
+      "n": 3,
+      "shared":  {"user_external_id": "TRDS\\\\D.WAUER", "session_key": "abc",
+                  "bc_company": "CRONUS"},
+      "columns": {
+        "timestamp":   [1760000000000, 1760000000250, 1760000001000],
+        "action_type": ["click", "change", "click"],
+        "page_url":    {"dict": ["https://…/?page=21"], "idx": [0, 0, 0]},
+        "bc_page_id":  [21, 21, 22]
+      }
+    }
+
+- ``shared``: Felder, die für alle Events gleich sind
+- ``columns``: je Feld ein Array der Länge ``n`` – oder dictionary-kodiert
+  als ``{"dict": [...], "idx": [...]}`` (Index -1 = null)
+- ``timestamp``: Epoch-Millisekunden (UTC) oder ISO-Strings
+
+Der Body darf per ``Content-Encoding: gzip`` (bzw. deflate) oder ``zstd``
+(benötigt das Paket ``zstandard``) komprimiert sein. Geprüft wird spaltenweise
+statt Event für Event über das Pydantic-Schema; die Events sind schlanke
+Tupel (``WireEvent``) mit denselben Attributen wie ``BrowserEventCreate``.
+"""
+import io
+import json
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from . import config
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:   # Fallback: Standardbibliothek
+    _loads = json.loads
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+VERSION = 2
+
+STRING_FIELDS = (
+    "user_external_id", "session_key", "page_url", "page_title", "bc_company",
+    "element_type", "element_role", "element_label", "element_name",
+    "element_id", "element_path", "action_type", "old_value", "new_value",
+)
+FIELDS = STRING_FIELDS + ("timestamp", "bc_page_id", "meta")
+REQUIRED = ("timestamp", "page_url", "action_type")
+
+
+class WireEvent(namedtuple("WireEvent", FIELDS)):
+    """
+    Ein dekodiertes Event mit denselben Attributen wie
+    ``schemas.BrowserEventCreate`` – aber ohne Pydantic-Objekt je Event.
+    """
+    __slots__ = ()
+
+    def dict(self) -> dict:
+        return self._asdict()
+
+
+class WireError(Exception):
+    """Ungültiger v2-Batch; ``status_code`` wie in der HTTP-Antwort."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def decompress(body: bytes, encoding: str | None,
+               limit: int = config.WIRE_MAX_BYTES) -> bytes:
+    """Entpackt den Body; mehr als ``limit`` Bytes werden abgelehnt."""
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        data = body
+    elif encoding in ("gzip", "deflate"):
+        # wbits 47: gzip- oder zlib-Header automatisch erkennen
+        inflater = zlib.decompressobj(47)
+        try:
+            data = inflater.decompress(body, limit + 1)
+        except zlib.error as exc:
+            raise WireError(400, f"Body nicht entpackbar: {exc}")
+    elif encoding == "zstd":
+        if zstandard is None:
+            raise WireError(415, "zstd nicht verfügbar (Paket zstandard fehlt)")
+        try:
+            reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body))
+            data = reader.read(limit + 1)
+        except zstandard.ZstdError as exc:
+            raise WireError(400, f"Body nicht entpackbar: {exc}")
+    else:
+        raise WireError(415, f"Content-Encoding {encoding} nicht unterstützt")
+
+    if len(data) > limit:
+        raise WireError(413, f"Batch größer als {limit} Bytes")
+    return data
+
+
+def _column(name: str, raw, n: int) -> list:
+    if isinstance(raw, dict):
+        words, idx = raw.get("dict"), raw.get("idx")
+        if not isinstance(words, list) or not isinstance(idx, list):
+            raise WireError(422, f"{name}: dict und idx müssen Arrays sein")
+        if len(idx) != n:
+            raise WireError(422, f"{name}: {len(idx)} Werte statt {n}")
+        size = len(words)
+        if not all(type(i) is int and -1 <= i < size for i in idx):
+            raise WireError(422, f"{name}: ungültiger Index")
+        return [None if i == -1 else words[i] for i in idx]
+    if not isinstance(raw, list):
+        raise WireError(422, f"{name}: Array erwartet")
+    if len(raw) != n:
+        raise WireError(422, f"{name}: {len(raw)} Werte statt {n}")
+    return raw
+
+
+def _check(name: str, values: list):
+    """Typprüfung einer ganzen Spalte."""
+    if name in STRING_FIELDS:
+        ok = all(v is None or type(v) is str for v in values)
+    elif name == "bc_page_id":
+        ok = all(v is None or type(v) is int for v in values)
+    elif name == "meta":
+        ok = all(v is None or type(v) is dict for v in values)
+    else:
+        ok = True
+    if not ok:
+        raise WireError(422, f"{name}: falscher Typ")
+    if name in REQUIRED and None in values:
+        raise WireError(422, f"{name}: Pflichtfeld fehlt")
+
+
+def _timestamps(values: list) -> list[datetime]:
+    try:
+        if all(type(v) is int for v in values):
+            return [datetime.fromtimestamp(v / 1000, timezone.utc) for v in values]
+        return [
+            datetime.fromtimestamp(v / 1000, timezone.utc) if type(v) is int
+            else datetime.fromisoformat(v.replace("Z", "+00:00"))
+            for v in values
+        ]
+    except (AttributeError, TypeError, ValueError, OverflowError, OSError):
+        raise WireError(422, "timestamp: Epoch-Millisekunden oder ISO-Format erwartet")
+
+
+def decode_batch(data: bytes) -> list[WireEvent]:
+    """Dekodiert einen (entpackten) v2-Batch in Events ohne Einzelvalidierung."""
+    try:
+        doc = _loads(data)
+    except ValueError as exc:
+        raise WireError(400, f"Kein gültiges JSON: {exc}")
+    if not isinstance(doc, dict) or doc.get("v") != VERSION:
+        raise WireError(422, f"Objekt mit v={VERSION} erwartet")
+
+    n = doc.get("n")
+    if type(n) is not int or n < 0:
+        raise WireError(422, "n: Anzahl der Events fehlt")
+    if n > config.WIRE_MAX_EVENTS:
+        raise WireError(413, f"Mehr als {config.WIRE_MAX_EVENTS} Events je Batch")
+    shared = doc.get("shared") or {}
+    columns = doc.get("columns") or {}
+    if not isinstance(shared, dict) or not isinstance(columns, dict):
+        raise WireError(422, "shared und columns müssen Objekte sein")
+
+    unknown = (set(shared) | set(columns)) - set(FIELDS)
+    if unknown:
+        raise WireError(422, f"Unbekannte Felder: {', '.join(sorted(unknown))}")
+    both = set(shared) & set(columns)
+    if both:
+        raise WireError(422, f"Felder doppelt in shared und columns: {', '.join(sorted(both))}")
+
+    values = {}
+    for name, value in shared.items():
+        _check(name, [value])
+        values[name] = [value] * n
+    for name, raw in columns.items():
+        values[name] = _column(name, raw, n)
+        _check(name, values[name])
+    missing = [name for name in REQUIRED if name not in values]
+    if missing and n:
+        raise WireError(422, f"Pflichtfelder fehlen: {', '.join(missing)}")
+    if "timestamp" in values:
+        values["timestamp"] = _timestamps(values["timestamp"])
+
+    absent = [None] * n
+    return list(map(WireEvent._make, zip(*(values.get(name, absent) for name in FIELDS))))
@@ -0,0 +1,24 @@
+# bench/__init__.py
+"""
+Last- und Benchmark-Suite (läuft lokal gegen die ASGI-App, kein Server nötig):
+
+- ``python -m bench.generator``: synthetische BC-Events, befüllt eine
+  Benchmark-DB mit 100k / 1M / 10M Events
+- ``python -m bench.load``: Lasttreiber für POST /api/events/batch
+  (Concurrency, Batchgröße, v1/v2-Format)
+- ``python -m bench.queries``: Laufzeiten aller Dashboard- und
+  Nutzer-Abfragen sowie der fertigen Seiten
+- ``python -m bench.consistency``: schreibt gemischte Batches über den
+  Ingest und vergleicht Aktivität und Flows mit einem Neuaufbau
+
+Alle Läufe melden Durchsatz und p50/p95/p99 und können gegen eine Baseline
+(``bench/baseline.json``) verglichen bzw. als neue Baseline gespeichert
+werden. Die Datenbank wird per ``--db`` gewählt; die App-Module werden erst
+danach importiert, weil app.config ``DATABASE_URL`` beim Import liest.
+"""
+import os
+
+
+def use_database(path: str):
+    """Setzt DATABASE_URL für die anschließend importierten App-Module."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
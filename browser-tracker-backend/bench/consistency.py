@@ -0,0 +1,176 @@
+# bench/consistency.py
+"""
+Prüft, dass die inkrementell fortgeschriebenen Aggregate dasselbe ergeben
+wie ein Neuaufbau aus den Rohdaten: Aktivitätsspannen und aktive Zeit
+(``activity.apply_rows`` gegen ``activity.rebuild``) sowie Seitenübergänge
+(``flows.apply_rows`` gegen ``flows.rebuild``).
+
+Die Events kommen vom Generator, werden je Session in Batches geteilt und
+in gemischter Reihenfolge über den normalen Ingest-Pfad (``store_batch``)
+geschrieben, committet wird nach 1–GROUP Batches wie beim Ingest-Writer.
+
+- ``--order sessions`` (Standard): Batches von Usern, Sessions und Tagen
+  beliebig durcheinander, innerhalb einer Session in Reihenfolge. Ein User
+  liefert so laufend Events vor dem Ende seiner offenen Spanne nach.
+- ``--order random``: alle Batches gemischt. Verglichen wird nur die
+  Aktivität – Flows ignorieren Nachzügler innerhalb einer Session bewusst
+  (siehe app/flows.py).
+
+Exit-Code 1 bei einer Abweichung. Die DB bleibt mit dem inkrementellen
+Stand liegen (der Neuaufbau wird zurückgerollt):
+
+    python -m bench.consistency --db check.db [--events 10000] [--days 3]
+                                [--order sessions|random] [--seed 1]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+
+from sqlalchemy import select
+
+from . import use_database
+from .generator import Generator
+
+GROUP = 4
+SHOW_ROWS = 5
+
+
+def batches(events: list[dict], batch_size: int, order: str,
+            rng: random.Random) -> list[list[dict]]:
+    """Events je Session in Batches, dann in der gewählten Reihenfolge gemischt."""
+    by_session: dict[str, list[dict]] = {}
+    for event in events:
+        by_session.setdefault(event["session_key"], []).append(event)
+    queues = [
+        [chunk[i:i + batch_size] for i in range(0, len(chunk), batch_size)]
+        for chunk in by_session.values()
+    ]
+
+    if order == "random":
+        result = [batch for queue in queues for batch in queue]
+        rng.shuffle(result)
+        return result
+
+    # zufälliges Verzahnen: jede Session behält ihre Reihenfolge
+    slots = [i for i, queue in enumerate(queues) for _ in queue]
+    rng.shuffle(slots)
+    positions = [0] * len(queues)
+    result = []
+    for i in slots:
+        result.append(queues[i][positions[i]])
+        positions[i] += 1
+    return result
+
+
+def ingest(batch_list: list[list[dict]], rng: random.Random):
+    from app import wire
+    from app.database import SessionLocal
+    from app.ingest import IngestBatch, store_batch
+
+    db = SessionLocal()
+    try:
+        i = 0
+        while i < len(batch_list):
+            group = rng.randint(1, GROUP)
+            for batch in batch_list[i:i + group]:
+                store_batch(db, IngestBatch(events=[wire.WireEvent(**e) for e in batch],
+                                            client_ip="127.0.0.1", user_agent="consistency"))
+            db.commit()
+            i += group
+    finally:
+        db.close()
+
+
+def snapshot(db, tables: list) -> dict[str, list[tuple]]:
+    """Inhalt der Tabellen ohne Surrogat-IDs, sortiert."""
+    result = {}
+    for model in tables:
+        columns = [c for c in model.__table__.columns if c.name != "id"]
+        rows = db.execute(select(*columns).order_by(*columns)).all()
+        result[model.__tablename__] = [tuple(r) for r in rows]
+    return result
+
+
+def _same(a: tuple, b: tuple) -> bool:
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        if isinstance(x, float) or isinstance(y, float):
+            if x is None or y is None or not math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-6):
+                return False
+        elif x != y:
+            return False
+    return True
+
+
+def compare(incremental: dict, rebuilt: dict) -> int:
+    """Gibt Abweichungen je Tabelle aus und liefert deren Anzahl."""
+    total = 0
+    for name, rows in incremental.items():
+        expected = rebuilt[name]
+        differing = [
+            (got, want) for got, want in zip(rows, expected) if not _same(got, want)
+        ]
+        missing = abs(len(rows) - len(expected))
+        total += len(differing) + missing
+        state = "OK" if not differing and not missing else "ABWEICHUNG"
+        print(f"[CHECK] {name:<18} {len(rows):>7} inkrementell / "
+              f"{len(expected):>7} neu aufgebaut  {state}")
+        for got, want in differing[:SHOW_ROWS]:
+            print(f"        inkrementell {got}")
+            print(f"        neu          {want}")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.consistency")
+    parser.add_argument("--db", required=True, help="SQLite-Datei (wird angelegt)")
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--users", type=int, default=20,
+                        help="wenige User = viele verzahnte Sessions je User")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--order", choices=["sessions", "random"], default="sessions")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} existiert bereits")
+    use_database(args.db)
+
+    from app import activity, flows, migrations, models
+    from app.database import SessionLocal
+
+    migrations.upgrade()
+    rng = random.Random(args.seed)
+    events = [e for _, day in Generator(args.seed, args.users).days(args.events, args.days)
+              for e in day]
+    batch_list = batches(events, args.batch_size, args.order, rng)
+    print(f"[CHECK] {len(events)} Events in {len(batch_list)} Batches ({args.order})")
+    ingest(batch_list, rng)
+
+    tables = [models.ActivitySpan, models.ActivityDaily]
+    if args.order == "sessions":
+        tables += [models.FlowEdgeDaily, models.FlowPathDaily, models.FlowSession]
+
+    db = SessionLocal()
+    try:
+        incremental = snapshot(db, tables)
+        activity.rebuild(db)
+        if args.order == "sessions":
+            flows.rebuild(db)
+        db.flush()
+        rebuilt = snapshot(db, tables)
+        db.rollback()
+    finally:
+        db.close()
+
+    if compare(incremental, rebuilt):
+        sys.exit(1)
+    print("[CHECK] Inkrementeller Stand entspricht dem Neuaufbau")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# bench/generator.py
+"""
+Synthetische Business-Central-Events für Last- und Abfrage-Benchmarks.
+
+Nachgebildet wird ein Arbeitsalltag: wenige sehr aktive und viele
+gelegentliche Nutzer (Zipf), Sessions zu Bürozeiten, Seitenwechsel entlang
+typischer BC-Abläufe (Liste -> Karte -> Beleg), Felder und Buttons je Seite
+mit passenden Aktionen, kurze Pausen zwischen Klicks und gelegentlich
+längere Leerlaufzeiten. Alles ist über ``--seed`` reproduzierbar.
+
+    python -m bench.generator --db bench.db --size 1m [--days 90] [--seed 1]
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from . import use_database
+
+SIZES = {"100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+BASE_URL = "http://bc.example.local:8080/BC"
+COMPANIES = ["CRONUS AG", "CRONUS AG", "CRONUS AG", "Testmandant", "Filiale Nord"]
+
+# Seite -> (Titel, Felder, Buttons)
+PAGES = {
+    9305: ("Verkaufsaufträge", [], ["Neu", "Bearbeiten", "Suchen", "Filter"]),
+    42: ("Verkaufsauftrag", ["Verk. an Deb.-Nr.", "Auftragsdatum", "Menge", "Artikelnr.",
+                            "VK-Preis", "Zeilenrabatt %"], ["Buchen", "Freigeben", "Drucken"]),
+    22: ("Debitoren", [], ["Neu", "Bearbeiten", "Suchen", "Filter"]),
+    21: ("Debitorenkarte", ["Name", "Adresse", "PLZ-Code", "Ort", "Zahlungsbedingungscode"],
+         ["Statistik", "Posten", "OK"]),
+    31: ("Artikel", [], ["Neu", "Bearbeiten", "Suchen", "Filter"]),
+    30: ("Artikelkarte", ["Beschreibung", "Basiseinheitencode", "VK-Preis", "Lagerbestand"],
+         ["Posten", "Preise", "OK"]),
+    9307: ("Einkaufsbestellungen", [], ["Neu", "Bearbeiten", "Suchen"]),
+    50: ("Einkaufsbestellung", ["Kreditorennr.", "Bestelldatum", "Menge", "EK-Preis"],
+         ["Buchen", "Freigeben"]),
+    27: ("Kreditoren", [], ["Neu", "Bearbeiten", "Suchen"]),
+    26: ("Kreditorenkarte", ["Name", "Adresse", "Ort"], ["Posten", "OK"]),
+    143: ("Geb. Verkaufsrechnungen", [], ["Navigieren", "Drucken", "Suchen"]),
+    132: ("Geb. Verkaufsrechnung", [], ["Drucken", "Navigieren"]),
+    39: ("Fibu Buch.-Blatt", ["Buchungsdatum", "Kontonr.", "Betrag", "Beschreibung"],
+         ["Buchen", "Testbericht"]),
+}
+ENTRY_PAGES = [9305, 9305, 22, 31, 9307, 39, 143]
+
+# typische Abläufe: Seite -> mögliche Folgeseiten (Gewichte über Wiederholung)
+NEXT_PAGES = {
+    9305: [42, 42, 42, 22, 143],
+    42: [9305, 9305, 21, 30, 42],
+    22: [21, 21, 21, 9305],
+    21: [22, 22, 9305, 42],
+    31: [30, 30, 30, 9305],
+    30: [31, 31, 42],
+    9307: [50, 50, 50, 27],
+    50: [9307, 9307, 26, 30],
+    27: [26, 26, 9307],
+    26: [27, 50],
+    143: [132, 132, 9305],
+    132: [143, 143],
+    39: [39, 9305],
+}
+
+N_USERS = 200
+
+
+class Generator:
+    """Erzeugt Event-Dicts (Felder wie ``schemas.BrowserEventCreate``)."""
+
+    def __init__(self, seed: int = 1, users: int = N_USERS):
+        self.rng = random.Random(seed)
+        self.users = [f"BENCH\\USER{i:04d}" for i in range(users)]
+        # Zipf-artige Aktivität: User i ist 1/(i+1) so aktiv wie der erste
+        self.weights = [1 / (i + 1) ** 0.8 for i in range(users)]
+        self.session_no = 0
+
+    def _element(self, page: int) -> tuple:
+        _, fields, buttons = PAGES[page]
+        rng = self.rng
+        if fields and rng.random() < 0.55:
+            label = rng.choice(fields)
+            action = rng.choices(["change", "focus", "blur", "click"], [5, 3, 2, 1])[0]
+            return ("input", "Field", label, action)
+        label = rng.choice(buttons)
+        return ("button", "Button", label, "click")
+
+    def session(self, user: str, start: datetime) -> list[dict]:
+        """Eine Session: Seitenfolge entlang NEXT_PAGES, je Seite mehrere Events."""
+        rng = self.rng
+        self.session_no += 1
+        key = f"bench-{self.session_no:x}"
+        company = rng.choice(COMPANIES)
+        page = rng.choice(ENTRY_PAGES)
+        ts = start
+        events = []
+        for _ in range(max(1, int(rng.expovariate(1 / 8)))):
+            title = PAGES[page][0]
+            url = f"{BASE_URL}/?company={company}&page={page}"
+            for _ in range(1 + int(rng.expovariate(1 / 4))):
+                element_type, role, label, action = self._element(page)
+                events.append({
+                    "timestamp": ts,
+                    "user_external_id": user,
+                    "session_key": key,
+                    "page_url": url,
+                    "page_title": title,
+                    "bc_page_id": page,
+                    "bc_company": company,
+                    "element_type": element_type,
+                    "element_role": role,
+                    "element_label": label,
+                    "element_name": None,
+                    "element_id": f"b{rng.randrange(1 << 16):x}",
+                    "element_path": f"div.ms-nav-layout > form > div:nth-of-type({rng.randint(1, 9)}) > {element_type}",
+                    "action_type": action,
+                    "old_value": None,
+                    "new_value": str(rng.randint(1, 99999)) if action == "change" else None,
+                    "meta": {},
+                })
+                # Klick-Abstände: meist Sekunden, selten Minuten
+                ts += timedelta(seconds=rng.lognormvariate(2.0, 1.0))
+            if rng.random() < 0.05:
+                ts += timedelta(minutes=rng.uniform(6, 30))     # Leerlauf
+            page = rng.choice(NEXT_PAGES[page])
+        return events
+
+    def days(self, total: int, days: int, end: datetime | None = None):
+        """
+        Liefert je Tag (älteste zuerst) die zeitlich sortierten Events,
+        zusammen etwa ``total``.
+        """
+        end = (end or datetime.now(timezone.utc)).replace(hour=0, minute=0, second=0,
+                                                           microsecond=0)
+        per_day = total / days
+        produced = 0
+        for d in range(days, 0, -1):
+            day = end - timedelta(days=d - 1)
+            target = round(per_day * (days - d + 1)) - produced
+            events = []
+            while len(events) < target:
+                user = self.rng.choices(self.users, self.weights)[0]
+                start = day + timedelta(hours=self.rng.uniform(7, 17))
+                events += self.session(user, start)
+            events = events[:target]
+            events.sort(key=lambda e: e["timestamp"])
+            produced += len(events)
+            yield day, events
+
+    def batches(self, total: int, batch_size: int, days: int = 1):
+        """Events in Batches der Größe ``batch_size`` (für den Lasttreiber)."""
+        batch = []
+        for _, events in self.days(total, days):
+            for event in events:
+                batch.append(event)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+
+def as_json(event: dict) -> dict:
+    """Event-Dict wie es die Extension sendet (Zeitstempel als ISO-String)."""
+    return {**event, "timestamp": event["timestamp"].isoformat()}
+
+
+def seed(total: int, days: int, seed_value: int = 1, commit_every: int = 5000):
+    """Schreibt ``total`` Events über den normalen Ingest-Pfad (inkl. Rollups)."""
+    from app import migrations, wire
+    from app.database import SessionLocal
+    from app.ingest import IngestBatch, store_batch
+
+    migrations.upgrade()
+    gen = Generator(seed_value)
+    db = SessionLocal()
+    started = time.perf_counter()
+    written = 0
+    try:
+        for day, events in gen.days(total, days):
+            for i in range(0, len(events), commit_every):
+                chunk = [wire.WireEvent(**e) for e in events[i:i + commit_every]]
+                store_batch(db, IngestBatch(events=chunk, client_ip="127.0.0.1",
+                                            user_agent="bench"))
+                db.commit()
+                written += len(chunk)
+            rate = written / (time.perf_counter() - started)
+            print(f"[BENCH] {day:%Y-%m-%d}: {written:>10} Events ({rate:,.0f}/s)")
+    finally:
+        db.close()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.generator")
+    parser.add_argument("--db", required=True, help="SQLite-Datei (wird angelegt)")
+    parser.add_argument("--size", choices=sorted(SIZES), default="100k")
+    parser.add_argument("--events", type=int, help="statt --size: genaue Anzahl")
+    parser.add_argument("--days", type=int, default=90, help="Zeitraum bis heute")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} existiert bereits")
+    use_database(args.db)
+    total = args.events or SIZES[args.size]
+    started = time.perf_counter()
+    written = seed(total, args.days, args.seed)
+    elapsed = time.perf_counter() - started
+    print(f"[BENCH] {written} Events in {elapsed:.1f}s ({written / elapsed:,.0f}/s) -> {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# bench/load.py
+"""
+Lasttreiber für POST /api/events/batch bzw. /api/events/v2/batch.
+
+Standardmäßig läuft die App im selben Prozess (httpx + ASGITransport, inkl.
+Startup/Shutdown, also mit Ingest-Queue und Writer-Task); mit ``--url`` geht
+die Last an einen laufenden Server. Gemessen werden die Antwortzeiten je
+Request, der angenommene Durchsatz und – bis die Queue leer geschrieben ist –
+der tatsächlich gespeicherte Durchsatz.
+
+Mit ``--dashboard N`` fragen parallel N Clients ständig teure Dashboard-Panels
+ab (jedes Mal andere Parameter, also ohne View-Cache). Auf einer befüllten
+DB (``--db bench-1m.db``) zeigt das, ob Lesen den Ingest ausbremst.
+
+    python -m bench.load --db load.db [--concurrency 8] [--batch-size 50]
+                         [--events 50000] [--format v1|v2] [--wait]
+                         [--dashboard 4] [--save-baseline | --compare]
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import sys
+import time
+from datetime import date, timedelta
+
+from . import report, use_database
+from .generator import Generator, as_json
+
+
+def _payloads(events: int, batch_size: int, fmt: str, seed: int) -> list[tuple[bytes, dict, int]]:
+    """Vorab kodierte Request-Bodies, damit der Generator nicht mitgemessen wird."""
+    gen = Generator(seed)
+    bodies = []
+    for batch in gen.batches(events, batch_size):
+        if fmt == "v1":
+            body = json.dumps([as_json(e) for e in batch]).encode()
+            headers = {"Content-Type": "application/json"}
+        else:
+            body = gzip.compress(json.dumps(encode_v2(batch)).encode())
+            headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+        bodies.append((body, headers, len(batch)))
+    return bodies
+
+
+def encode_v2(batch: list[dict]) -> dict:
+    """Spaltenformat v2 wie browser-tracker-extension/wire.js."""
+    from app.wire import FIELDS
+
+    shared, columns = {}, {}
+    for name in FIELDS:
+        values = [e[name] for e in batch]
+        if name == "timestamp":
+            values = [int(v.timestamp() * 1000) for v in values]
+        if all(v is None for v in values):
+            continue
+        if all(v == values[0] for v in values):
+            shared[name] = values[0]
+        elif isinstance(values[0], str):
+            words = list(dict.fromkeys(v for v in values if v is not None))
+            index = {w: i for i, w in enumerate(words)}
+            columns[name] = {"dict": words, "idx": [-1 if v is None else index[v] for v in values]}
+        else:
+            columns[name] = values
+    return {"v": 2, "n": len(batch), "shared": shared, "columns": columns}
+
+
+async def _drain(client, timeout: float = 300):
+    """Wartet, bis der Writer (bzw. Spool-Loader) alle angenommenen Events geschrieben hat."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        stats = (await client.get("/api/events/ingest-stats")).json()
+        done = stats["flushed_events"] + stats["failed_events"]
+        pending = stats["queue_depth"] > 0 or done < stats["enqueued_events"]
+        spool = stats.get("spool")
+        if spool and spool["loader"]:
+            pending = pending or (spool["loaded_events"] + spool["failed_events"]
+                                  < spool["appended_events"])
+        if not pending:
+            return
+        await asyncio.sleep(0.05)
+
+
+# Teure Panels; {day}/{n} wechseln je Request, damit der View-Cache nie trifft
+DASHBOARD_PATHS = (
+    "/api/stats/kpis?start={day}",
+    "/api/stats/top-pages?start={day}&limit={n}",
+    "/api/stats/per-user?start={day}&limit={n}",
+    "/api/stats/per-day?start={day}",
+)
+
+
+async def read_dashboard(client, readers: int, stop: asyncio.Event) -> list[float]:
+    """Fragt reihum die Panels ab, bis ``stop`` gesetzt ist; liefert die Latenzen."""
+    latencies: list[float] = []
+    today = date.today()
+
+    async def reader(offset: int):
+        i = offset
+        while not stop.is_set():
+            template = DASHBOARD_PATHS[i % len(DASHBOARD_PATHS)]
+            path = template.format(day=today - timedelta(days=i % 365), n=1 + i % 200)
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+            i += readers
+
+    await asyncio.gather(*(reader(k) for k in range(readers)))
+    return latencies
+
+
+async def run(client, payloads, concurrency: int, path: str, dashboard: int = 0) -> dict:
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    accepted = 0
+    queue = asyncio.Queue()
+    for item in payloads:
+        queue.put_nowait(item)
+
+    async def worker():
+        nonlocal accepted
+        while True:
+            try:
+                body, headers, n = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            response = await client.post(path, content=body, headers=headers)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code < 300:
+                accepted += n
+
+    stop = asyncio.Event()
+    readers = asyncio.create_task(read_dashboard(client, dashboard, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    sent = time.perf_counter() - started
+    await _drain(client)
+    stored = time.perf_counter() - started
+    stop.set()
+    dashboard_latencies = await readers
+
+    result = report.summarize(latencies)
+    result["throughput"] = accepted / sent            # angenommene Events/s
+    result["stored_throughput"] = accepted / stored   # inkl. Leerschreiben der Queue
+    result["statuses"] = statuses
+    if dashboard:
+        result["dashboard"] = report.summarize(dashboard_latencies)
+    return result
+
+
+async def _main(args) -> dict:
+    import httpx
+
+    payloads = _payloads(args.events, args.batch_size, args.format, args.seed)
+    path = "/api/events/batch" if args.format == "v1" else "/api/events/v2/batch"
+    if args.wait:
+        path += "?wait=true"
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+            return await run(client, payloads, args.concurrency, path, args.dashboard)
+
+    from app.main import app
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     timeout=60) as client:
+            return await run(client, payloads, args.concurrency, path, args.dashboard)
+    finally:
+        await app.router.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.load")
+    parser.add_argument("--db", default="bench-load.db",
+                        help="SQLite-Datei für den In-Process-Lauf")
+    parser.add_argument("--url", help="statt In-Process: laufender Server, z.B. http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--format", choices=["v1", "v2"], default="v1")
+    parser.add_argument("--wait", action="store_true", help="synchron schreiben (?wait=true)")
+    parser.add_argument("--dashboard", type=int, default=0,
+                        help="so viele Clients fragen währenddessen Dashboard-Panels ab")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=report.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    if not args.url:
+        use_database(args.db)
+    result = asyncio.run(_main(args))
+
+    scenario = (f"load:{args.format}:c{args.concurrency}:b{args.batch_size}"
+                f"{':wait' if args.wait else ''}"
+                f"{f':dash{args.dashboard}' if args.dashboard else ''}")
+    dashboard = result.pop("dashboard", None)
+    tables = {"request": result}
+    if dashboard is not None:
+        tables["dashboard"] = dashboard
+    report.print_table(scenario, tables)
+    print(f"{'angenommen':32} {result['throughput']:>12,.0f} Events/s")
+    print(f"{'gespeichert':32} {result['stored_throughput']:>12,.0f} Events/s")
+    print(f"{'Status':32} {result['statuses']}")
+
+    results = {"request": {k: v for k, v in result.items() if k != "statuses"}}
+    if dashboard is not None:
+        results["dashboard"] = dashboard
+    if args.save_baseline:
+        report.save_baseline(scenario, results)
+    if args.compare and report.compare(scenario, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
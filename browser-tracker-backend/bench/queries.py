@@ -0,0 +1,160 @@
+# bench/queries.py
+"""
+Laufzeiten aller Dashboard- und Nutzer-Abfragen aus app/queries.py sowie der
+fertigen Seiten (inkl. Template-Rendering, View-Cache vor jedem Aufruf
+geleert). Gemessen wird gegen eine vorhandene, z.B. mit bench.generator
+befüllte Datenbank.
+
+    python -m bench.queries --db bench-1m.db [--repeat 20] [--only top_]
+                            [--save-baseline | --compare]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from . import report, use_database
+
+
+def query_cases(db) -> dict:
+    """(Name -> callable, User-ID); Parameter wie in den Ansichten."""
+    from sqlalchemy import func, select
+
+    from app import models, queries
+    from app.routers import stats
+    from app.routers.dashboard_users import TIMELINE_FIELDS, user_detail_context
+
+    now = datetime.now(timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    D = models.EventRollupDaily
+    # aktivster User (für die Nutzer-Abfragen) und eine tiefe Timeline-Seite
+    user_id = db.execute(
+        select(D.user_id).where(D.user_id != 0).group_by(D.user_id)
+        .order_by(func.sum(D.event_count).desc()).limit(1)
+    ).scalar() or 1
+    deep = queries.user_timeline(db, user_id, [], limit=1000)
+    cursor = (deep[-1]["timestamp"], deep[-1]["id"]) if deep else None
+    start, end = now.date() - timedelta(days=29), now.date()
+    page = db.execute(
+        select(models.FlowEdgeDaily.from_page).limit(1)
+    ).scalar() or 21
+    company = db.execute(select(D.bc_company).where(D.bc_company != "").limit(1)).scalar() or ""
+
+    return {
+        "total_events": lambda: queries.total_events(db),
+        "total_users": lambda: queries.total_users(db),
+        "total_sessions": lambda: queries.total_sessions(db),
+        "events_since_24h": lambda: queries.events_since(db, now - timedelta(hours=24)),
+        "active_time_total": lambda: queries.active_time_total(db),
+        "active_time_since_24h": lambda: queries.active_time_since(db, now - timedelta(hours=24)),
+        "top_users": lambda: queries.top_users(db, limit=5),
+        "top_pages": lambda: queries.top_pages(db, limit=10),
+        "events_by_day_365": lambda: queries.events_by_day(db, (now - timedelta(days=365)).date()),
+        "events_by_hour_today": lambda: queries.events_by_hour(db, today, today + timedelta(days=1)),
+        "users_overview": lambda: queries.users_overview(db),
+        "user_stats": lambda: queries.user_stats(db, user_id),
+        "user_active_time": lambda: queries.user_active_time(db, user_id),
+        "user_active_pages": lambda: queries.user_active_pages(db, user_id),
+        "user_top_pages": lambda: queries.user_top_pages(db, user_id),
+        "user_action_stats": lambda: queries.user_action_stats(db, user_id),
+        "user_timeline_first": lambda: queries.user_timeline(db, user_id, TIMELINE_FIELDS),
+        "user_timeline_deep": lambda: queries.user_timeline(
+            db, user_id, TIMELINE_FIELDS, before=cursor),
+        "flow_top_edges": lambda: queries.flow_top_edges(db, start, end),
+        "flow_top_paths": lambda: queries.flow_top_paths(db, start, end),
+        "flow_next_pages": lambda: queries.flow_next_pages(db, page, start, end),
+        "flow_user": lambda: queries.flow_top_edges(db, start, end, user_id=user_id),
+        "user_breakdown": lambda: queries.user_breakdown(db, start, end),
+        "ctx:stats_kpis": lambda: stats.kpis(db),
+        "ctx:stats_kpis_company": lambda: stats.kpis(db, start, end, company),
+        "ctx:stats_top_pages_company": lambda: stats.top_pages(db, start, end, company),
+        "ctx:stats_per_user": lambda: stats.per_user(db, start, end),
+        "ctx:user_detail": lambda: user_detail_context(db, user_id),
+    }, user_id
+
+
+def time_calls(cases: dict, repeat: int, warmup: int = 2) -> dict:
+    results = {}
+    for name, call in cases.items():
+        for _ in range(warmup):
+            call()
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - started) * 1000)
+        results[name] = report.summarize(samples)
+    return results
+
+
+async def time_pages(paths: list[str], repeat: int, warmup: int = 2) -> dict:
+    """Komplette GET-Requests gegen die ASGI-App (ohne View-Cache-Treffer)."""
+    import httpx
+
+    from app.cache import view_cache
+    from app.main import app
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in paths:
+            samples = []
+            for i in range(warmup + repeat):
+                view_cache.entries.clear()
+                started = time.perf_counter()
+                response = await client.get(path)
+                elapsed = (time.perf_counter() - started) * 1000
+                response.raise_for_status()
+                if i >= warmup:
+                    samples.append(elapsed)
+            results[f"GET {path}"] = report.summarize(samples)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.queries")
+    parser.add_argument("--db", required=True, help="befüllte SQLite-Datei")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", help="nur Fälle, deren Name diesen Text enthält")
+    parser.add_argument("--scenario", help="Name für die Baseline (Standard: Dateiname der DB)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=report.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} nicht gefunden (erst python -m bench.generator)")
+    use_database(args.db)
+
+    from app import migrations
+    from app.database import ReadSessionLocal
+
+    migrations.upgrade()
+    db = ReadSessionLocal()
+    try:
+        cases, user_id = query_cases(db)
+        if args.only:
+            cases = {k: v for k, v in cases.items() if args.only in k}
+        results = time_calls(cases, args.repeat)
+    finally:
+        db.close()
+
+    paths = ["/", "/api/stats/kpis", "/api/stats/top-users", "/api/stats/top-pages",
+             "/api/stats/per-day", "/api/stats/per-hour", "/api/stats/per-user", "/users/", f"/users/{user_id}", f"/users/{user_id}/timeline?limit=50",
+             "/api/flows/edges", "/api/flows/paths"]
+    if args.only:
+        paths = [p for p in paths if args.only in f"GET {p}"]
+    results.update(asyncio.run(time_pages(paths, args.repeat)))
+
+    scenario = args.scenario or f"queries:{os.path.basename(args.db)}"
+    report.print_table(scenario, results)
+    if args.save_baseline:
+        report.save_baseline(scenario, results)
+    if args.compare and report.compare(scenario, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# bench/report.py
+"""Kennzahlen (Perzentile), Ausgabe und Baseline-Vergleich der Benchmarks."""
+import json
+import os
+from datetime import datetime, timezone
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_TOLERANCE = 0.20    # +20 % p95 gilt als Regression ...
+MIN_DELTA_MS = 1.0          # ... wenn es mindestens so viele ms sind (Messrauschen)
+
+
+def percentile(sorted_samples: list[float], q: float) -> float:
+    """Perzentil mit linearer Interpolation (q in 0..100)."""
+    if not sorted_samples:
+        return 0.0
+    pos = (len(sorted_samples) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    return sorted_samples[lower] + (sorted_samples[upper] - sorted_samples[lower]) * (pos - lower)
+
+
+def summarize(samples_ms: list[float]) -> dict:
+    """Laufzeiten in ms -> count, mean, p50, p95, p99, max."""
+    s = sorted(samples_ms)
+    return {
+        "count": len(s),
+        "mean": sum(s) / len(s) if s else 0.0,
+        "p50": percentile(s, 50),
+        "p95": percentile(s, 95),
+        "p99": percentile(s, 99),
+        "max": s[-1] if s else 0.0,
+    }
+
+
+def print_table(title: str, results: dict[str, dict]):
+    print(f"\n{title}")
+    print(f"{'':32} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, r in results.items():
+        print(f"{name:32} {r['count']:>6} {r['p50']:>9.2f} {r['p95']:>9.2f} "
+              f"{r['p99']:>9.2f} {r['max']:>9.2f}")
+
+
+def load_baseline(path: str = BASELINE_FILE) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(scenario: str, results: dict, path: str = BASELINE_FILE):
+    """Speichert ``results`` als Baseline für ``scenario`` (andere bleiben)."""
+    data = load_baseline(path)
+    data[scenario] = {
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    print(f"\n[BENCH] Baseline '{scenario}' gespeichert: {path}")
+
+
+def compare(scenario: str, results: dict, tolerance: float = DEFAULT_TOLERANCE,
+            path: str = BASELINE_FILE) -> list[str]:
+    """
+    Vergleicht p95 (und ggf. Durchsatz) mit der Baseline. Liefert die
+    Regressionen als Textzeilen; leer = alles im Rahmen.
+    """
+    baseline = load_baseline(path).get(scenario)
+    if baseline is None:
+        print(f"\n[BENCH] Keine Baseline für '{scenario}' – erst mit --save-baseline anlegen")
+        return []
+
+    print(f"\nVergleich mit Baseline vom {baseline['recorded_at']} (Toleranz {tolerance:.0%})")
+    regressions = []
+    for name, current in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        for key, higher_is_better in (("p95", False), ("throughput", True)):
+            if key not in current or key not in old or not old[key]:
+                continue
+            change = current[key] / old[key] - 1
+            worse = -change if higher_is_better else change
+            noise = key == "p95" and current[key] - old[key] < MIN_DELTA_MS
+            mark = "REGRESSION" if worse > tolerance and not noise else ""
+            print(f"{name:32} {key:>10} {old[key]:>10.2f} -> {current[key]:>10.2f} "
+                  f"({change:+.0%}) {mark}")
+            if mark:
+                regressions.append(f"{name} {key} {old[key]:.2f} -> {current[key]:.2f}")
+    return regressions